@@ -2,6 +2,7 @@
 
 import argparse
 import jira.exceptions
+import libfields
 import libweb
 import logging
 from simple_issue import simple_issue
@@ -10,6 +11,9 @@ from simple_issue import simple_issue
 logr = logging.getLogger( __name__ )
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue )
+
 
 def reset():
     global resources
@@ -94,7 +98,7 @@ def run( current_user=None, **kwargs ):
     
     # get parent from jira
     try:
-        parent = current_user.get_issue_by_key( args.parent )
+        parent = current_user.get_issue_by_key( args.parent, fields=jira_fields )
     except jira.exceptions.JIRAError as e:
         raise UserWarning( f"No such ticket '{args.parent}'" )
 
@@ -105,15 +109,15 @@ def run( current_user=None, **kwargs ):
 
     children = current_user.mk_child_tasks( parent=parent, child_summaries=summaries )
     current_user.add_tasks_to_epic( children, epic )
-    parent = current_user.reload_issue( parent )
+    parent = current_user.reload_issue( parent, fields=jira_fields )
 
     if args.output_format == 'text':
         current_user.print_issue_summary( parent )
     else:
         headers = ( 'story', 'child', 'summary', 'epic', 'links' )
         raw_issues = [ parent ]
-        raw_issues.extend( current_user.reload_issues( children ) )
-        issues = [ simple_issue.from_src( src=i, jcon=current_user.jira ) for i in raw_issues ]
+        raw_issues.extend( current_user.reload_issues( children, fields=jira_fields ) )
+        issues = [ simple_issue.from_src( src=i, jcon=current_user ) for i in raw_issues ]
         return {
             'headers': headers,
             'issues': issues,
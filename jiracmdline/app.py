@@ -1,6 +1,11 @@
+import connection_pool
 import datetime
 import flask
 import flask_login
+import libgraph
+import libmetrics
+import libprofile
+import libsync
 import libweb
 import logging
 import os
@@ -27,6 +32,12 @@ login_manager = flask_login.LoginManager( app=app )
 login_manager.login_view = "login"
 
 
+# keep the local snapshot in sync, if JCL_SNAPSHOT_PATH is set
+libsync.get_sync_loop()
+# index the projects in JCL_PROJECT_GRAPH
+libgraph.start_graph_loops()
+
+
 # reload the user object from the user ID stored in the session
 # https://flask-login.readthedocs.io/en/latest/
 @login_manager.user_loader
@@ -34,6 +45,65 @@ def load_user( user_id ):
     return user.User( user_id )
 
 
+@app.before_request
+def metrics_scope():
+    ''' Account jira calls to the flask route that made them '''
+    libmetrics.set_scope( f'route:{flask.request.endpoint}' )
+
+
+def is_admin():
+    u = flask_login.current_user
+    return u.is_authenticated and u.username() in libprofile.get_admin_users()
+
+
+@app.before_request
+def profile_start():
+    ''' Admins can profile a request with ?_profile=1 or header X-JCL-Profile: 1 '''
+    if libprofile.is_requested( flask.request ) and is_admin():
+        flask.g.profile = libprofile.Request_Profile( flask.request.endpoint )
+        flask.g.profile.start()
+
+
+@app.after_request
+def profile_stop( response ):
+    profile = flask.g.pop( 'profile', None )
+    if profile:
+        profile.stop()
+        response.headers['Server-Timing'] = profile.server_timing()
+        response.headers[ libprofile.profile_header ] = profile.save()
+    return response
+
+
+@app.teardown_request
+def profile_teardown( exc ):
+    ''' after_request doesn't run when a view raises, stop (and keep) the
+        profile here so it doesn't run on into the next request
+    '''
+    profile = flask.g.pop( 'profile', None )
+    if profile:
+        profile.stop()
+        profile.save()
+
+
+@flask.before_render_template.connect_via( app )
+def profile_render_started( sender, template, context, **extra ):
+    if 'profile' in flask.g:
+        flask.g.profile.render_started()
+
+
+@flask.template_rendered.connect_via( app )
+def profile_render_finished( sender, template, context, **extra ):
+    if 'profile' in flask.g:
+        flask.g.profile.render_finished()
+
+
+def report_connection( project ):
+    ''' Read-only reports on the synced project read the local snapshot '''
+    u = flask_login.current_user
+    snapshot = libsync.snapshot_for( project, u.jira )
+    return snapshot if snapshot else u
+
+
 # def session_init( session ):
 def session_init():
     if 'jira_project' not in flask.session:
@@ -68,6 +138,39 @@ def index():
     )
 
 
+@app.route( '/metrics' )
+def metrics():
+    ''' Jira call accounting in prometheus text format '''
+    return flask.Response(
+        libmetrics.prometheus_text(),
+        mimetype='text/plain; version=0.0.4',
+    )
+
+
+@app.route( '/profiles' )
+@app.route( '/profiles/<name>' )
+@flask_login.login_required
+def profiles( name=None ):
+    ''' List saved profiles, or download one file (.pstats, .collapsed, .json) '''
+    if not is_admin():
+        flask.abort( 403 )
+    if name is None:
+        return flask.jsonify( libprofile.list_profiles() )
+    if not libprofile.is_valid_name( name ):
+        flask.abort( 404 )
+    return flask.send_from_directory( libprofile.get_profile_dir(), name, as_attachment=True )
+
+
+@app.route( '/sync' )
+@flask_login.login_required
+def sync_status():
+    ''' State of the background snapshot sync '''
+    if not is_admin():
+        flask.abort( 403 )
+    loop = libsync.get_sync_loop()
+    return flask.jsonify( loop.status() if loop else {} )
+
+
 @app.route( '/login', methods=['POST', 'GET'] )
 def login():
     print( f'start login, method={flask.request.method}' )
@@ -94,7 +197,7 @@ def login():
 @app.route( '/logout' )
 @flask_login.login_required
 def logout():
-    # user.User( flask.session['_user_id'] ).logout() #delete jira connection
+    connection_pool.get_pool().discard( flask_login.current_user.id ) #delete jira connection
     flask_login.logout_user() #delete cookie
     return flask.redirect( flask.url_for('index') )
 
@@ -112,7 +215,7 @@ def do_sprint_relatives():
     except KeyError:
         params = {}
     if params:
-        params['current_user'] = flask_login.current_user
+        params['current_user'] = report_connection( params['project'] )
         try:
             data = sprint_relatives.run( **params )
         except UserWarning as e:
@@ -138,7 +241,7 @@ def do_lost_children():
     except KeyError:
         params = {}
     if params:
-        params['current_user'] = flask_login.current_user
+        params['current_user'] = report_connection( params['project'] )
         try:
             data = lost_children.run( **params )
         except UserWarning as e:
@@ -164,7 +267,7 @@ def do_service_list():
     except KeyError:
         params = {}
     if params:
-        params['current_user'] = flask_login.current_user
+        params['current_user'] = report_connection( params['project'] )
         try:
             data = service_list.run( **params )
         except UserWarning as e:
@@ -190,7 +293,7 @@ def do_service_overview():
     except KeyError:
         params = {}
     if params:
-        params['current_user'] = flask_login.current_user
+        params['current_user'] = report_connection( params['project'] )
         try:
             data = service_overview.run( **params )
         except UserWarning as e:
@@ -286,7 +389,7 @@ def do_summary():
 def do_task_tracking():
     import worklogs
     session_update()
-    valid_params=[ 'user', 'group', 'num_weeks' ]
+    valid_params=[ 'user', 'group', 'num_weeks', 'period' ]
     params = {}
     data = {}
     rv = None
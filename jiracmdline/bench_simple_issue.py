@@ -0,0 +1,104 @@
+#!/usr/local/bin/python3
+
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from simple_issue import simple_issue
+
+# Module level resources
+resources = {}
+
+
+def get_args( params=None ):
+    key = 'args'
+    if key not in resources:
+        constructor_args = {
+            'formatter_class': argparse.RawDescriptionHelpFormatter,
+            'description': (
+                'Micro-benchmark of simple_issue: memory per instance and the time to'
+                ' create, sort and hash many of them.'
+                ),
+        }
+        parser = argparse.ArgumentParser( **constructor_args )
+        parser.add_argument( '-n', '--num_issues', type=int, default=100000,
+            help='Number of simple_issues (default: %(default)s)' )
+        parser.add_argument( '-r', '--repeat', type=int, default=5,
+            help='Repeat each timing, report the median (default: %(default)s)' )
+        parser.add_argument( '--seed', type=int, default=0 )
+        resources[key] = parser.parse_args( params )
+    return resources[key]
+
+
+def mk_params( num, seed ):
+    ''' Constructor kwargs like simple_issue.from_src makes: a few projects,
+        about half with a due date, some with links
+    '''
+    rnd = random.Random( seed )
+    projects = [ 'SVCPLAN', 'SECURITY', 'IRIS' ]
+    params = []
+    for i in range( num ):
+        project = rnd.choice( projects )
+        key = f'{project}-{rnd.randint( 1, 50000 )}'
+        due = f'2025-{rnd.randint( 1, 12 ):02d}-{rnd.randint( 1, 28 ):02d}' if rnd.random() < 0.5 else None
+        links = [ f'is a child of {project}-{rnd.randint( 1, 50000 )}' ] if rnd.random() < 0.8 else []
+        params.append( {
+            'key': key,
+            'issue_type': 'child',
+            'child': key,
+            'summary': f'Summary of {key}',
+            'server_url': 'https://jira.example.com',
+            'url': f'https://jira.example.com/browse/{key}',
+            'due': due,
+            'in_sprint': '',
+            'epic': None,
+            'links': links,
+            } )
+    return params
+
+
+def timed( fn, repeat ):
+    ''' Median seconds of repeat calls to fn() '''
+    times = []
+    for _ in range( repeat ):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append( time.perf_counter() - start )
+    return statistics.median( times )
+
+
+def measure_memory( params ):
+    ''' Bytes allocated per instance, including its links '''
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    issues = [ simple_issue( **p ) for p in params ]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # don't count the list holding them
+    list_bytes = 8 * len( issues )
+    return ( after - before - list_bytes ) / len( issues )
+
+
+def run():
+    args = get_args()
+    params = mk_params( args.num_issues, args.seed )
+    issues = [ simple_issue( **p ) for p in params ]
+    results = {
+        'bytes per instance': measure_memory( params ),
+        'create (s)': timed( lambda: [ simple_issue( **p ) for p in params ], args.repeat ),
+        'sort (s)': timed( lambda: sorted( issues ), args.repeat ),
+        'hash into set (s)': timed( lambda: set( issues ), args.repeat ),
+        'dict lookups (s)': timed( lambda: [ d[i] for d in [ dict.fromkeys( issues, 0 ) ] for i in issues ], args.repeat ),
+        }
+    print( f'{args.num_issues} simple_issues, median of {args.repeat} runs' )
+    for name, val in results.items():
+        fmt = f'{val:.0f}' if name.startswith( 'bytes' ) else f'{val:.4f}'
+        print( f'  {name:20} {fmt}' )
+
+
+if __name__ == '__main__':
+    run()
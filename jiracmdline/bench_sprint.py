@@ -0,0 +1,112 @@
+#!/usr/local/bin/python3
+
+import argparse
+import csv
+import gc
+import random
+import statistics
+import time
+import libsprint
+
+# Module level resources
+resources = {}
+
+
+def get_args( params=None ):
+    key = 'args'
+    if key not in resources:
+        constructor_args = {
+            'formatter_class': argparse.RawDescriptionHelpFormatter,
+            'description': (
+                'Micro-benchmark of libsprint: time to parse many values of'
+                ' customfield "Sprint", drawn from a few distinct sprints.'
+                ),
+        }
+        parser = argparse.ArgumentParser( **constructor_args )
+        parser.add_argument( '-n', '--num_values', type=int, default=100000,
+            help='Number of sprint values (default: %(default)s)' )
+        parser.add_argument( '-s', '--num_sprints', type=int, default=50,
+            help='Number of distinct sprints (default: %(default)s)' )
+        parser.add_argument( '-r', '--repeat', type=int, default=5,
+            help='Repeat each timing, report the median (default: %(default)s)' )
+        parser.add_argument( '--seed', type=int, default=0 )
+        resources[key] = parser.parse_args( params )
+    return resources[key]
+
+
+def mk_sprint_json( num ):
+    sprints = []
+    for i in range( 1, num + 1 ):
+        sprints.append( {
+            'id': i,
+            'rapidViewId': 1,
+            'state': 'active' if i == num else 'closed',
+            'name': f'Sprint {i}',
+            'startDate': f'2024-{i % 12 + 1:02d}-01T09:00:00.000-06:00',
+            'endDate': f'2024-{i % 12 + 1:02d}-14T17:00:00.000-06:00',
+            'completeDate': None if i == num else f'2024-{i % 12 + 1:02d}-14T17:00:00.000-06:00',
+            'activatedDate': f'2024-{i % 12 + 1:02d}-01T09:00:00.000-06:00',
+            'sequence': i,
+            'goal': '',
+            'autoStartStop': False,
+            } )
+    return sprints
+
+
+def to_greenhopper_str( s ):
+    vals = ','.join( f'{k}={"<null>" if v is None else str( v ).lower() if isinstance( v, bool ) else v}'
+        for k, v in s.items() )
+    state = s['state'].upper()
+    vals = vals.replace( f'state={s["state"]}', f'state={state}' )
+    return f'{libsprint.greenhopper_prefix}@{s["id"]:x}[{vals}]'
+
+
+def csv_str_to_sprint( line ):
+    ''' The csv.reader parser libsprint used before, for comparison '''
+    csv_start = line.index( '[' ) + 1
+    row = next( csv.reader( [ line[csv_start:-1] ] ) )
+    sprint_data = {}
+    for elem in row:
+        ( k, v ) = elem.split( '=', maxsplit=1 )
+        if k in libsprint.sprint_field_names:
+            sprint_data[k] = v
+    return libsprint.Sprint( **sprint_data )
+
+
+def timed( fn, repeat, before=None ):
+    ''' Median seconds of repeat calls to fn(), before() runs untimed before each '''
+    times = []
+    for _ in range( repeat ):
+        if before:
+            before()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append( time.perf_counter() - start )
+    return statistics.median( times )
+
+
+def run():
+    args = get_args()
+    rnd = random.Random( args.seed )
+    sprints = mk_sprint_json( args.num_sprints )
+    strings = [ to_greenhopper_str( s ) for s in sprints ]
+    picks = [ rnd.randrange( args.num_sprints ) for _ in range( args.num_values ) ]
+    str_values = [ strings[i] for i in picks ]
+    # copies, as json decoding of each issue would make
+    json_values = [ dict( sprints[i] ) for i in picks ]
+    uncached = libsprint._str_to_sprint.__wrapped__
+    clear = lambda: ( libsprint._str_to_sprint.cache_clear(), libsprint._json_to_sprint.cache_clear() )
+    results = {
+        'csv parser, no cache': timed( lambda: [ csv_str_to_sprint( v ) for v in str_values ], args.repeat ),
+        'str parser, no cache': timed( lambda: [ uncached( v ) for v in str_values ], args.repeat ),
+        'str, cached': timed( lambda: [ libsprint.parse_sprint( v ) for v in str_values ], args.repeat, clear ),
+        'json, cached': timed( lambda: [ libsprint.parse_sprint( v ) for v in json_values ], args.repeat, clear ),
+        }
+    print( f'{args.num_values} sprint values of {args.num_sprints} sprints, median of {args.repeat} runs' )
+    for name, val in results.items():
+        print( f'  {name:22} {val:.4f}s' )
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,314 @@
+#!/usr/local/bin/python3
+
+''' End-to-end benchmark of the report modules against the jira stand-in.
+    For each project size a stand-in server is started (jira_standin.py),
+    then each report's run() is timed, for each latency, in its own
+    subprocess so that peak RSS and caches are per report.
+'''
+import argparse
+import contextlib
+import datetime
+import importlib
+import io
+import json
+import logging
+import os
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from tabulate import tabulate
+
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+standin_token = 'benchmark'
+
+# metrics compared against the baseline
+# counts are deterministic, so any increase is a regression
+count_metrics = ( 'http_calls', 'bytes' )
+measured_metrics = ( 'wall_s', 'peak_rss_kb' )
+
+
+def summary_kwargs( jcon ):
+    stories = jcon.jira.search_issues( 'type = Story ORDER BY key', maxResults=20, fields='summary' )
+    return { 'ticket_ids': ' '.join( i.key for i in stories ) }
+
+
+def service_overview_kwargs( jcon ):
+    return { 'service_name': 'Delta' }
+
+
+def worklogs_kwargs( jcon ):
+    return { 'user': 'user1', 'num_weeks': '8' }
+
+
+def tasks_from_description_kwargs( jcon ):
+    jql = 'type = Story and resolved is empty and description ~ TASK ORDER BY key'
+    stories = jcon.jira.search_issues( jql, maxResults=5, fields='summary' )
+    return { 'ticket_ids': ' '.join( i.key for i in stories ) }
+
+
+# report module name -> function returning kwargs for run()
+# tasks_from_description creates issues, keep it last
+reports = {
+    'summary': summary_kwargs,
+    'lost_children': None,
+    'sprint_relatives': None,
+    'service_list': None,
+    'service_overview': service_overview_kwargs,
+    'worklogs': worklogs_kwargs,
+    'tasks_from_description': tasks_from_description_kwargs,
+    }
+
+
+def csv_ints( val ):
+    return [ int( float( v ) ) for v in val.split( ',' ) ]
+
+
+def get_args( params=None ):
+    key = 'args'
+    if key not in resources:
+        constructor_args = {
+            'formatter_class': argparse.RawDescriptionHelpFormatter,
+            'description': 'Time report modules against a local jira stand-in server.',
+            'epilog': (
+                'Results are written as json to OUTPUT and compared with BASELINE.\n'
+                'Exit code is 1 if any result regressed compared to the baseline.\n'
+                'Example:\n'
+                '    ./benchmark.py --sizes 1000 --latencies 0,20 --reports summary,lost_children\n'
+                '    ./benchmark.py --save_baseline\n'
+            )
+        }
+        parser = argparse.ArgumentParser( **constructor_args )
+        parser.add_argument( '-d', '--debug', action='store_true' )
+        parser.add_argument( '-v', '--verbose', action='store_true' )
+        parser.add_argument( '--sizes', type=csv_ints, default=[ 1000, 10000, 100000 ],
+            help='Comma separated project sizes, in issues (default: 1000,10000,100000)' )
+        parser.add_argument( '--latencies', type=csv_ints, default=[ 0, 50 ],
+            help='Comma separated per request latencies, in ms (default: 0,50)' )
+        parser.add_argument( '--reports', type=lambda v: v.split( ',' ), default=list( reports ),
+            help=f"Comma separated report modules (default: {','.join( reports )})" )
+        parser.add_argument( '--port', type=int, default=8091,
+            help='Port for the stand-in server (default: %(default)s)' )
+        parser.add_argument( '-o', '--output', default='benchmark_results.json',
+            help='Results file (default: %(default)s)' )
+        parser.add_argument( '-b', '--baseline', default='benchmark_baseline.json',
+            help='Baseline file (default: %(default)s)' )
+        parser.add_argument( '--save_baseline', action='store_true',
+            help='Also write the results as the new baseline' )
+        parser.add_argument( '--tolerance', type=float, default=0.25,
+            help='Allowed relative increase of wall time and peak RSS (default: %(default)s)' )
+        parser.add_argument( '--repeat', type=int, default=3,
+            help='Runs per case, the median wall time is reported (default: %(default)s)' )
+        parser.add_argument( '--min_delta', type=float, default=0.1,
+            help='Wall time changes below this many seconds are noise (default: %(default)s)' )
+        parser.add_argument( '--timeout', type=int, default=1800,
+            help='Seconds allowed per report run (default: %(default)s)' )
+        # used internally to run one report in a subprocess
+        parser.add_argument( '--run_case', help=argparse.SUPPRESS )
+        parser.add_argument( '--server', help=argparse.SUPPRESS )
+        resources[key] = parser.parse_args( params )
+    return resources[key]
+
+
+def standin_call( server, path, data=None ):
+    req = urllib.request.Request( f'{server}/_standin/{path}' )
+    if data is not None:
+        req.data = json.dumps( data ).encode()
+        req.add_header( 'Content-Type', 'application/json' )
+    with urllib.request.urlopen( req, timeout=60 ) as r:
+        return json.load( r )
+
+
+@contextlib.contextmanager
+def standin_server( size, port ):
+    ''' Run jira_standin.py in a subprocess until the with block exits '''
+    server = f'http://localhost:{port}'
+    cmd = [ sys.executable, 'jira_standin.py', '--issues', str( size ), '--port', str( port ) ]
+    proc = subprocess.Popen( cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL )
+    try:
+        # generating a large project takes a while
+        for _ in range( 600 ):
+            if proc.poll() is not None:
+                raise UserWarning( f'Stand-in server exited with code {proc.returncode}' )
+            try:
+                standin_call( server, 'stats' )
+                break
+            except OSError:
+                time.sleep( 0.5 )
+        else:
+            raise UserWarning( f'Stand-in server did not start at {server}' )
+        yield server
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_case( report, server ):
+    ''' Run one report against server (in this process), return its measurements '''
+    import jira_connection
+    import libjira
+    mod = importlib.import_module( report )
+    jcon = jira_connection.Jira_Connection( libjira.jira_login( token=standin_token, jira_server=server ) )
+    kwargs = reports[ report ]( jcon ) if reports[ report ] else {}
+    rss_before = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+    standin_call( server, 'reset', {} )
+    error = None
+    start = time.perf_counter()
+    try:
+        # reports print progress and text output, only the timing matters here
+        with contextlib.redirect_stdout( io.StringIO() ):
+            mod.run( current_user=jcon, **kwargs )
+    except Exception as e:
+        logr.exception( f'{report} failed' )
+        error = f'{type( e ).__name__}: {e}'
+    wall = time.perf_counter() - start
+    stats = standin_call( server, 'stats' )
+    return {
+        'wall_s': round( wall, 3 ),
+        'http_calls': stats['total_requests'],
+        'bytes': stats['bytes'],
+        'peak_rss_kb': resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss,
+        'rss_before_kb': rss_before,
+        'calls_by_type': stats['requests'],
+        'error': error,
+        }
+
+
+def run_case_subprocess( report, server, timeout ):
+    cmd = [ sys.executable, __file__, '--run_case', report, '--server', server ]
+    env = dict( os.environ, JIRA_PROJECT='SVC' )
+    try:
+        p = subprocess.run( cmd, capture_output=True, text=True, timeout=timeout, env=env )
+    except subprocess.TimeoutExpired:
+        return { 'error': f'timeout after {timeout}s' }
+    if p.returncode != 0:
+        return { 'error': p.stderr.strip().splitlines()[-1] if p.stderr.strip() else f'exit {p.returncode}' }
+    return json.loads( p.stdout.strip().splitlines()[-1] )
+
+
+def run_all( args ):
+    results = []
+    for size in args.sizes:
+        logr.info( f'Starting stand-in with {size} issues' )
+        with standin_server( size, args.port ) as server:
+            for latency in args.latencies:
+                standin_call( server, 'config', { 'latency': latency } )
+                for report in args.reports:
+                    logr.info( f'{report} size={size} latency={latency}ms' )
+                    rv = { 'report': report, 'size': size, 'latency_ms': latency }
+                    runs = [ run_case_subprocess( report, server, args.timeout )
+                        for _ in range( args.repeat ) ]
+                    # counts come from the first run, later runs may see changes
+                    # made by earlier ones (tasks_from_description creates issues)
+                    rv.update( runs[0] )
+                    if not any( r.get( 'error' ) for r in runs ):
+                        rv['wall_s'] = round( statistics.median( r['wall_s'] for r in runs ), 3 )
+                        rv['wall_s_runs'] = [ r['wall_s'] for r in runs ]
+                        rv['peak_rss_kb'] = max( r['peak_rss_kb'] for r in runs )
+                    results.append( rv )
+                    if rv.get( 'error' ):
+                        logr.warning( f"{report} size={size} latency={latency}ms: {rv['error']}" )
+    return {
+        'created': datetime.datetime.now().isoformat( timespec='seconds' ),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        }
+
+
+def case_id( r ):
+    return ( r['report'], r['size'], r['latency_ms'] )
+
+
+def compare( results, baseline, tolerance, min_delta ):
+    ''' Return ( table rows, list of regression messages ) '''
+    old = { case_id( r ): r for r in baseline['results'] }
+    rows = []
+    regressions = []
+    for r in results['results']:
+        b = old.get( case_id( r ), {} )
+        row = [ r['report'], r['size'], r['latency_ms'] ]
+        for metric in measured_metrics + count_metrics:
+            new_val = r.get( metric )
+            old_val = b.get( metric )
+            if new_val is None or not old_val:
+                row.append( new_val )
+                continue
+            change = ( new_val - old_val ) / old_val
+            row.append( f'{new_val} ({change:+.0%})' )
+            allowed = tolerance if metric in measured_metrics else 0
+            if metric == 'wall_s' and new_val - old_val < min_delta:
+                continue
+            if change > allowed:
+                regressions.append( f'{case_id( r )} {metric}: {old_val} -> {new_val} ({change:+.0%})' )
+        if r.get( 'error' ) and not b.get( 'error' ):
+            regressions.append( f"{case_id( r )} failed: {r['error']}" )
+        rows.append( row )
+    return rows, regressions
+
+
+def run():
+    args = get_args()
+    if args.run_case:
+        print( json.dumps( run_case( args.run_case, args.server ) ) )
+        return
+    unknown = set( args.reports ) - set( reports )
+    if unknown:
+        raise UserWarning( f"Unknown reports: {', '.join( sorted( unknown ) )}" )
+
+    results = run_all( args )
+    pathlib.Path( args.output ).write_text( json.dumps( results, indent=2 ) )
+    logr.info( f'Results written to {args.output}' )
+
+    baseline_path = pathlib.Path( args.baseline )
+    regressions = []
+    if baseline_path.exists():
+        baseline = json.loads( baseline_path.read_text() )
+        rows, regressions = compare( results, baseline, args.tolerance, args.min_delta )
+        print( f'Compared with baseline {args.baseline} ({baseline["created"]})' )
+    else:
+        rows = [ [ r['report'], r['size'], r['latency_ms'] ]
+            + [ r.get( m ) for m in measured_metrics + count_metrics ]
+            for r in results['results'] ]
+    headers = [ 'report', 'size', 'latency_ms' ] + list( measured_metrics + count_metrics )
+    print( tabulate( rows, headers ) )
+    for r in results['results']:
+        if r.get( 'error' ):
+            print( f"ERROR {case_id( r )}: {r['error']}" )
+    for msg in regressions:
+        print( f'REGRESSION {msg}' )
+
+    if args.save_baseline:
+        baseline_path.write_text( json.dumps( results, indent=2 ) )
+        print( f'Saved baseline {args.baseline}' )
+    if regressions:
+        sys.exit( 1 )
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    # Configure logging
+    loglvl = logging.WARNING
+    if args.verbose:
+        loglvl = logging.INFO
+    if args.debug:
+        loglvl = logging.DEBUG
+    fmtstr = '%(levelname)s:%(pathname)s.%(module)s.%(funcName)s[%(lineno)d] %(message)s'
+    logging.basicConfig( level=loglvl, format=fmtstr )
+
+    no_debug = [
+        'urllib3',
+    ]
+    for key in no_debug:
+        logging.getLogger(key).setLevel(logging.CRITICAL)
+
+    run()
@@ -0,0 +1,96 @@
+import collections
+import libcache
+import logging
+import os
+import threading
+import time
+from jira_connection import Jira_Connection
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+
+class Connection_Pool:
+    ''' Logged in Jira_Connections, keyed by a hash of the user's token.
+        Reusing a connection reuses its requests.Session (keep-alive, TLS)
+        and skips the login round trips.
+        Least recently used connections are dropped when the pool is full,
+        and any connection idle for longer than idle_timeout seconds.
+    '''
+
+    def __init__( self, max_size=100, idle_timeout=1800 ):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.connections = collections.OrderedDict() # token_id -> [ conn, last_used ]
+        self.lock = threading.Lock()
+
+
+    def get( self, token ):
+        ''' Return a Jira_Connection for token, logging in only if needed.
+            Each call gets its own identity map over the shared login.
+        '''
+        tid = libcache.token_id( token )
+        with self.lock:
+            self._expire_idle()
+            if tid in self.connections:
+                self.connections.move_to_end( tid )
+                item = self.connections[ tid ]
+                item[1] = time.monotonic()
+                # identity map is per request, the pooled connection is shared
+                return item[0].with_new_identity_map()
+        conn = Jira_Connection.from_user_token( personal_access_token=token )
+        if conn.jira is None:
+            # login failed, don't keep it
+            return conn
+        with self.lock:
+            self.connections[ tid ] = [ conn, time.monotonic() ]
+            self.connections.move_to_end( tid )
+            while len( self.connections ) > self.max_size:
+                _, ( old, _ ) = self.connections.popitem( last=False )
+                self._close( old )
+        return conn.with_new_identity_map()
+
+
+    def discard( self, token ):
+        ''' Drop the connection for token (e.g. on logout) '''
+        with self.lock:
+            item = self.connections.pop( libcache.token_id( token ), None )
+        if item:
+            self._close( item[0] )
+
+
+    def _expire_idle( self ):
+        ''' Caller must hold self.lock '''
+        now = time.monotonic()
+        expired = [ k for k, ( _, last_used ) in self.connections.items()
+                    if now - last_used > self.idle_timeout ]
+        for k in expired:
+            conn, _ = self.connections.pop( k )
+            self._close( conn )
+
+
+    @staticmethod
+    def _close( conn ):
+        try:
+            conn.jira.close()
+        except Exception as e:
+            logr.debug( f'error closing connection: {e}' )
+
+
+    def __len__( self ):
+        return len( self.connections )
+
+
+def get_pool():
+    key = 'pool'
+    if key not in resources:
+        resources[key] = Connection_Pool(
+            max_size=int( os.getenv( 'JCL_POOL_SIZE', '100' ) ),
+            idle_timeout=int( os.getenv( 'JCL_POOL_IDLE_TIMEOUT', '1800' ) ),
+            )
+    return resources[key]
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -1,20 +1,87 @@
+import collections
+import concurrent.futures
 import csv
+import datetime
+import json
+import jira.exceptions
+import jira.resources
+import libcache
+import libfields
+import libgraph
 import libjira
 import liblink
+import libmetrics
 import logging
+import os
 import pprint
+import threading
 
+# Custom type for results of Jira_Connection.map_issues
+Map_Result = collections.namedtuple( 'Map_Result', [ 'item', 'result', 'error' ] )
+
+# Module level resources
 logr = logging.getLogger( __name__ )
+resources = {}
+thread_state = threading.local()
+
+
+def get_max_in_flight():
+    ''' Max concurrent requests to one jira server (env var JCL_MAX_IN_FLIGHT) '''
+    key = 'max_in_flight'
+    if key not in resources:
+        resources[key] = int( os.getenv( 'JCL_MAX_IN_FLIGHT', '8' ) )
+    return resources[key]
+
+
+def get_server_semaphore( server ):
+    ''' Semaphore shared by all connections to the same jira server '''
+    key = f'semaphore_{server}'
+    if key not in resources:
+        resources.setdefault( key, threading.BoundedSemaphore( get_max_in_flight() ) )
+    return resources[key]
+
+
+def get_worklog_fetch():
+    ''' How get_worklogs_between() fetches worklogs (env var JCL_WORKLOG_FETCH):
+        "issue": one request per issue, bounded with startedAfter / startedBefore
+        "bulk": worklog/updated + worklog/list, all worklogs updated in the window
+    '''
+    key = 'worklog_fetch'
+    if key not in resources:
+        val = os.getenv( 'JCL_WORKLOG_FETCH', 'issue' )
+        if val not in ( 'issue', 'bulk' ):
+            raise UserWarning( f"JCL_WORKLOG_FETCH must be 'issue' or 'bulk', not '{val}'" )
+        resources[key] = val
+    return resources[key]
+
+
+def worklog_started_date( raw ):
+    ''' Date a worklog started, in the worklog's own time zone '''
+    return datetime.date.fromisoformat( raw['started'][:10] )
+
+
+def date_to_millis( day ):
+    return int( datetime.datetime.combine( day, datetime.time() ).timestamp() * 1000 )
+
 
 class Jira_Connection( object ):
-    def __init__( self, conn ):
+    def __init__( self, conn, user_id=None ):
         self.jira = conn
+        if conn is not None:
+            # also counts calls made on self.jira directly (via __getattr__)
+            libmetrics.instrument( conn._session )
+        # identifies whose token conn uses, for the shared issue cache
+        self.user_id = user_id if user_id else f'conn-{id(self)}'
+        # identity map of issues loaded during this request / cmdline run
+        # maps issue key -> ( fields, Issue )
+        self.issue_cache = {}
+        self.issue_cache_lock = threading.Lock()
 
 
     @classmethod
     def from_user_token( cls, personal_access_token ):
         conn = libjira.jira_login( token=personal_access_token )
-        return cls( conn )
+        return cls( conn, user_id=libcache.token_id( personal_access_token ) )
 
 
     def __getattr__( self, name ):
@@ -23,38 +90,387 @@ class Jira_Connection( object ):
         return getattr( self.jira, name )
 
 
-    def run_jql( self, jql ):
-        return self.jira.search_issues( jql, maxResults=9999 )
+    def run_jql( self, jql, fields=None, validate=True, json_result=False ):
+        ''' fields: comma separated String of field names (see libfields)
+                    None means all fields
+            validate: if False, jira ignores unknown values in the jql
+                      (e.g. keys that don't exist) instead of failing
+            json_result: if True, return the raw issue dicts instead of
+                      jira Issue objects (see simple_issue.from_raw)
+        '''
+        return list( self.iter_jql( jql, fields=fields, validate=validate, json_result=json_result ) )
 
 
-    def get_issue_by_key( self, key ):
-        ''' key: String
+    def iter_jql_pages( self, jql, page_size=100, prefetch=False, fields=None, validate=True, json_result=False ):
+        ''' Yield search results one page (list of Issues) at a time.
+            If prefetch is True, the next page is requested on a background
+            thread while the caller processes the current one.
+            If json_result is True, pages are lists of raw issue dicts.
+        '''
+        @libmetrics.bind_scope
+        def get_page( start ):
+            ''' Return ( list of issues, total matching ) '''
+            result = self.jira.search_issues(
+                jql,
+                startAt=start,
+                maxResults=page_size,
+                validate_query=validate,
+                fields=fields,
+                json_result=json_result
+                )
+            if json_result:
+                return ( result['issues'], result['total'] )
+            return ( result, result.total )
+
+        with concurrent.futures.ThreadPoolExecutor( max_workers=1 ) as executor:
+            start = 0
+            pending = executor.submit( get_page, start ) if prefetch else None
+            while True:
+                page, total = pending.result() if prefetch else get_page( start )
+                start += len( page )
+                more = len( page ) > 0 and start < total
+                if prefetch and more:
+                    pending = executor.submit( get_page, start )
+                if page:
+                    yield page
+                if not more:
+                    break
+
+
+    def iter_jql( self, jql, page_size=100, prefetch=False, fields=None, validate=True, json_result=False ):
+        ''' Yield issues matching jql, fetched page by page.
+            Callers that don't hold on to the raw Issues keep memory flat.
+        '''
+        pages = self.iter_jql_pages(
+            jql,
+            page_size=page_size,
+            prefetch=prefetch,
+            fields=fields,
+            validate=validate,
+            json_result=json_result
+            )
+        for page in pages:
+            yield from page
+
+
+    def _get_cached_issue( self, key, fields ):
+        with self.issue_cache_lock:
+            try:
+                cached_fields, issue = self.issue_cache[ key.upper() ]
+            except KeyError:
+                return None
+        if libfields.covers( cached_fields, fields ):
+            return issue
+        return None
+
+
+    def _cache_issue( self, issue, fields ):
+        with self.issue_cache_lock:
+            self.issue_cache[ issue.key ] = ( fields, issue )
+
+
+    def forget_issues( self, keys ):
+        ''' Drop issues from the identity map and the shared issue cache,
+            so the next get reloads them.
+            Must be called for every issue changed by a write.
         '''
-        return self.jira.issue( key )
+        with self.issue_cache_lock:
+            for key in keys:
+                self.issue_cache.pop( str( key ).upper(), None )
+        libcache.get_issue_cache().forget( self.jira.server_url, keys )
+        libgraph.mark_stale( self.jira.server_url, keys )
 
 
-    def get_issues_by_keys( self, keys ):
+    def with_new_identity_map( self ):
+        ''' Connection sharing this one's login and session, with an empty
+            identity map of its own (e.g. one per web request)
+        '''
+        return type( self )( self.jira, user_id=self.user_id )
+
+
+    def _issue_from_raw( self, raw ):
+        return jira.resources.Issue( self.jira._options, self.jira._session, raw=raw )
+
+
+    def _share_issue( self, issue, fields ):
+        ''' issue: jira Issue or its raw json '''
+        raw = issue if isinstance( issue, dict ) else issue.raw
+        libcache.get_issue_cache().put( self.jira.server_url, raw, fields, self.user_id )
+
+
+    def _get_shared_issues( self, keys, fields, json_result=False ):
+        ''' Return dict of key -> Issue (raw json if json_result) for the keys that can be served
+            from the shared issue cache. Stale entries are revalidated
+            with a single search for their "updated" field; ones that
+            changed are reloaded by the caller, ones that didn't come back
+            (deleted, or not visible to this user) are dropped.
+        '''
+        cache = libcache.get_issue_cache()
+        server = self.jira.server_url
+        found = {}
+        stale = {}
+        for key in keys:
+            entry = cache.get( server, key, self.user_id, fields )
+            if entry is None:
+                continue
+            if cache.is_fresh( entry ):
+                cache.hit()
+                found[ entry.raw['key'] ] = entry
+            else:
+                stale[ entry.raw['key'] ] = entry
+        if stale:
+            try:
+                issues = self._search_keys( stale.keys(), 'updated' )
+                current = { i.key: i.fields.updated for i in issues }
+            except jira.exceptions.JIRAError as e:
+                # reload them all the normal way
+                logr.debug( f'revalidation failed: {e}' )
+                current = None
+            gone = []
+            for key, entry in stale.items():
+                if current is not None and key in current and current[ key ] == entry.updated:
+                    cache.mark_valid( entry )
+                    cache.hit( revalidated=True )
+                    found[ key ] = entry
+                else:
+                    cache.stale()
+                    if current is not None and key not in current:
+                        gone.append( key )
+            cache.forget( server, gone )
+        if json_result:
+            return { k: e.raw for k,e in found.items() }
+        return { k: self._issue_from_raw( e.raw ) for k,e in found.items() }
+
+
+    def get_issue_by_key( self, key, fields=None ):
+        ''' key: String
+        '''
+        key = getattr( key, 'key', key )
+        issue = self._get_cached_issue( key, fields )
+        if issue is None:
+            issue = self._get_shared_issues( [ key ], fields ).get( key.upper() )
+            if issue is None:
+                fetch_fields = libfields.with_updated( fields )
+                issue = self.jira.issue( key, fields=fetch_fields )
+                self._share_issue( issue, fetch_fields )
+            self._cache_issue( issue, fields )
+        return issue
+
+
+    def _search_keys( self, keys, fields, extra_jql=None, chunk_size=100, json_result=False ):
+        ''' Search for keys with "key in (...)", chunk_size keys per search,
+            chunks run concurrently. Keys that don't exist (or can't be seen
+            by this user) are skipped instead of failing the search.
+        '''
+        keys = list( keys )
+        jqls = []
+        for i in range( 0, len( keys ), chunk_size ):
+            csv = ",".join( keys[ i:i+chunk_size ] )
+            jql = f'key in ({csv})'
+            if extra_jql:
+                jql = f'{jql} AND {extra_jql}'
+            jqls.append( jql )
+        results = self.map_issues(
+            lambda jql: self.run_jql( jql, fields=fields, validate=False, json_result=json_result ),
+            jqls
+            )
+        issues = []
+        for r in results:
+            if r.error:
+                raise r.error
+            issues.extend( r.result )
+        return issues
+
+
+    def find_issues_by_keys( self, keys, fields=None, json_result=False ):
         ''' keys: List of Strings
+            Return ( issues, missing_keys ), issues are in the same order
+            as keys (duplicates removed); missing_keys were not found.
+            Issues already in the identity map are not fetched again.
+            json_result: if True, return the raw issue dicts, the ones
+                fetched are not added to the identity map
         '''
-        csv = ",".join( keys )
-        return self.run_jql( f'key in ({csv})' )
+        issues = {}
+        missing = []
+        for key in keys:
+            issue = self._get_cached_issue( key, fields )
+            if issue is None:
+                missing.append( key )
+            else:
+                issues[ key.upper() ] = issue.raw if json_result else issue
+        if missing:
+            shared = self._get_shared_issues( missing, fields, json_result=json_result )
+            if not json_result:
+                for issue in shared.values():
+                    self._cache_issue( issue, fields )
+            issues.update( shared )
+            missing = [ k for k in missing if k.upper() not in shared ]
+        if missing:
+            fetch_fields = libfields.with_updated( fields )
+            requested = { k.upper() for k in missing }
+            moved = False
+            for issue in self._search_keys( missing, fetch_fields, json_result=json_result ):
+                self._share_issue( issue, fetch_fields )
+                if not json_result:
+                    self._cache_issue( issue, fields )
+                key = liblink.get_key( issue )
+                issues[ key ] = issue
+                moved = moved or key not in requested
+            if moved:
+                # jira finds moved (or renamed) issues by their old key, but
+                # returns the new one; look up the keys left over one by one
+                leftover = [ k for k in requested if k not in issues ]
+                for r in self.map_issues( lambda k: self.jira.issue( k, fields=fetch_fields ), leftover ):
+                    if r.error is not None:
+                        if getattr( r.error, 'status_code', None ) == 404:
+                            continue
+                        raise r.error
+                    issues[ r.item ] = r.result.raw if json_result else r.result
+        unique_keys = dict.fromkeys( k.upper() for k in keys )
+        found = [ issues[k] for k in unique_keys if k in issues ]
+        not_found = [ k for k in unique_keys if k not in issues ]
+        return ( found, not_found )
+
+
+    def get_issues_by_keys( self, keys, fields=None, json_result=False ):
+        ''' keys: List of Strings
+            Like find_issues_by_keys, but missing keys are only logged.
+        '''
+        issues, missing = self.find_issues_by_keys( keys, fields=fields, json_result=json_result )
+        if missing:
+            logr.warning( f'Issues not found: {missing}' )
+        return issues
+
+
+    def reload_issue( self, issue, fields=None ):
+        return self.get_issue_by_key( issue.key, fields=fields )
+
+
+    def reload_issues( self, issues, fields=None ):
+        results = self.map_issues( lambda i: self.reload_issue( i, fields=fields ), issues )
+        for r in results:
+            if r.error:
+                raise r.error
+        return [ r.result for r in results ]
+
+
+    def map_issues( self, fn, items ):
+        ''' Call fn( item ) for each item on a thread pool, with at most
+            get_max_in_flight() calls in flight per jira server.
+            Return a list of Map_Result, in the same order as items.
+            Exceptions raised by fn are returned in Map_Result.error.
+            Nested calls (fn itself calls map_issues) run serially in the
+            calling thread, which already holds a slot.
+        '''
+        items = list( items )
+        if not items:
+            return []
+
+        def call( item ):
+            try:
+                return Map_Result( item, fn( item ), None )
+            except Exception as e:
+                return Map_Result( item, None, e )
+
+        if getattr( thread_state, 'in_flight', False ):
+            return [ call( i ) for i in items ]
+
+        semaphore = get_server_semaphore( self.jira.server_url )
+
+        @libmetrics.bind_scope
+        def bounded_call( item ):
+            with semaphore:
+                thread_state.in_flight = True
+                try:
+                    return call( item )
+                finally:
+                    thread_state.in_flight = False
+
+        workers = min( get_max_in_flight(), len( items ) )
+        with concurrent.futures.ThreadPoolExecutor( max_workers=workers ) as executor:
+            return list( executor.map( bounded_call, items ) )
+
+
+    def get_worklogs_between( self, issues, start, end ):
+        ''' Worklogs of issues that started on dates start through end
+            (datetime.date). Only worklogs around that window are requested,
+            see get_worklog_fetch().
+            Return a list of Map_Result( issue, list of Worklogs, error ),
+            in the same order as issues.
+        '''
+        issues = list( issues )
+        if get_worklog_fetch() == 'bulk':
+            by_id = self._bulk_worklogs_between( issues, start, end )
+            return [ Map_Result( i, by_id.get( str( i.id ), [] ), None ) for i in issues ]
+        return self.map_issues( lambda i: self._issue_worklogs_between( i, start, end ), issues )
+
+
+    def _worklogs_from_raw( self, raws, start, end ):
+        return [ jira.resources.Worklog( self.jira._options, self.jira._session, raw=w )
+            for w in raws if start <= worklog_started_date( w ) <= end ]
+
+
+    def _issue_worklogs_between( self, issue, start, end ):
+        ''' Servers that ignore startedAfter / startedBefore return all of
+            the issue's worklogs, the result is filtered here in any case
+        '''
+        # a day of margin for time zones, jira compares timestamps
+        oneday = datetime.timedelta( days=1 )
+        params = {
+            'startedAfter': date_to_millis( start - oneday ),
+            'startedBefore': date_to_millis( end + 2 * oneday ),
+            }
+        raws = []
+        while True:
+            data = self.jira._get_json( f'issue/{issue.key}/worklog', params=dict( params, startAt=len( raws ) ) )
+            raws.extend( data['worklogs'] )
+            if not data['worklogs'] or len( raws ) >= data['total']:
+                break
+        return self._worklogs_from_raw( raws, start, end )
 
 
-    def reload_issue( self, issue ):
-        return self.get_issue_by_key( issue.key )
+    def _post_worklog_list( self, ids ):
+        r = self.jira._session.post( self.jira._get_url( 'worklog/list' ), data=json.dumps( { 'ids': ids } ) )
+        return r.json()
 
 
-    def reload_issues( self, issues ):
-        return [ self.reload_issue(i) for i in issues ]
+    def _bulk_worklogs_between( self, issues, start, end, chunk_size=1000 ):
+        ''' Ids of all worklogs updated since the window started (a worklog
+            is updated no earlier than it is logged), then those worklogs
+            in chunks, concurrently. Return dict issue id -> list of Worklogs.
+        '''
+        wanted = { str( i.id ) for i in issues }
+        since = date_to_millis( start - datetime.timedelta( days=1 ) )
+        ids = {}
+        while True:
+            data = self.jira._get_json( 'worklog/updated', params={ 'since': since } )
+            ids.update( dict.fromkeys( v['worklogId'] for v in data['values'] ) )
+            if data.get( 'lastPage', True ) or not data['values']:
+                break
+            since = data['until']
+        ids = list( ids )
+        chunks = [ ids[ i:i+chunk_size ] for i in range( 0, len( ids ), chunk_size ) ]
+        raws = collections.defaultdict( list )
+        for chunk, result, err in self.map_issues( self._post_worklog_list, chunks ):
+            if err:
+                raise err
+            for w in result:
+                if str( w['issueId'] ) in wanted:
+                    raws[ str( w['issueId'] ) ].append( w )
+        return { k: self._worklogs_from_raw( v, start, end ) for k, v in raws.items() }
 
 
     @staticmethod
     def get_issue_type( issue ):
+        if isinstance( issue, dict ):
+            return issue['fields']['issuetype']['name']
         return issue.fields.issuetype.name
 
 
     @staticmethod
     def get_labels( issue ):
+        if isinstance( issue, dict ):
+            return issue['fields']['labels']
         return issue.fields.labels
 
 
@@ -62,7 +478,10 @@ class Jira_Connection( object ):
     def get_epic_key( issue ) :
         ''' Epic that this issue is a part of
             In jira, this is customfield "Epic Link" and is unique per instance
+            issue: jira Issue or its raw json
         '''
+        if isinstance( issue, dict ):
+            return issue['fields'].get( libfields.EPIC_LINK )
         try:
             # key = issue.fields.customfield_10536 #jira-old
             key = issue.fields.customfield_10102
@@ -76,7 +495,10 @@ class Jira_Connection( object ):
         ''' The name of the epic. Assumes "issue" is an epic.
             If "issue" is not an epic, return None.
             In jira, this is customfield "Epic Name" and is unique per instance
+            issue: jira Issue or its raw json
         '''
+        if isinstance( issue, dict ):
+            return issue['fields'].get( libfields.EPIC_NAME )
         try:
             # name = issue.fields.customfield_10537 #jira-old
             name = issue.fields.customfield_10104
@@ -85,19 +507,35 @@ class Jira_Connection( object ):
         return name
 
 
-    def get_parent( self, issue ):
+    def get_parent( self, issue, fields=None ):
         try:
             parent_key = issue.fields.parent
         except AttributeError:
             parent = None
         else:
-            parent = self.get_issue_by_key( parent_key )
+            parent = self.get_issue_by_key( parent_key, fields=fields )
         return parent
 
 
-    def get_linked_parent( self, issue ):
-        jql = f'issue in linkedIssues( {issue.key}, "is a child of" )'
-        issues = self.run_jql( jql )
+    def get_project_graph( self, project ):
+        ''' The libgraph.Project_Graph of project, or None if not indexed '''
+        return libgraph.get_graph( self, project )
+
+
+    def _graph_for_key( self, key ):
+        graph = self.get_project_graph( self.get_project_key( key ) )
+        if graph is not None and key in graph:
+            return graph
+        return None
+
+
+    def get_linked_parent( self, issue, fields=None ):
+        graph = self._graph_for_key( issue.key )
+        if graph is not None:
+            issues = self.get_issues_by_keys( graph.get_parents( issue.key ), fields=fields )
+        else:
+            jql = f'issue in linkedIssues( {issue.key}, "is a child of" )'
+            issues = self.run_jql( jql, fields=fields )
         qty = len( issues )
         if qty > 1:
             raise UserWarning( f"Found more than one parent for '{issue.key}'" )
@@ -108,30 +546,87 @@ class Jira_Connection( object ):
         return parent
 
 
-    def get_linked_children( self, parent ):
+    def get_linked_children( self, parent, fields=None ):
+        graph = self._graph_for_key( parent.key )
+        if graph is not None:
+            return self.get_issues_by_keys( graph.get_children( parent.key ), fields=fields )
         jql = f'issue in linkedIssues( {parent.key}, "is the parent of" )'
-        return self.run_jql( jql )
+        return self.run_jql( jql, fields=fields )
 
 
-    def get_project_key( self, issue ):
-        return issue.key.split('-')[0]
+    def get_linked_parents_bulk( self, issues, fields=None, json_result=False ):
+        ''' issues: list of jira Issues (or their raw json)
+            Return dict mapping issue key -> linked parent (or None).
+            Parent keys come from the project graph if there is one, else
+            from the "issuelinks" on each issue; all parents are then loaded
+            with a few chunked "key in (...)" searches.
+            json_result: if True, parents are raw issue dicts
+        '''
+        parent_keys = {}
+        for i in issues:
+            key = liblink.get_key( i )
+            graph = self._graph_for_key( key )
+            if graph is not None:
+                keys = graph.get_parents( key )
+            else:
+                keys = [ p.key for p in liblink.get_linked_parents( i ) ]
+            if len( keys ) > 1:
+                raise UserWarning( f"Found more than one parent for '{key}'" )
+            parent_keys[ key ] = keys[0] if keys else None
+        unique_keys = list( dict.fromkeys( k for k in parent_keys.values() if k ) )
+        parents = { liblink.get_key( p ): p
+            for p in self.get_issues_by_keys( unique_keys, fields=fields, json_result=json_result ) }
+        return { k: parents.get( pkey ) for k, pkey in parent_keys.items() }
+
+
+    def get_linked_children_bulk( self, parents, fields=None, json_result=False ):
+        ''' parents: list of jira Issues (or their raw json)
+            Return dict mapping parent key -> list of linked children.
+            Child keys are read from the "issuelinks" on each parent, then all
+            children are loaded with a few chunked "key in (...)" searches
+            instead of one linkedIssues() search per parent.
+            json_result: if True, children are raw issue dicts
+        '''
+        child_keys = {}
+        for p in parents:
+            child_keys[ liblink.get_key( p ) ] = [ c.key for c in liblink.get_linked_children( p ) ]
+        unique_keys = list( dict.fromkeys( k for keys in child_keys.values() for k in keys ) )
+        children = { liblink.get_key( c ): c
+            for c in self.get_issues_by_keys( unique_keys, fields=fields, json_result=json_result ) }
+        return {
+            pkey: [ children[k] for k in keys if k in children ]
+            for pkey, keys in child_keys.items()
+            }
 
 
-    def get_issues_in_epic( self, issue_key, stories_only=False, exclude_completed_issues=True ):
+    def get_project_key( self, issue ):
+        return getattr( issue, 'key', issue ).split('-')[0]
+
+
+    def get_issues_in_epic( self, issue_key, stories_only=False, exclude_completed_issues=True, fields=None,
+            json_result=False ):
+        ''' issue_key: key of the epic, or the epic (jira Issue or its raw json) '''
+        if not isinstance( issue_key, str ):
+            issue_key = liblink.get_key( issue_key )
+        graph = self._graph_for_key( issue_key )
+        if graph is not None:
+            keys = graph.get_issues_in_epic( issue_key, stories_only, exclude_completed_issues )
+            return self.get_issues_by_keys( keys, fields=fields, json_result=json_result )
         jql = f'"Epic Link" = {issue_key}'
         if stories_only:
             jql = f'{jql} and type = Story'
         if exclude_completed_issues:
             jql = f'{jql} and resolved is empty'
-        return self.run_jql( jql )
+        return self.run_jql( jql, fields=fields, json_result=json_result )
 
 
-    def get_stories_in_epic( self, issue_key ):
-        return self.get_issues_in_epic( issue_key, stories_only=True )
+    def get_stories_in_epic( self, issue_key, fields=None, json_result=False ):
+        return self.get_issues_in_epic( issue_key, stories_only=True, fields=fields, json_result=json_result )
 
 
     def print_issue_summary( self, issue, parts=None ):
-        # force reload of issue
+        # force reload of issue, the identity map and shared cache may hold an older copy
+        self.forget_issues( [ issue.key ] )
         i = self.reload_issue( issue )
         print( f"{i}" )
         print( f"\tSummary: {i.fields.summary}" )
@@ -155,6 +650,7 @@ class Jira_Connection( object ):
             inwardIssue=parent.key,
             outwardIssue=child.key
         )
+        self.forget_issues( [ parent.key, child.key ] )
 
 
     def add_tasks_to_epic( self, issue_list, epic_key ):
@@ -163,6 +659,7 @@ class Jira_Connection( object ):
             'issue_keys': [ i.key for i in issue_list ],
             }
         result = self.jira.add_issues_to_epic( **params )
+        self.forget_issues( params['issue_keys'] + [ epic_key ] )
         logr.debug( f"Add to epic results: '{pprint.pformat( result ) }'" )
         result.raise_for_status() # https://requests.readthedocs.io/en/latest/api/#requests.Response
 
@@ -191,6 +688,7 @@ class Jira_Connection( object ):
                     child_issues.append( child )
                 else:
                     logr.warn( f"Error creating child ticket: '{pprint.pformat( result )}'" )
+            self.forget_issues( [ parent.key ] )
         return child_issues
 
 
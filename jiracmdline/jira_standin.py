@@ -0,0 +1,455 @@
+#!/usr/local/bin/python3
+
+''' Local jira stand-in server.
+    Serves a synthetic project (see standin_data.py) through the parts of
+    the jira REST api used by jiracmdline, with optional injected latency,
+    so reports can be run and timed without a real jira server.
+    Point reports at it with: JIRA_SERVER=http://localhost:8080
+'''
+import argparse
+import datetime
+import flask
+import libfields
+import libjql
+import logging
+import re
+import standin_data
+import threading
+import time
+
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+app = flask.Flask( __name__ )
+
+# Fields returned by /field, jira.JIRA uses clauseNames to translate names
+field_defs = [
+    ( 'summary', 'Summary', [ 'summary' ] ),
+    ( 'description', 'Description', [ 'description' ] ),
+    ( 'issuetype', 'Issue Type', [ 'issuetype', 'type' ] ),
+    ( 'project', 'Project', [ 'project' ] ),
+    ( 'created', 'Created', [ 'created', 'createdDate' ] ),
+    ( 'updated', 'Updated', [ 'updated', 'updatedDate' ] ),
+    ( 'duedate', 'Due Date', [ 'due', 'duedate' ] ),
+    ( 'resolution', 'Resolution', [ 'resolution' ] ),
+    ( 'resolutiondate', 'Resolved', [ 'resolved', 'resolutiondate' ] ),
+    ( 'issuelinks', 'Linked Issues', [ 'issuelinks' ] ),
+    ( 'labels', 'Labels', [ 'labels' ] ),
+    ( libfields.SPRINT, 'Sprint', [ 'cf[10101]', 'Sprint' ] ),
+    ( libfields.EPIC_LINK, 'Epic Link', [ 'cf[10102]', 'Epic Link' ] ),
+    ( libfields.EPIC_NAME, 'Epic Name', [ 'cf[10104]', 'Epic Name' ] ),
+    ( standin_data.PROGRAMS, 'Programs', [ 'cf[10406]', 'Programs' ] ),
+    ( standin_data.RESEARCH_SYSTEM, 'Research System', [ 'cf[10409]', 'Research System' ] ),
+    ]
+
+
+def get_args( params=None ):
+    key = 'args'
+    if key not in resources:
+        constructor_args = {
+            'formatter_class': argparse.RawDescriptionHelpFormatter,
+            'description': 'Serve a synthetic jira project for local testing and benchmarks.',
+            'epilog': (
+                'Example:\n'
+                '    jira_standin.py --issues 10000 --latency 50 &\n'
+                '    JIRA_SERVER=http://localhost:8080 JIRA_PROJECT=SVC \\\n'
+                '        ./lost_children.py\n'
+            )
+        }
+        parser = argparse.ArgumentParser( **constructor_args )
+        parser.add_argument( '-d', '--debug', action='store_true' )
+        parser.add_argument( '-v', '--verbose', action='store_true' )
+        parser.add_argument( '--host', default='localhost' )
+        parser.add_argument( '--port', type=int, default=8080 )
+        parser.add_argument( '-p', '--project', default='SVC',
+            help='Key of the generated project (default: %(default)s)' )
+        parser.add_argument( '-n', '--issues', type=int, default=1000,
+            help='Number of issues to generate (default: %(default)s)' )
+        parser.add_argument( '--seed', type=int, default=0,
+            help='Random seed, same seed gives the same project (default: %(default)s)' )
+        parser.add_argument( '-l', '--latency', type=float, default=0,
+            help='Milliseconds added to every request (default: %(default)s)' )
+        resources[key] = parser.parse_args( params )
+    return resources[key]
+
+
+def get_store():
+    key = 'store'
+    if key not in resources:
+        resources[key] = standin_data.Store()
+    return resources[key]
+
+
+def get_stats():
+    key = 'stats'
+    if key not in resources:
+        resources[key] = {
+            'lock': threading.Lock(),
+            'requests': {},
+            'bytes': 0,
+            }
+    return resources[key]
+
+
+def setup( num_issues=1000, project='SVC', seed=0, latency=0, base_url='http://localhost:8080' ):
+    ''' (Re)initialize the served data, usable without the cmdline '''
+    store = standin_data.Store( base_url=base_url )
+    standin_data.generate( store, project=project, num_issues=num_issues, seed=seed )
+    resources['store'] = store
+    resources['latency'] = latency / 1000
+    resources.pop( 'stats', None )
+    return store
+
+
+# --- helpers ---
+def error( status, *messages ):
+    body = { 'errorMessages': list( messages ), 'errors': {} }
+    return flask.make_response( flask.jsonify( body ), status )
+
+
+def get_fields_param( params ):
+    ''' Set of requested field names, None for all '''
+    fields = set()
+    for val in params.getlist( 'fields' ) if hasattr( params, 'getlist' ) else [ params.get( 'fields' ) ]:
+        if isinstance( val, list ):
+            fields.update( val )
+        elif val:
+            fields.update( f.strip() for f in val.split( ',' ) )
+    if not fields or fields & { '*all', '*navigable' }:
+        return None
+    return fields
+
+
+def millis_param( name ):
+    ''' Request parameter holding a unix time in ms, as a datetime, or None '''
+    val = flask.request.args.get( name )
+    if val is None:
+        return None
+    return datetime.datetime.fromtimestamp( int( val ) / 1000, standin_data.jira_tz )
+
+
+def to_millis( dt ):
+    return int( dt.timestamp() * 1000 )
+
+
+def get_issue_or_404( key ):
+    store = get_store()
+    rec = store.issues.get( key.upper() )
+    if rec is None:
+        # numeric id
+        rec = next( ( r for r in store.issues.values() if str( r.id ) == key ), None )
+    if rec is None:
+        flask.abort( error( 404, 'Issue Does Not Exist' ) )
+    return rec
+
+
+def current_username():
+    auth = flask.request.authorization
+    if auth and auth.type == 'basic' and auth.username:
+        return auth.username
+    return 'standin'
+
+
+@app.before_request
+def before_request():
+    if not flask.request.path.startswith( '/_standin' ):
+        if not flask.request.headers.get( 'Authorization' ):
+            return error( 401, 'Authentication required' )
+        time.sleep( resources.get( 'latency', 0 ) )
+
+
+@app.after_request
+def after_request( response ):
+    if not flask.request.path.startswith( '/_standin' ):
+        endpoint = flask.request.url_rule.rule if flask.request.url_rule else 'unknown'
+        call = f'{flask.request.method} {endpoint}'
+        stats = get_stats()
+        with stats['lock']:
+            stats['requests'][call] = stats['requests'].get( call, 0 ) + 1
+            stats['bytes'] += response.calculate_content_length() or 0
+    return response
+
+
+# --- stand-in control ---
+@app.route( '/_standin/stats' )
+def standin_stats():
+    stats = get_stats()
+    with stats['lock']:
+        return flask.jsonify( {
+            'requests': dict( stats['requests'] ),
+            'total_requests': sum( stats['requests'].values() ),
+            'bytes': stats['bytes'],
+            'issues': len( get_store().issues ),
+            } )
+
+
+@app.route( '/_standin/reset', methods=[ 'POST' ] )
+def standin_reset():
+    resources.pop( 'stats', None )
+    return flask.jsonify( {} )
+
+
+@app.route( '/_standin/config', methods=[ 'POST' ] )
+def standin_config():
+    ''' Change settings without regenerating the data, e.g. {"latency": 50} '''
+    data = flask.request.get_json()
+    if 'latency' in data:
+        resources['latency'] = float( data['latency'] ) / 1000
+    return flask.jsonify( { 'latency': resources.get( 'latency', 0 ) * 1000 } )
+
+
+# --- jira REST api ---
+@app.route( '/rest/auth/1/session' )
+def session():
+    name = current_username()
+    return flask.jsonify( {
+        'self': f'{get_store().base_url}/rest/api/2/user?username={name}',
+        'name': name,
+        'loginInfo': {},
+        } )
+
+
+@app.route( '/rest/api/2/serverInfo' )
+def server_info():
+    return flask.jsonify( {
+        'baseUrl': get_store().base_url,
+        'version': '9.12.0',
+        'versionNumbers': [ 9, 12, 0 ],
+        'deploymentType': 'Server',
+        'buildNumber': 912000,
+        'serverTitle': 'Jira stand-in',
+        } )
+
+
+@app.route( '/rest/api/2/myself' )
+def myself():
+    return flask.jsonify( get_store().render_user( current_username() ) )
+
+
+@app.route( '/rest/api/2/field' )
+def field():
+    return flask.jsonify( [ {
+        'id': id_,
+        'name': name,
+        'custom': id_.startswith( 'customfield_' ),
+        'navigable': True,
+        'searchable': True,
+        'clauseNames': clause_names,
+        } for id_, name, clause_names in field_defs ] )
+
+
+@app.route( '/rest/api/2/issueLinkType' )
+def issue_link_type():
+    link_type = dict( standin_data.ancestor_link_type,
+        self=f'{get_store().base_url}/rest/api/2/issueLinkType/10300' )
+    return flask.jsonify( { 'issueLinkTypes': [ link_type ] } )
+
+
+@app.route( '/rest/api/2/issuetype' )
+def issue_type():
+    store = get_store()
+    return flask.jsonify( [ store.render_issuetype( n ) for n in ( 'Epic', 'Story', 'Task' ) ] )
+
+
+@app.route( '/rest/api/2/search', methods=[ 'GET', 'POST' ] )
+def search():
+    if flask.request.method == 'POST':
+        params = flask.request.get_json()
+    else:
+        params = flask.request.args
+    jql = params.get( 'jql', '' )
+    start = int( params.get( 'startAt', 0 ) )
+    max_results = min( int( params.get( 'maxResults', 50 ) ), 1000 )
+    validate = str( params.get( 'validateQuery', 'true' ) ).lower() != 'false'
+    fields = get_fields_param( params )
+    store = get_store()
+    try:
+        with store.lock:
+            if validate:
+                unknown = store.unknown_keys( jql )
+                if unknown:
+                    return error( 400, *[
+                        f"An issue with key '{k}' does not exist for field 'key'." for k in unknown ] )
+            hits = store.search( jql )
+    except libjql.JqlError as e:
+        return error( 400, str( e ) )
+    page = hits[ start:start + max_results ]
+    return flask.jsonify( {
+        'expand': 'schema,names',
+        'startAt': start,
+        'maxResults': max_results,
+        'total': len( hits ),
+        'issues': [ store.render( rec, fields ) for rec in page ],
+        } )
+
+
+@app.route( '/rest/api/2/issue/<key>', methods=[ 'GET', 'DELETE' ] )
+def issue( key ):
+    rec = get_issue_or_404( key )
+    if flask.request.method == 'DELETE':
+        get_store().delete_issue( rec.key )
+        return flask.make_response( '', 204 )
+    return flask.jsonify( get_store().render( rec, get_fields_param( flask.request.args ) ) )
+
+
+@app.route( '/rest/api/2/issue/<key>/worklog', methods=[ 'GET', 'POST' ] )
+def worklog( key ):
+    store = get_store()
+    rec = get_issue_or_404( key )
+    if flask.request.method == 'POST':
+        data = flask.request.get_json()
+        started = data.get( 'started' )
+        w = store.add_worklog( rec.key,
+            current_username(),
+            int( data['timeSpentSeconds'] ),
+            started=libjql.parse_jira_datetime( started ) if started else None )
+        return flask.make_response( flask.jsonify( store.render_worklog( rec, w ) ), 201 )
+    # like jira cloud: only worklogs started in [ startedAfter, startedBefore ], in ms
+    after = millis_param( 'startedAfter' )
+    before = millis_param( 'startedBefore' )
+    worklogs = [ store.render_worklog( rec, w ) for w in rec.worklogs
+        if ( after is None or w.started >= after ) and ( before is None or w.started <= before ) ]
+    return flask.jsonify( {
+        'startAt': 0,
+        'maxResults': len( worklogs ),
+        'total': len( worklogs ),
+        'worklogs': worklogs,
+        } )
+
+
+@app.route( '/rest/api/2/worklog/updated' )
+def worklog_updated():
+    since = millis_param( 'since' ) or datetime.datetime.fromtimestamp( 0, standin_data.jira_tz )
+    found, last_page = get_store().worklogs_updated_since( since )
+    values = [ {
+        'worklogId': w.id,
+        'updatedTime': to_millis( w.updated ),
+        'properties': [],
+        } for rec, w in found ]
+    until = values[-1]['updatedTime'] if values else to_millis( since )
+    rv = {
+        'values': values,
+        'since': to_millis( since ),
+        'until': until,
+        'lastPage': last_page,
+        }
+    if not last_page:
+        rv['nextPage'] = f'{get_store().base_url}/rest/api/2/worklog/updated?since={until}'
+    return flask.jsonify( rv )
+
+
+@app.route( '/rest/api/2/worklog/list', methods=[ 'POST' ] )
+def worklog_list():
+    ids = flask.request.get_json().get( 'ids', [] )
+    if len( ids ) > 1000:
+        return error( 400, 'The number of worklog ids cannot exceed 1000.' )
+    store = get_store()
+    return flask.jsonify( [ store.render_worklog( rec, w ) for rec, w in store.get_worklogs_by_ids( ids ) ] )
+
+
+@app.route( '/rest/api/2/group' )
+def group():
+    name = flask.request.args.get( 'groupname', '' )
+    store = get_store()
+    if name not in store.groups:
+        return error( 404, f"The group '{name}' does not exist." )
+    users = store.groups[ name ]
+    # expand=users or users[start:end], 50 per page
+    m = re.fullmatch( r'users\[(\d+):(\d+)\]', flask.request.args.get( 'expand', '' ) )
+    start = int( m.group( 1 ) ) if m else 0
+    page = users[ start:start+50 ]
+    return flask.jsonify( {
+        'name': name,
+        'self': f'{store.base_url}/rest/api/2/group?groupname={name}',
+        'users': {
+            'size': len( users ),
+            'items': [ store.render_user( u ) for u in page ],
+            'max-results': 50,
+            'start-index': start,
+            'end-index': start + len( page ) - 1,
+            },
+        'expand': 'users',
+        } )
+
+
+@app.route( '/rest/api/2/issueLink', methods=[ 'POST' ] )
+def issue_link():
+    data = flask.request.get_json()
+    if data.get( 'type', {} ).get( 'name' ) != 'Ancestor':
+        return error( 400, f"No issue link type with name '{data.get( 'type' )}' found." )
+    parent = get_issue_or_404( data['inwardIssue']['key'] )
+    child = get_issue_or_404( data['outwardIssue']['key'] )
+    get_store().link( parent.key, child.key )
+    return flask.make_response( '', 201 )
+
+
+@app.route( '/rest/api/2/issue/bulk', methods=[ 'POST' ] )
+def issue_bulk():
+    store = get_store()
+    created = []
+    errors = []
+    for i, update in enumerate( flask.request.get_json().get( 'issueUpdates', [] ) ):
+        fields = update.get( 'fields', {} )
+        project = fields.get( 'project', {} ).get( 'key' )
+        if not project or not fields.get( 'summary' ):
+            errors.append( {
+                'status': 400,
+                'failedElementNumber': i,
+                'elementErrors': { 'errorMessages': [], 'errors': { 'summary': 'required' } },
+                } )
+            continue
+        rec = store.add_issue( project,
+            fields.get( 'issuetype', {} ).get( 'name', 'Task' ),
+            fields['summary'],
+            description=fields.get( 'description' ) or '' )
+        created.append( {
+            'id': str( rec.id ),
+            'key': rec.key,
+            'self': f'{store.base_url}/rest/api/2/issue/{rec.id}',
+            } )
+    return flask.make_response( flask.jsonify( { 'issues': created, 'errors': errors } ), 201 )
+
+
+@app.route( '/rest/agile/1.0/epic/<key>/issue', methods=[ 'POST' ] )
+def epic_issues( key ):
+    epic = get_issue_or_404( key )
+    keys = flask.request.get_json().get( 'issues', [] )
+    for k in keys:
+        get_issue_or_404( k )
+    get_store().add_to_epic( epic.key, keys )
+    return flask.make_response( '', 204 )
+
+
+def run():
+    args = get_args()
+    base_url = f'http://{args.host}:{args.port}'
+    start = time.time()
+    store = setup( num_issues=args.issues, project=args.project, seed=args.seed,
+        latency=args.latency, base_url=base_url )
+    elapsed = time.time() - start
+    logr.warning( f'Generated {len( store.issues )} issues in project {args.project}'
+        f' in {elapsed:.1f}s, serving at {base_url}' )
+    app.run( host=args.host, port=args.port, threaded=True )
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    # Configure logging
+    loglvl = logging.WARNING
+    if args.verbose:
+        loglvl = logging.INFO
+    if args.debug:
+        loglvl = logging.DEBUG
+    fmtstr = '%(levelname)s:%(pathname)s.%(module)s.%(funcName)s[%(lineno)d] %(message)s'
+    logging.basicConfig( level=loglvl, format=fmtstr )
+
+    no_debug = [
+        'werkzeug',
+    ]
+    for key in no_debug:
+        logging.getLogger(key).setLevel(logging.CRITICAL)
+
+    run()
@@ -0,0 +1,133 @@
+import collections
+import dataclasses
+import hashlib
+import libfields
+import logging
+import os
+import threading
+import time
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+
+@dataclasses.dataclass
+class Cache_Entry:
+    ''' Raw json of one issue, as last seen on the jira server '''
+    raw: dict
+    fields: str           # field projection used to load raw (None = all)
+    updated: str          # raw['fields']['updated'], the issue version
+    checked: float        # time.time() of the last fetch or revalidation
+    seen_by: set = dataclasses.field( default_factory=set )
+
+
+class Issue_Cache:
+    ''' Process wide LRU + TTL cache of raw issue json.
+        Entries are keyed by (server, issue key) and carry the "updated"
+        timestamp they were loaded at. An entry is only served to a user
+        whose own token has already loaded that issue from jira.
+    '''
+
+    def __init__( self, max_size=5000, ttl=60 ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+
+
+    def get( self, server, key, user_id, fields=None ):
+        ''' Return the Cache_Entry for this issue, or None.
+            The caller must check is_fresh() and revalidate stale entries.
+        '''
+        with self.lock:
+            entry = self.entries.get( ( server, key.upper() ) )
+            if entry is None \
+            or user_id not in entry.seen_by \
+            or not libfields.covers( entry.fields, fields ):
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end( ( server, key.upper() ) )
+            return entry
+
+
+    def put( self, server, raw, fields, user_id ):
+        key = ( server, raw['key'] )
+        updated = raw.get( 'fields', {} ).get( 'updated' )
+        if updated is None:
+            # can't tell versions apart, don't cache
+            return
+        with self.lock:
+            entry = self.entries.get( key )
+            if entry and entry.updated == updated and libfields.covers( entry.fields, fields ):
+                entry.seen_by.add( user_id )
+                entry.checked = time.time()
+            else:
+                seen_by = entry.seen_by if entry and entry.updated == updated else set()
+                seen_by.add( user_id )
+                self.entries[ key ] = Cache_Entry( raw, fields, updated, time.time(), seen_by )
+            self.entries.move_to_end( key )
+            self.counters['puts'] += 1
+            while len( self.entries ) > self.max_size:
+                self.entries.popitem( last=False )
+                self.counters['evictions'] += 1
+
+
+    def is_fresh( self, entry ):
+        return time.time() - entry.checked < self.ttl
+
+
+    def mark_valid( self, entry ):
+        ''' Entry was revalidated against jira and is unchanged '''
+        entry.checked = time.time()
+
+
+    def hit( self, revalidated=False ):
+        with self.lock:
+            self.counters['hits'] += 1
+            if revalidated:
+                self.counters['revalidations'] += 1
+
+
+    def stale( self ):
+        with self.lock:
+            self.counters['misses'] += 1
+            self.counters['stale'] += 1
+
+
+    def forget( self, server, keys ):
+        with self.lock:
+            for key in keys:
+                self.entries.pop( ( server, str( key ).upper() ), None )
+
+
+    def clear( self ):
+        with self.lock:
+            self.entries.clear()
+
+
+    def stats( self ):
+        with self.lock:
+            rv = dict( self.counters )
+            rv['size'] = len( self.entries )
+        return rv
+
+
+def get_issue_cache():
+    key = 'issue_cache'
+    if key not in resources:
+        resources[key] = Issue_Cache(
+            max_size=int( os.getenv( 'JCL_ISSUE_CACHE_SIZE', '5000' ) ),
+            ttl=int( os.getenv( 'JCL_ISSUE_CACHE_TTL', '60' ) ),
+            )
+    return resources[key]
+
+
+def token_id( token ):
+    ''' Stable identifier for a user token that doesn't keep the token itself '''
+    return hashlib.sha256( token.encode() ).hexdigest()
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -0,0 +1,107 @@
+''' Workdays and reporting periods.
+    Holidays are the dates listed in the [holidays] section of the config.
+    Workday counts use numpy business-day arithmetic.
+'''
+import collections
+import datetime
+import libconfig
+import numpy as np
+import pandas as pd
+
+# Custom type for a reporting period, first and last day
+Period = collections.namedtuple( 'Period', [ 'start', 'end' ] )
+
+# period kinds -> name in reports
+period_names = {
+    'week': 'Week',
+    'month': 'Month',
+    'quarter': 'Quarter',
+    'fiscal_year': 'Fiscal year',
+    }
+
+oneday = datetime.timedelta( days=1 )
+
+
+class Workday_Calendar:
+    ''' Monday to Friday, except holidays '''
+
+    def __init__( self, holidays=(), fiscal_year_start=7 ):
+        ''' holidays: datetime.dates
+            fiscal_year_start: first month of the fiscal year
+        '''
+        self.holidays = np.array( sorted( holidays ), dtype='datetime64[D]' )
+        self.busdaycal = np.busdaycalendar( holidays=self.holidays )
+        self.fiscal_year_start = fiscal_year_start
+
+
+    @classmethod
+    def from_config( cls, cfg ):
+        ''' [holidays]: one date per line
+            [calendar] fiscal_year_start_month: optional, default July
+        '''
+        holidays = []
+        if cfg.has_section( 'holidays' ):
+            holidays = [ pd.to_datetime( k ).date() for k in cfg['holidays'] ]
+        fiscal_year_start = cfg.getint( 'calendar', 'fiscal_year_start_month', fallback=7 )
+        return cls( holidays, fiscal_year_start )
+
+
+    def workdays( self, start, end ):
+        ''' Number of workdays from start through end (datetime.date) '''
+        return int( np.busday_count( start, end + oneday, busdaycal=self.busdaycal ) )
+
+
+    def workdays_many( self, periods ):
+        ''' Number of workdays of each period, as a list '''
+        starts = np.array( [ p.start for p in periods ], dtype='datetime64[D]' )
+        ends = np.array( [ p.end for p in periods ], dtype='datetime64[D]' ) + 1
+        return np.busday_count( starts, ends, busdaycal=self.busdaycal ).tolist()
+
+
+    def period_start( self, kind, day ):
+        ''' First day of the period of kind that day is in '''
+        if kind == 'week':
+            return day - datetime.timedelta( days=day.weekday() )
+        if kind == 'month':
+            return day.replace( day=1 )
+        if kind == 'quarter':
+            return day.replace( month=( day.month - 1 ) // 3 * 3 + 1, day=1 )
+        if kind == 'fiscal_year':
+            year = day.year if day.month >= self.fiscal_year_start else day.year - 1
+            return datetime.date( year, self.fiscal_year_start, 1 )
+        raise UserWarning( f"Unknown period '{kind}', expected one of: {', '.join( period_names )}" )
+
+
+    def period_end( self, kind, start ):
+        ''' Last day of the period of kind starting on start '''
+        if kind == 'week':
+            return start + datetime.timedelta( days=6 )
+        months = { 'month': 1, 'quarter': 3, 'fiscal_year': 12 }[kind]
+        return add_months( start, months ) - oneday
+
+
+    def periods( self, kind='week', num=4, today=None ):
+        ''' The current period of kind and the num-1 periods before it,
+            newest first
+        '''
+        start = self.period_start( kind, today or datetime.date.today() )
+        rv = []
+        for _ in range( num ):
+            rv.append( Period( start, self.period_end( kind, start ) ) )
+            start = self.period_start( kind, start - oneday )
+        return rv
+
+
+def add_months( day, months ):
+    ''' First day of the month "months" after the month of day '''
+    n = day.year * 12 + day.month - 1 + months
+    return datetime.date( n // 12, n % 12 + 1, 1 )
+
+
+def get_calendar( path=None ):
+    ''' Workday_Calendar of the config file, built again when it changes '''
+    return libconfig.load( path or libconfig.get_config_path(), Workday_Calendar.from_config )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -0,0 +1,46 @@
+''' The ini config (env var JCL_CONFIG, default conf/config.ini) and objects
+    compiled from it. Compiled objects are shared by all requests of the
+    web service, and built again when the file changes.
+'''
+import configparser
+import os
+
+# Module level resources
+resources = {}
+
+
+def get_config_path():
+    envvar = 'JCL_CONFIG'
+    default_fn = 'conf/config.ini'
+    return os.getenv( envvar, default_fn )
+
+
+def read_config( path ):
+    cfg = configparser.ConfigParser( allow_no_value=True )
+    cfg.optionxform = str
+    cfg.read( path )
+    return cfg
+
+
+def get_mtime( path ):
+    try:
+        return os.stat( path ).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def load( path, build ):
+    ''' build( cfg ) of the config file at path, cached until the file's
+        mtime changes
+    '''
+    key = f'{build.__qualname__}_{path}'
+    mtime = get_mtime( path )
+    cached = resources.get( key )
+    if cached is None or cached[0] != mtime:
+        cached = ( mtime, build( read_config( path ) ) )
+        resources[key] = cached
+    return cached[1]
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -0,0 +1,65 @@
+''' Field projections for jira searches.
+    Each report declares the fields it reads, so searches don't pull
+    descriptions, comments and every customfield for every issue.
+'''
+
+# customfields are unique per jira instance
+SPRINT = 'customfield_10101'
+EPIC_LINK = 'customfield_10102'
+EPIC_NAME = 'customfield_10104'
+
+# fields read by simple_issue.from_src (incl. liblink and libsprint)
+simple_issue = (
+    'summary',
+    'issuetype',
+    'duedate',
+    'resolution',
+    'issuelinks',
+    SPRINT,
+    EPIC_LINK,
+    EPIC_NAME,
+    )
+
+# fields read when evaluating jql offline (see libjql, libsnapshot)
+jql = (
+    'project',
+    'created',
+    'updated',
+    'resolutiondate',
+    'description',
+    'labels',
+    )
+
+
+def mk_fields( *groups ):
+    ''' Combine groups of field names into the comma separated string
+        expected by the "fields" parameter of the jira api
+    '''
+    fields = []
+    for group in groups:
+        for f in group:
+            if f not in fields:
+                fields.append( f )
+    return ','.join( fields )
+
+
+def covers( have, want ):
+    ''' True if an issue loaded with fields "have" has every field in "want"
+        (None means all fields)
+    '''
+    if have is None:
+        return True
+    if want is None:
+        return False
+    return set( want.split( ',' ) ) <= set( have.split( ',' ) )
+
+
+def with_updated( fields ):
+    ''' Add the "updated" field (the issue version) to a projection '''
+    if fields is None or covers( fields, 'updated' ):
+        return fields
+    return f'{fields},updated'
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
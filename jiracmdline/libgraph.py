@@ -0,0 +1,349 @@
+''' In-memory Epic -> Story -> child index of a jira project.
+    Built from one paged scan of the project (issue type, issuelinks,
+    "Epic Link", resolution), then kept current with searches for the
+    issues updated since. Answers parent / children / epic / issues-in-epic
+    by key, without a linkedIssues() or "Epic Link" search per issue.
+    The index is built in the background with the .netrc account, so it
+    is complete whoever asks. Only keys are indexed; callers load the
+    issues themselves, with their own permissions, which drops the ones
+    they can't see.
+'''
+import collections
+import jira_connection
+import libfields
+import libjira
+import libjql
+import libmetrics
+import logging
+import math
+import os
+import threading
+import time
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+resources_lock = threading.Lock()
+
+# fields needed to build the index
+graph_fields = libfields.mk_fields( (
+    'issuetype',
+    'issuelinks',
+    'resolution',
+    'updated',
+    libfields.EPIC_LINK,
+    ) )
+
+link_type_name = 'Ancestor'
+
+
+class Project_Graph:
+    ''' Parent/child links ("Ancestor" link type) and epic membership of
+        the issues of one project. Links to issues in other projects are
+        kept too, as seen from this project's side.
+    '''
+
+    def __init__( self, project ):
+        self.project = project.upper()
+        self.lock = threading.RLock()
+        self.issue_type = {}                       # key -> issue type name (lower case)
+        self.resolved = {}                         # key -> bool
+        self.epic_of = {}                          # key -> epic key
+        self.members = collections.defaultdict( set )   # epic key -> keys in that epic
+        self.parents = collections.defaultdict( set )   # key -> parent keys
+        self.children = collections.defaultdict( set )  # key -> child keys
+        self.edges = collections.Counter()         # ( parent, child ) -> issues reporting it
+        self.edges_of = {}                         # key -> edges in the issuelinks of key
+        self.stale = set()                         # keys changed by a write
+        self.built = None                          # time.time() of the last full scan
+        self.refreshed = None                      # time.time() of the last update
+
+
+    def __contains__( self, key ):
+        ''' Stale keys changed since the last refresh, look them up in jira '''
+        key = key.upper()
+        with self.lock:
+            return key in self.issue_type and key not in self.stale
+
+
+    def __len__( self ):
+        return len( self.issue_type )
+
+
+    # --- updating ---
+    def _add_edge( self, edge ):
+        self.edges[ edge ] += 1
+        if self.edges[ edge ] == 1:
+            parent, child = edge
+            self.parents[ child ].add( parent )
+            self.children[ parent ].add( child )
+
+
+    def _drop_edge( self, edge ):
+        self.edges[ edge ] -= 1
+        if self.edges[ edge ] <= 0:
+            del self.edges[ edge ]
+            parent, child = edge
+            self.parents[ child ].discard( parent )
+            self.children[ parent ].discard( child )
+
+
+    def _set_epic( self, key, epic ):
+        old = self.epic_of.pop( key, None )
+        if old:
+            self.members[ old ].discard( key )
+        if epic:
+            self.epic_of[ key ] = epic
+            self.members[ epic ].add( key )
+
+
+    def put( self, raw ):
+        ''' Add or replace one issue, raw: issue json with graph_fields '''
+        key = raw['key'].upper()
+        fields = raw['fields']
+        edges = set()
+        for link in fields.get( 'issuelinks' ) or []:
+            if link['type']['name'] != link_type_name:
+                continue
+            if 'outwardIssue' in link:
+                edges.add( ( key, link['outwardIssue']['key'].upper() ) )
+            else:
+                edges.add( ( link['inwardIssue']['key'].upper(), key ) )
+        epic = fields.get( libfields.EPIC_LINK )
+        with self.lock:
+            for edge in self.edges_of.pop( key, () ):
+                self._drop_edge( edge )
+            for edge in edges:
+                self._add_edge( edge )
+            self.edges_of[ key ] = edges
+            self._set_epic( key, epic.upper() if epic else None )
+            self.issue_type[ key ] = ( fields.get( 'issuetype' ) or {} ).get( 'name', '' ).lower()
+            self.resolved[ key ] = bool( fields.get( 'resolution' ) )
+            self.stale.discard( key )
+
+
+    def remove( self, keys ):
+        with self.lock:
+            for key in keys:
+                key = key.upper()
+                for edge in self.edges_of.pop( key, () ):
+                    self._drop_edge( edge )
+                self._set_epic( key, None )
+                self.issue_type.pop( key, None )
+                self.resolved.pop( key, None )
+                self.stale.discard( key )
+
+
+    def mark_stale( self, keys ):
+        ''' Issues changed by a write, reloaded by the next refresh '''
+        with self.lock:
+            self.stale.update( k.upper() for k in keys if k.upper() in self.issue_type )
+
+
+    def _scan( self, jcon, jql ):
+        ''' Put the issues matching jql, return their keys '''
+        keys = set()
+        for page in jcon.iter_jql_pages( jql, page_size=1000, fields=graph_fields, validate=False, json_result=True ):
+            for raw in page:
+                self.put( raw )
+                keys.add( raw['key'].upper() )
+        return keys
+
+
+    def build( self, jcon ):
+        ''' Index the whole project with one paged search. Run it on a new
+            graph, lookups on this one don't wait for the scan.
+        '''
+        start = time.time()
+        self._scan( jcon, f'project = {self.project}' )
+        self.built = self.refreshed = start
+        logr.info( f'Indexed {len( self )} issues of {self.project} in {time.time() - start:.2f}s' )
+
+
+    def refresh( self, jcon ):
+        ''' Re-index issues updated since the last build/refresh, and the
+            ones changed by writes through a Jira_Connection
+        '''
+        start = time.time()
+        with self.lock:
+            minutes = math.ceil( ( start - self.refreshed ) / 60 ) + 1
+            stale = sorted( self.stale )
+        jql = f'project = {self.project} AND updated >= -{minutes}m'
+        if stale:
+            jql = f'{jql} OR key in ({",".join( stale )})'
+        # lookups go on during the scan, each put() takes the lock
+        found = self._scan( jcon, jql )
+        with self.lock:
+            # stale keys that didn't come back were deleted or moved
+            self.remove( [ k for k in stale if k not in found ] )
+            self.refreshed = start
+        logr.debug( f'Re-indexed {len( found )} issues of {self.project}' )
+
+
+    # --- lookups ---
+    # under self.lock, refresh() changes the sets from the Graph_Loop thread
+    def get_parents( self, key ):
+        with self.lock:
+            keys = tuple( self.parents.get( key.upper(), () ) )
+        return sorted( keys, key=libjql.key_number )
+
+
+    def get_children( self, key ):
+        with self.lock:
+            keys = tuple( self.children.get( key.upper(), () ) )
+        return sorted( keys, key=libjql.key_number )
+
+
+    def get_epic( self, key ):
+        with self.lock:
+            return self.epic_of.get( key.upper() )
+
+
+    def get_issues_in_epic( self, epic_key, stories_only=False, exclude_completed_issues=True ):
+        keys = []
+        with self.lock:
+            for k in self.members.get( epic_key.upper(), () ):
+                if stories_only and self.issue_type.get( k ) != 'story':
+                    continue
+                if exclude_completed_issues and self.resolved.get( k ):
+                    continue
+                keys.append( k )
+        return sorted( keys, key=libjql.key_number )
+
+
+    def get_stories_in_epic( self, epic_key ):
+        return self.get_issues_in_epic( epic_key, stories_only=True )
+
+
+def get_graph_projects():
+    ''' Projects to index (env var JCL_PROJECT_GRAPH, comma separated) '''
+    key = 'graph_projects'
+    if key not in resources:
+        names = os.getenv( 'JCL_PROJECT_GRAPH', '' )
+        resources[key] = { n.strip().upper() for n in names.split( ',' ) if n.strip() }
+    return resources[key]
+
+
+def get_refresh_interval():
+    ''' Seconds between refreshes (env var JCL_GRAPH_REFRESH) '''
+    key = 'refresh_interval'
+    if key not in resources:
+        resources[key] = int( os.getenv( 'JCL_GRAPH_REFRESH', '60' ) )
+    return resources[key]
+
+
+def get_rebuild_interval():
+    ''' Seconds between full scans, which also drop deleted issues
+        (env var JCL_GRAPH_REBUILD)
+    '''
+    key = 'rebuild_interval'
+    if key not in resources:
+        resources[key] = int( os.getenv( 'JCL_GRAPH_REBUILD', '3600' ) )
+    return resources[key]
+
+
+class Graph_Loop( threading.Thread ):
+    ''' Build the graph of one project, then refresh it every
+        refresh_interval seconds (sooner after a write) and rebuild it every
+        rebuild_interval seconds, in the background.
+        Logs in to jira with the credentials in ~/.netrc.
+    '''
+
+    def __init__( self, project, refresh_interval=60, rebuild_interval=3600 ):
+        super().__init__( daemon=True, name=f'graph-{project}' )
+        self.project = project
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.server_url = libjira.get_server_url( libjira.get_jira_server() )
+        self.graph = None
+        self.last_error = None
+        self.wake = threading.Event()
+        self.done = threading.Event()
+
+
+    def run( self ):
+        libmetrics.set_scope( f'graph:{self.project}' )
+        jcon = None
+        while not self.done.is_set():
+            self.wake.clear()
+            try:
+                if jcon is None:
+                    jcon = jira_connection.Jira_Connection( libjira.jira_login() )
+                graph = self.graph
+                if graph is None or time.time() - graph.built >= self.rebuild_interval:
+                    new_graph = Project_Graph( self.project )
+                    new_graph.build( jcon )
+                    if graph is not None:
+                        # writes made during the scan
+                        new_graph.mark_stale( graph.stale )
+                    self.graph = new_graph
+                else:
+                    graph.refresh( jcon )
+                self.last_error = None
+            except Exception as e:
+                logr.exception( f'Indexing {self.project} failed' )
+                self.last_error = str( e )
+                jcon = None
+            self.wake.wait( self.refresh_interval )
+
+
+    def stop( self ):
+        self.done.set()
+        self.wake.set()
+        self.join()
+
+
+    def is_fresh( self ):
+        ''' Built, and refreshed within the last few intervals '''
+        if self.graph is None:
+            return False
+        return time.time() - self.graph.refreshed <= 3 * self.refresh_interval + 60
+
+
+def get_graph_loop( project ):
+    ''' The (started) Graph_Loop of project '''
+    key = f'loop_{project}'
+    if key not in resources:
+        with resources_lock:
+            if key not in resources:
+                loop = Graph_Loop( project,
+                    refresh_interval=get_refresh_interval(),
+                    rebuild_interval=get_rebuild_interval() )
+                loop.start()
+                resources[key] = loop
+    return resources[key]
+
+
+def start_graph_loops():
+    ''' Start indexing every project in JCL_PROJECT_GRAPH '''
+    for project in get_graph_projects():
+        get_graph_loop( project )
+
+
+def get_graph( jcon, project ):
+    ''' Project_Graph of project on the server of jcon, or None if project
+        is not indexed, or its index isn't built yet or is out of date.
+        Shared by all connections to the server, never waits for a scan.
+        Only start_graph_loops() (the web service) starts indexing, a
+        cmdline run would exit before the scan is done.
+    '''
+    loop = resources.get( f'loop_{project.upper()}' )
+    if loop is None or loop.server_url != jcon.server_url or not loop.is_fresh():
+        return None
+    return loop.graph
+
+
+def mark_stale( server_url, keys ):
+    ''' Hook for writes: issues in keys changed on server_url '''
+    by_project = collections.defaultdict( list )
+    for k in keys:
+        by_project[ str( k ).split( '-' )[0].upper() ].append( str( k ) )
+    for project, project_keys in by_project.items():
+        loop = resources.get( f'loop_{project}' )
+        if loop is not None and loop.server_url == server_url and loop.graph is not None:
+            loop.graph.mark_stale( project_keys )
+            loop.wake.set()
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -0,0 +1,183 @@
+''' Group membership from LDAP, cached.
+    One LDAP connection is opened, bound once and reused. A group's
+    members are expanded through nested groups (uniqueMember entries that
+    are groups themselves) and cached for JCL_GROUP_CACHE_TTL seconds.
+    Entries older than JCL_GROUP_REFRESH seconds are still served, and
+    refreshed in the background. Callers that can't wait for LDAP get None
+    after a timeout and can ask jira instead (membersOf()); the lookup
+    keeps running and fills the cache for the next report.
+'''
+import collections
+import concurrent.futures
+import ldap3
+import ldap3.utils.conv
+import logging
+import os
+import threading
+import time
+
+# Custom type for a cached group expansion
+Group_Entry = collections.namedtuple( 'Group_Entry', [ 'users', 'fetched' ] )
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+
+class Group_Directory:
+    ''' Cached, nested group expansion against one LDAP server '''
+
+    def __init__( self, url, search_base, ttl=86400, refresh_after=3600, connect_timeout=5 ):
+        self.url = url
+        self.search_base = search_base
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.connect_timeout = connect_timeout
+        self.cache = {}         # group -> Group_Entry
+        self.pending = {}       # group -> Future of a lookup in progress
+        self.lock = threading.Lock()
+        self.conn = None
+        self.conn_lock = threading.Lock()
+
+
+    def _connect( self ):
+        ''' Anonymous bind, without reading the server schema '''
+        server = ldap3.Server( self.url, get_info=ldap3.NONE, connect_timeout=self.connect_timeout )
+        conn = ldap3.Connection( server, receive_timeout=self.connect_timeout )
+        if not conn.bind():
+            raise UserWarning( 'Error: Could not bind to LDAP server' )
+        return conn
+
+
+    def _direct_members( self, group ):
+        ''' uniqueMember DNs of group, on the shared connection '''
+        search_filter = f'(cn={ldap3.utils.conv.escape_filter_chars( group )})'
+        with self.conn_lock:
+            for attempt in ( 1, 2 ):
+                try:
+                    if self.conn is None:
+                        self.conn = self._connect()
+                    found = self.conn.search( self.search_base, search_filter, ldap3.SUBTREE,
+                        attributes=[ 'uniqueMember' ] )
+                    entries = self.conn.entries
+                    break
+                except ldap3.core.exceptions.LDAPException:
+                    # server closed an idle connection, reconnect once
+                    self.conn = None
+                    if attempt == 2:
+                        raise
+        if not found:
+            raise UserWarning( f'Error: Could not find group {group}' )
+        return list( entries[0].uniqueMember.values )
+
+
+    def expand( self, group ):
+        ''' Usernames of all members of group, including members of nested
+            groups, in the order found. Each nested group is searched once.
+        '''
+        users = {}
+        seen = set()
+        todo = collections.deque( [ group ] )
+        while todo:
+            g = todo.popleft()
+            if g in seen:
+                continue
+            seen.add( g )
+            for dn in self._direct_members( g ):
+                attr, _, val = dn.split( ',' )[0].partition( '=' )
+                if attr.lower() == 'cn':
+                    todo.append( val )
+                else:
+                    users[val] = None
+        logr.debug( f'group {group}: {len( users )} users in {len( seen )} groups' )
+        return list( users )
+
+
+    def _lookup( self, group, future ):
+        try:
+            users = self.expand( group )
+            with self.lock:
+                self.cache[group] = Group_Entry( users, time.time() )
+            future.set_result( users )
+        except Exception as e:
+            future.set_exception( e )
+        finally:
+            with self.lock:
+                self.pending.pop( group, None )
+
+
+    def prefetch( self, group ):
+        ''' Start a lookup of group in the background, unless one is
+            already running. Return its Future.
+        '''
+        with self.lock:
+            future = self.pending.get( group )
+            if future is None:
+                future = concurrent.futures.Future()
+                self.pending[group] = future
+                threading.Thread( target=self._lookup, args=( group, future ),
+                    name=f'ldap-{group}', daemon=True ).start()
+        return future
+
+
+    def cached( self, group ):
+        ''' Cached members of group, None if not cached or expired.
+            Start a background refresh of entries due for one.
+        '''
+        with self.lock:
+            entry = self.cache.get( group )
+        if entry is None:
+            return None
+        age = time.time() - entry.fetched
+        if age >= self.ttl:
+            return None
+        if age >= self.refresh_after:
+            self.prefetch( group )
+        return entry.users
+
+
+    def members( self, group, timeout=None ):
+        ''' Members of group, waiting at most timeout seconds for LDAP.
+            Return None if LDAP is too slow or unavailable.
+            A group that doesn't exist raises UserWarning.
+        '''
+        users = self.cached( group )
+        if users is not None:
+            return users
+        try:
+            return self.prefetch( group ).result( timeout=timeout )
+        except concurrent.futures.TimeoutError:
+            logr.warning( f'LDAP lookup of group {group} took more than {timeout}s' )
+        except UserWarning:
+            raise
+        except Exception as e:
+            logr.warning( f'LDAP lookup of group {group} failed: {e}' )
+        return None
+
+
+def get_directory():
+    ''' The Group_Directory shared by all requests.
+        Env vars: JCL_LDAP_SERVER, JCL_LDAP_BASE, JCL_GROUP_CACHE_TTL,
+        JCL_GROUP_REFRESH.
+    '''
+    key = 'directory'
+    if key not in resources:
+        resources[key] = Group_Directory(
+            os.getenv( 'JCL_LDAP_SERVER', 'ldaps://ldap3.ncsa.illinois.edu' ),
+            os.getenv( 'JCL_LDAP_BASE', 'dc=ncsa,dc=illinois,dc=edu' ),
+            ttl=int( os.getenv( 'JCL_GROUP_CACHE_TTL', '86400' ) ),
+            refresh_after=int( os.getenv( 'JCL_GROUP_REFRESH', '3600' ) ),
+            )
+    return resources[key]
+
+
+def get_timeout():
+    ''' Seconds a report waits for LDAP before asking jira (env var JCL_LDAP_TIMEOUT) '''
+    key = 'timeout'
+    if key not in resources:
+        resources[key] = float( os.getenv( 'JCL_LDAP_TIMEOUT', '2' ) )
+    return resources[key]
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -4,22 +4,37 @@ import jira_connection
 import logging
 import netrc
 import os
+import urllib.parse
 
 # Module level resources
 logr = logging.getLogger( __name__ )
 resources = {}
 
 
-def jira_login( token=None, jira_server=None, username=None, passwd=None ):
+def get_jira_server( jira_server=None ):
     if not jira_server:
         try:
             jira_server = os.environ[ 'JIRA_SERVER' ]
         except KeyError as e:
             raise UserWarning( 'Jira Server missing. Set JIRA_SERVER environment variable' )
-    params = {
-        'server': f'https://{jira_server}',
-        'validate': True,
-    }
+    return jira_server
+
+
+def get_server_url( jira_server ):
+    ''' jira_server is a hostname (https is assumed) or a full url,
+        e.g. http://localhost:8080 for the local stand-in server
+    '''
+    if '://' in jira_server:
+        return jira_server.rstrip( '/' )
+    return f'https://{jira_server}'
+
+
+def get_auth_params( token=None, jira_server=None, username=None, passwd=None ):
+    ''' Return dict with either "token_auth" or "basic_auth",
+        as expected by jira.JIRA()
+    '''
+    jira_server = get_jira_server( jira_server )
+    params = {}
     if token:
         logr.info( f'Login using token from params' )
         logr.debug( f"Got token '{token}' from params" )
@@ -30,7 +45,8 @@ def jira_login( token=None, jira_server=None, username=None, passwd=None ):
     else:
         # attempt to get username & passwd from netrc file
         nrc = netrc.netrc()
-        login, account, pwd = nrc.authenticators( jira_server )
+        host = urllib.parse.urlsplit( get_server_url( jira_server ) ).hostname
+        login, account, pwd = nrc.authenticators( host )
         # if "account" is defined, assume it is a Personal Access Token
         # prefer token over username/passwd
         if account:
@@ -40,6 +56,16 @@ def jira_login( token=None, jira_server=None, username=None, passwd=None ):
         else:
             logr.debug( f'Login using usr/pwd from .netrc' )
             params[ 'basic_auth' ] = ( login, pwd )
+    return params
+
+
+def jira_login( token=None, jira_server=None, username=None, passwd=None ):
+    jira_server = get_jira_server( jira_server )
+    params = {
+        'server': get_server_url( jira_server ),
+        'validate': True,
+    }
+    params.update( get_auth_params( token, jira_server, username, passwd ) )
     raw_connection = None
     try:
         raw_connection = jira.JIRA( **params )
@@ -0,0 +1,421 @@
+''' Evaluate JQL against raw issue json (as returned by the jira REST api).
+    Covers the JQL used by this project (see jira_connection.py and
+    worklogs.mk_jql), not all of JQL. Used by the jira stand-in server
+    and the offline project snapshot.
+'''
+import datetime
+import libfields
+import logging
+import re
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+
+# JQL field names -> where to find the value
+field_aliases = {
+    'type': 'issuetype',
+    'issuetype': 'issuetype',
+    'epic link': libfields.EPIC_LINK,
+    'epic name': libfields.EPIC_NAME,
+    'sprint': libfields.SPRINT,
+    'resolved': 'resolutiondate',
+    'resolutiondate': 'resolutiondate',
+    'due': 'duedate',
+    'duedate': 'duedate',
+    }
+
+token_pattern = re.compile( r'''
+    \s*(?:
+      (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<op>!=|>=|<=|!~|=|~|>|<)
+    | (?P<punct>[(),])
+    | (?P<word>[^\s(),"'=!~<>]+)
+    )''', re.VERBOSE )
+
+
+class JqlError( Exception ):
+    pass
+
+
+def tokenize( jql ):
+    tokens = []
+    pos = 0
+    jql = jql.rstrip()
+    while pos < len( jql ):
+        m = token_pattern.match( jql, pos )
+        if not m or m.end() == pos:
+            raise JqlError( f"Unable to parse jql at '{jql[pos:]}'" )
+        pos = m.end()
+        kind = m.lastgroup
+        val = m.group( kind )
+        if kind == 'string':
+            val = val[1:-1].replace( '\\"', '"' ).replace( "\\'", "'" )
+        tokens.append( ( kind, val ) )
+    return tokens
+
+
+class Parser:
+    ''' Recursive descent parser, builds a tree of tuples:
+        ( 'or', [ nodes ] ), ( 'and', [ nodes ] ), ( 'not', node ),
+        ( 'clause', field, op, value )
+        value is a str, a list of values, or ( 'func', name, [ args ] )
+    '''
+
+    def __init__( self, jql ):
+        self.tokens = tokenize( jql )
+        self.pos = 0
+        self.order_by = []
+
+
+    def peek( self, offset=0 ):
+        try:
+            return self.tokens[ self.pos + offset ]
+        except IndexError:
+            return ( None, None )
+
+
+    def peek_word( self, offset=0 ):
+        kind, val = self.peek( offset )
+        return val.lower() if kind == 'word' else None
+
+
+    def next( self ):
+        tok = self.peek()
+        if tok[0] is None:
+            raise JqlError( 'Unexpected end of jql' )
+        self.pos += 1
+        return tok
+
+
+    def expect( self, val ):
+        kind, got = self.next()
+        if got.lower() != val:
+            raise JqlError( f"Expected '{val}', got '{got}'" )
+
+
+    def parse( self ):
+        if self.peek_word() == 'order':
+            tree = ( 'and', [] )
+        else:
+            tree = self.parse_or()
+        if self.peek_word() == 'order':
+            self.next()
+            self.expect( 'by' )
+            self.parse_order_by()
+        if self.peek()[0] is not None:
+            raise JqlError( f"Unexpected '{self.peek()[1]}'" )
+        return tree
+
+
+    def parse_order_by( self ):
+        while True:
+            field = self.next()[1].lower()
+            direction = 'asc'
+            if self.peek_word() in ( 'asc', 'desc' ):
+                direction = self.next()[1].lower()
+            self.order_by.append( ( field, direction ) )
+            if self.peek() != ( 'punct', ',' ):
+                break
+            self.next()
+
+
+    def parse_or( self ):
+        nodes = [ self.parse_and() ]
+        while self.peek_word() == 'or':
+            self.next()
+            nodes.append( self.parse_and() )
+        return nodes[0] if len( nodes ) == 1 else ( 'or', nodes )
+
+
+    def parse_and( self ):
+        nodes = [ self.parse_not() ]
+        while self.peek_word() == 'and':
+            self.next()
+            nodes.append( self.parse_not() )
+        return nodes[0] if len( nodes ) == 1 else ( 'and', nodes )
+
+
+    def parse_not( self ):
+        if self.peek_word() == 'not':
+            self.next()
+            return ( 'not', self.parse_not() )
+        if self.peek() == ( 'punct', '(' ):
+            self.next()
+            node = self.parse_or()
+            self.expect( ')' )
+            return node
+        return self.parse_clause()
+
+
+    def parse_clause( self ):
+        field = self.next()[1].lower()
+        kind, op = self.next()
+        op = op.lower()
+        if op == 'not' and self.peek_word() == 'in':
+            self.next()
+            op = 'not in'
+        elif op == 'is' and self.peek_word() == 'not':
+            self.next()
+            op = 'is not'
+        elif kind != 'op' and op not in ( 'in', 'is', 'was' ):
+            raise JqlError( f"Unknown operator '{op}'" )
+        return ( 'clause', field, op, self.parse_value() )
+
+
+    def parse_value( self ):
+        kind, val = self.next()
+        if ( kind, val ) == ( 'punct', '(' ):
+            values = []
+            while self.peek() != ( 'punct', ')' ):
+                values.append( self.parse_value() )
+                if self.peek() == ( 'punct', ',' ):
+                    self.next()
+            self.next()
+            return values
+        if kind == 'word' and self.peek() == ( 'punct', '(' ):
+            return ( 'func', val.lower(), self.parse_value() )
+        return val
+
+
+class Context:
+    ''' What a query needs to know besides the issue itself.
+        Subclasses provide access to other issues and to worklogs.
+    '''
+
+    def get_issue( self, key ):
+        raise NotImplementedError
+
+
+    def get_worklogs( self, key ):
+        return []
+
+
+    def now( self ):
+        return datetime.datetime.now( datetime.timezone.utc )
+
+
+    def group_members( self, group ):
+        ''' Usernames in group, for membersOf() '''
+        raise JqlError( "Unsupported function 'membersof'" )
+
+
+    def linked_keys( self, key, relation=None ):
+        ''' Keys of issues linked to "key", optionally only those where
+            "relation" (e.g. "is the parent of") describes the link as seen
+            from "key"
+        '''
+        issue = self.get_issue( key )
+        keys = set()
+        if not issue:
+            return keys
+        for link in issue['fields'].get( 'issuelinks' ) or []:
+            if 'outwardIssue' in link:
+                text, other = link['type']['outward'], link['outwardIssue']
+            else:
+                text, other = link['type']['inward'], link['inwardIssue']
+            if relation is None or text.lower() == relation.lower():
+                keys.add( other['key'] )
+        return keys
+
+
+def parse_datetime( val, ctx ):
+    ''' JQL date values: relative ("-5m", "-2d", "1w") or absolute '''
+    m = re.fullmatch( r'([-+]?)(\d+)([mhdw])', val.strip() )
+    if m:
+        sign, num, unit = m.groups()
+        seconds = int( num ) * { 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800 }[unit]
+        delta = datetime.timedelta( seconds=seconds )
+        return ctx.now() - delta if sign == '-' else ctx.now() + delta
+    for fmt in ( '%Y/%m/%d %H:%M', '%Y-%m-%d %H:%M', '%Y/%m/%d', '%Y-%m-%d' ):
+        try:
+            dt = datetime.datetime.strptime( val, fmt )
+        except ValueError:
+            continue
+        return dt.astimezone()
+    return parse_jira_datetime( val )
+
+
+def parse_jira_datetime( val ):
+    ''' "2025-01-06T09:00:00.000-0600" or "2025-01-06" '''
+    if len( val ) == 10:
+        return datetime.datetime.strptime( val, '%Y-%m-%d' ).astimezone()
+    return datetime.datetime.strptime( val, '%Y-%m-%dT%H:%M:%S.%f%z' )
+
+
+def get_field( issue, field ):
+    ''' Raw value for a JQL field name, simplified to str / list / None '''
+    name = field_aliases.get( field, field )
+    if name == 'key':
+        return issue['key']
+    if name == 'project':
+        return issue['key'].split( '-' )[0]
+    val = issue['fields'].get( name )
+    if isinstance( val, dict ):
+        val = val.get( 'name', val.get( 'value', val.get( 'key' ) ) )
+    elif isinstance( val, list ):
+        val = [ v.get( 'name', v.get( 'value' ) ) if isinstance( v, dict ) else v for v in val ]
+    return val
+
+
+def key_number( key ):
+    project, num = key.split( '-', 1 )
+    return ( project, int( num ) )
+
+
+class Query:
+    ''' A compiled JQL query '''
+
+    def __init__( self, jql ):
+        self.jql = jql
+        parser = Parser( jql )
+        self.tree = parser.parse()
+        self.order_by = parser.order_by
+
+
+    def matches( self, issue, ctx ):
+        return self._eval( self.tree, issue, ctx )
+
+
+    def search( self, issues, ctx ):
+        ''' Return list of matching issues from iterable "issues", sorted
+            per ORDER BY (default: by key)
+        '''
+        hits = [ i for i in issues if self.matches( i, ctx ) ]
+        order = self.order_by or [ ( 'key', 'asc' ) ]
+        for field, direction in reversed( order ):
+            if field == 'key':
+                keyfn = lambda i: key_number( i['key'] )
+            else:
+                keyfn = lambda i, f=field: str( get_field( i, f ) or '' )
+            hits.sort( key=keyfn, reverse=( direction == 'desc' ) )
+        return hits
+
+
+    def candidate_keys( self, ctx ):
+        ''' Set of keys that can possibly match, from "key in (...)",
+            "key = X" or "issue in linkedIssues(...)" at the top level.
+            None if any issue might match.
+        '''
+        nodes = self.tree[1] if self.tree[0] == 'and' else [ self.tree ]
+        for node in nodes:
+            if node[0] != 'clause':
+                continue
+            _, field, op, value = node
+            if field in ( 'key', 'issue', 'issuekey', 'id' ):
+                if op == '=':
+                    return { value.upper() }
+                if op == 'in' and isinstance( value, list ):
+                    return { v.upper() for v in value if isinstance( v, str ) }
+                if op == 'in' and isinstance( value, tuple ):
+                    return self._func_keys( value, ctx )
+        return None
+
+
+    def _func_keys( self, value, ctx ):
+        _, name, args = value
+        if name == 'linkedissues':
+            relation = args[1] if len( args ) > 1 else None
+            return ctx.linked_keys( args[0].upper(), relation )
+        raise JqlError( f"Unsupported function '{name}'" )
+
+
+    def _eval( self, node, issue, ctx ):
+        kind = node[0]
+        if kind == 'and':
+            return all( self._eval( n, issue, ctx ) for n in node[1] )
+        if kind == 'or':
+            return any( self._eval( n, issue, ctx ) for n in node[1] )
+        if kind == 'not':
+            return not self._eval( node[1], issue, ctx )
+        return self._eval_clause( node, issue, ctx )
+
+
+    def _eval_clause( self, node, issue, ctx ):
+        _, field, op, value = node
+        if field in ( 'worklogauthor', 'worklogdate' ):
+            return self._eval_worklog( field, op, value, issue, ctx )
+        if field == 'text':
+            text = ' '.join( str( issue['fields'].get( f ) or '' )
+                for f in ( 'summary', 'description', libfields.EPIC_NAME ) )
+            return self._eval_op( op, text, value, ctx, field )
+        if field in ( 'issue', 'issuekey', 'id' ):
+            field = 'key'
+        if field == 'sprint' and op in ( 'in', 'not in' ) and isinstance( value, tuple ):
+            found = self._in_open_sprint( issue, value )
+            return found if op == 'in' else not found
+        if isinstance( value, tuple ) and value[0] == 'func':
+            keys = self._func_keys( value, ctx )
+            found = issue['key'] in keys
+            return found if op == 'in' else not found
+        return self._eval_op( op, get_field( issue, field ), value, ctx, field )
+
+
+    @staticmethod
+    def _in_open_sprint( issue, value ):
+        _, name, _ = value
+        if name not in ( 'opensprints', 'closedsprints' ):
+            raise JqlError( f"Unsupported function '{name}'" )
+        want = 'ACTIVE' if name == 'opensprints' else 'CLOSED'
+        for s in issue['fields'].get( libfields.SPRINT ) or []:
+            state = s.get( 'state' ) if isinstance( s, dict ) else \
+                re.search( r'state=([A-Z]+)', s ).group( 1 )
+            if state == want:
+                return True
+        return False
+
+
+    def _eval_worklog( self, field, op, value, issue, ctx ):
+        if isinstance( value, tuple ) and value[0] == 'func':
+            _, name, args = value
+            if name != 'membersof':
+                raise JqlError( f"Unsupported function '{name}'" )
+            value = ctx.group_members( args[0] )
+        for w in ctx.get_worklogs( issue['key'] ):
+            if field == 'worklogauthor':
+                have = w['author']['name']
+            else:
+                have = w['started'][:10]
+            if self._eval_op( op, have, value, ctx, field ):
+                return True
+        return False
+
+
+    def _eval_op( self, op, have, want, ctx, field ):
+        if op in ( 'is', 'is not' ):
+            if str( want ).lower() not in ( 'empty', 'null' ):
+                raise JqlError( f"'{op}' only supports EMPTY/NULL" )
+            empty = have in ( None, '', [] )
+            return empty if op == 'is' else not empty
+        if have is None:
+            return op in ( '!=', 'not in', '!~' )
+        haves = have if isinstance( have, list ) else [ have ]
+        if op in ( 'in', 'not in' ):
+            wants = { str( w ).lower() for w in want }
+            found = any( str( h ).lower() in wants for h in haves )
+            return found if op == 'in' else not found
+        if op in ( '=', '!=' ):
+            found = any( str( h ).lower() == str( want ).lower() for h in haves )
+            return found if op == '=' else not found
+        if op in ( '~', '!~' ):
+            # like jira's text search: every word must appear, in any order
+            words = re.findall( r'\w+', str( want ).lower() )
+            found = any( all( w in str( h ).lower() for w in words ) for h in haves )
+            return found if op == '~' else not found
+        # ordering comparisons, dates
+        if field in ( 'updated', 'created', 'resolved', 'resolutiondate', 'duedate', 'due', 'worklogdate' ):
+            have_dt = parse_jira_datetime( haves[0] )
+            want_dt = parse_datetime( want, ctx )
+            if field in ( 'duedate', 'due', 'worklogdate' ):
+                have_dt, want_dt = have_dt.date(), want_dt.date()
+        else:
+            have_dt, want_dt = haves[0], want
+        return {
+            '>': have_dt > want_dt,
+            '>=': have_dt >= want_dt,
+            '<': have_dt < want_dt,
+            '<=': have_dt <= want_dt,
+            }[op]
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
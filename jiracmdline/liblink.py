@@ -8,7 +8,47 @@ Linked_Issue = collections.namedtuple(
     ['remote_issue','link_type','direction'] )
 
 
+# Custom type for link types read from raw json
+Link_Type = collections.namedtuple( 'Link_Type', [ 'name', 'inward', 'outward' ] )
+
+# Custom type for issues known only by key (from raw json)
+Issue_Ref = collections.namedtuple( 'Issue_Ref', [ 'key' ] )
+
+
+def get_key( issue ):
+    ''' issue: jira Issue or its raw json '''
+    if isinstance( issue, dict ):
+        return issue['key']
+    return issue.key
+
+
+def get_linked_issues_raw( raw ):
+    ''' Like get_linked_issues, for the raw json of an issue.
+        remote_issue is an Issue_Ref, link_type a Link_Type.
+    '''
+    linked_issues = []
+    for link in raw['fields'].get( 'issuelinks' ) or []:
+        if 'inwardIssue' in link:
+            remote_issue = link['inwardIssue']
+            direction = 'inward'
+        else:
+            remote_issue = link['outwardIssue']
+            direction = 'outward'
+        t = link['type']
+        linked_issues.append(
+            Linked_Issue(
+                remote_issue=Issue_Ref( remote_issue['key'] ),
+                link_type=Link_Type( t['name'], t['inward'], t['outward'] ),
+                direction=direction
+                )
+            )
+    return linked_issues
+
+
 def get_linked_issues( issue ):
+    ''' issue: jira Issue or its raw json '''
+    if isinstance( issue, dict ):
+        return get_linked_issues_raw( issue )
     linked_issues = []
     for link in issue.fields.issuelinks:
         try:
@@ -28,22 +68,48 @@ def get_linked_issues( issue ):
 
 
 def get_linked_parent( issue ):
-    logging.debug( f'{issue}' )
+    key = get_key( issue )
+    logging.debug( f'{key}' )
     parents = []
     for link in get_linked_issues( issue ):
         if link.link_type.name == "Ancestor":
             if link.direction == 'inward':
                 parents.append( link.remote_issue )
     if len( parents ) < 1:
-        raise UserWarning( f'{issue} has no parent' )
+        raise UserWarning( f'{key} has no parent' )
     elif len( parents ) > 1:
-        raise UserWarning( f'{issue} has multiple parents' )
+        raise UserWarning( f'{key} has multiple parents' )
     return parents[-1]
 
 
+def get_linked_parents( issue ):
+    ''' Return the (partial) remote issues linked as parents of "issue"
+        Uses only the "issuelinks" already present on "issue", no jira queries.
+    '''
+    parents = []
+    for link in get_linked_issues( issue ):
+        if link.link_type.name == "Ancestor":
+            if link.direction == 'inward':
+                parents.append( link.remote_issue )
+    return parents
+
+
+def get_linked_children( issue ):
+    ''' Return the (partial) remote issues linked as children of "issue"
+        Uses only the "issuelinks" already present on "issue", no jira queries.
+    '''
+    children = []
+    for link in get_linked_issues( issue ):
+        if link.link_type.name == "Ancestor":
+            if link.direction == 'outward':
+                children.append( link.remote_issue )
+    return children
+
+
 
 def check_for_link_problems( issue ):
-    logging.debug( f'{issue}' )
+    key = get_key( issue )
+    logging.debug( f'{key}' )
     parents = []
     children = []
     for link in get_linked_issues( issue ):
@@ -53,7 +119,10 @@ def check_for_link_problems( issue ):
                 children.append( link.remote_issue )
             else:
                 parents.append( link.remote_issue )
-    issue_type = issue.fields.issuetype.name.lower()
+    if isinstance( issue, dict ):
+        issue_type = issue['fields']['issuetype']['name'].lower()
+    else:
+        issue_type = issue.fields.issuetype.name.lower()
     if issue_type == 'story' and len( parents ) > 0:
         raise UserWarning( 'Story has parent(s)' )
     elif issue_type == 'task':
@@ -0,0 +1,336 @@
+''' Accounting of jira REST calls: counts, latency histograms, response
+    sizes and jql fingerprints, per scope (a flask route or a cmdline run).
+    Sync connections are instrumented with a requests response hook
+    (see instrument()), so calls made through jira.JIRA directly are
+    counted too.
+'''
+import atexit
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import re
+import sys
+import threading
+import urllib.parse
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+# Latency histogram bucket upper bounds, in seconds
+buckets = ( 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float( 'inf' ) )
+
+# Distinct jql fingerprints kept per scope, the rest are counted as "other"
+max_fingerprints = 200
+
+current_scope = contextvars.ContextVar( 'jcl_metrics_scope', default='unscoped' )
+
+# path parts that vary per call
+path_patterns = [
+    ( re.compile( r'/[A-Z][A-Z0-9_]*-\d+(?=/|$)' ), '/{key}' ),
+    ( re.compile( r'/\d+(?=/|$)' ), '/{id}' ),
+    ]
+
+jql_patterns = [
+    # quoted values, but not quoted field names like "Epic Link" = ...
+    ( re.compile( r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')(?!\s*(?:!?=|!?~|[<>]|in\b|not\b|is\b|was\b))' ), '?' ),
+    ( re.compile( r'\b[A-Z][A-Z0-9_]*-\d+\b' ), '?' ),
+    ( re.compile( r'\b\d{4}[-/]\d{1,2}[-/]\d{1,2}(?:\s+\d{1,2}:\d{2})?\b' ), '?' ),
+    ( re.compile( r'(?<![\w-])-?\d+[mhdw]?\b' ), '?' ),
+    ( re.compile( r'\(\s*\?(?:\s*,\s*\?)*\s*\)' ), '(?)' ),
+    ( re.compile( r'\s+' ), ' ' ),
+    ]
+
+
+class Call_Stats:
+    ''' Counters for one type of call within one scope '''
+
+    def __init__( self ):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.histogram = [ 0 ] * len( buckets )
+
+
+    def add( self, seconds, size, status ):
+        self.count += 1
+        if status >= 400:
+            self.errors += 1
+        self.seconds += seconds
+        self.bytes += size
+        for i, bound in enumerate( buckets ):
+            if seconds <= bound:
+                self.histogram[i] += 1
+                break
+
+
+class Metrics:
+    ''' Process wide registry, scope -> call type -> Call_Stats '''
+
+    def __init__( self ):
+        self.lock = threading.Lock()
+        self.calls = collections.defaultdict( lambda: collections.defaultdict( Call_Stats ) )
+        self.jql = collections.defaultdict( collections.Counter )
+
+
+    def record( self, scope, call, seconds, size, status, jql=None ):
+        with self.lock:
+            self.calls[ scope ][ call ].add( seconds, size, status )
+            if jql:
+                fingerprints = self.jql[ scope ]
+                fp = fingerprint( jql )
+                if fp not in fingerprints and len( fingerprints ) >= max_fingerprints:
+                    fp = 'other'
+                fingerprints[ fp ] += 1
+
+
+    def clear( self, scope=None ):
+        with self.lock:
+            if scope is None:
+                self.calls.clear()
+                self.jql.clear()
+            else:
+                self.calls.pop( scope, None )
+                self.jql.pop( scope, None )
+
+
+def get_metrics():
+    key = 'metrics'
+    if key not in resources:
+        resources[key] = Metrics()
+    return resources[key]
+
+
+def fingerprint( jql ):
+    ''' jql with literal values replaced by "?", so that the same query
+        for different issues / dates / users counts as one
+    '''
+    for pattern, repl in jql_patterns:
+        jql = pattern.sub( repl, jql )
+    return jql.strip()
+
+
+def call_type( method, url ):
+    ''' e.g. "GET issue/{key}/worklog" '''
+    path = urllib.parse.urlsplit( url ).path
+    for prefix in ( '/rest/api/2/', '/rest/api/latest/', '/rest/' ):
+        if prefix in path:
+            path = path.split( prefix, 1 )[1]
+            break
+    path = '/' + path.strip( '/' )
+    for pattern, repl in path_patterns:
+        path = pattern.sub( repl, path )
+    return f'{method} {path.lstrip( "/" )}'
+
+
+def get_scope():
+    return current_scope.get()
+
+
+def set_scope( scope ):
+    ''' Set the scope for the rest of the current thread / context '''
+    return current_scope.set( scope )
+
+
+@contextlib.contextmanager
+def scope( name ):
+    token = current_scope.set( name )
+    try:
+        yield
+    finally:
+        current_scope.reset( token )
+
+
+def bind_scope( fn ):
+    ''' Wrap fn so it records into the caller's scope (and timer, see
+        start_timer) when run on another thread, e.g. by a ThreadPoolExecutor
+    '''
+    context = contextvars.copy_context()
+
+    @functools.wraps( fn )
+    def wrapper( *args, **kwargs ):
+        # a context can only be entered by one thread at a time
+        return context.copy().run( fn, *args, **kwargs )
+    return wrapper
+
+
+class Call_Timer:
+    ''' Total jira time of one unit of work (e.g. one web request) '''
+
+    def __init__( self ):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+
+
+    def add( self, seconds ):
+        with self.lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+current_timer = contextvars.ContextVar( 'jcl_metrics_timer', default=None )
+
+
+def start_timer():
+    ''' Also add up jira calls made from the current context in a new Call_Timer '''
+    timer = Call_Timer()
+    current_timer.set( timer )
+    return timer
+
+
+def stop_timer():
+    current_timer.set( None )
+
+
+def record( method, url, seconds, size, status, jql=None ):
+    call = call_type( method, url )
+    get_metrics().record( get_scope(), call, seconds, size, status, jql )
+    timer = current_timer.get()
+    if timer:
+        timer.add( seconds )
+
+
+def request_jql( request ):
+    ''' jql of a search request (GET params or POST body), else None '''
+    if not request.url or '/search' not in request.url:
+        return None
+    query = urllib.parse.parse_qs( urllib.parse.urlsplit( request.url ).query )
+    if 'jql' in query:
+        return query['jql'][0]
+    if request.body:
+        try:
+            return json.loads( request.body ).get( 'jql' )
+        except ( ValueError, AttributeError ):
+            return None
+    return None
+
+
+def response_hook( response, *args, **kwargs ):
+    ''' requests response hook, see instrument() '''
+    try:
+        record(
+            response.request.method,
+            response.request.url,
+            response.elapsed.total_seconds(),
+            len( response.content ),
+            response.status_code,
+            request_jql( response.request ),
+            )
+    except Exception:
+        # accounting must never break a jira call
+        logr.exception( 'Failed to record jira call' )
+    return response
+
+
+def instrument( session ):
+    ''' Count all calls made through a requests.Session '''
+    hooks = session.hooks.setdefault( 'response', [] )
+    if response_hook not in hooks:
+        hooks.append( response_hook )
+
+
+def prometheus_text():
+    ''' All metrics in the prometheus text exposition format '''
+    metrics = get_metrics()
+    lines = [
+        '# HELP jcl_jira_requests_total Jira REST calls.',
+        '# TYPE jcl_jira_requests_total counter',
+        ]
+    hist = [
+        '# HELP jcl_jira_request_seconds Jira REST call latency.',
+        '# TYPE jcl_jira_request_seconds histogram',
+        ]
+    size = [
+        '# HELP jcl_jira_response_bytes_total Jira REST response body bytes.',
+        '# TYPE jcl_jira_response_bytes_total counter',
+        ]
+    errors = [
+        '# HELP jcl_jira_request_errors_total Jira REST calls with HTTP status >= 400.',
+        '# TYPE jcl_jira_request_errors_total counter',
+        ]
+    jql = [
+        '# HELP jcl_jira_jql_total Jira searches by jql fingerprint.',
+        '# TYPE jcl_jira_jql_total counter',
+        ]
+    with metrics.lock:
+        for scope_name, calls in sorted( metrics.calls.items() ):
+            for call, stats in sorted( calls.items() ):
+                labels = f'scope="{escape( scope_name )}",call="{escape( call )}"'
+                lines.append( f'jcl_jira_requests_total{{{labels}}} {stats.count}' )
+                errors.append( f'jcl_jira_request_errors_total{{{labels}}} {stats.errors}' )
+                size.append( f'jcl_jira_response_bytes_total{{{labels}}} {stats.bytes}' )
+                cumulative = 0
+                for bound, qty in zip( buckets, stats.histogram ):
+                    cumulative += qty
+                    le = '+Inf' if bound == float( 'inf' ) else bound
+                    hist.append( f'jcl_jira_request_seconds_bucket{{{labels},le="{le}"}} {cumulative}' )
+                hist.append( f'jcl_jira_request_seconds_sum{{{labels}}} {stats.seconds:.6f}' )
+                hist.append( f'jcl_jira_request_seconds_count{{{labels}}} {stats.count}' )
+        for scope_name, fingerprints in sorted( metrics.jql.items() ):
+            for fp, qty in sorted( fingerprints.items() ):
+                jql.append( f'jcl_jira_jql_total{{scope="{escape( scope_name )}",jql="{escape( fp )}"}} {qty}' )
+    return '\n'.join( lines + errors + hist + size + jql ) + '\n'
+
+
+def escape( val ):
+    return val.replace( '\\', '\\\\' ).replace( '"', '\\"' ).replace( '\n', '\\n' )
+
+
+def percentile( stats, fraction ):
+    ''' Upper bound of the histogram bucket holding the given fraction of calls '''
+    target = stats.count * fraction
+    cumulative = 0
+    for bound, qty in zip( buckets, stats.histogram ):
+        cumulative += qty
+        if cumulative >= target:
+            return bound
+    return buckets[-1]
+
+
+def summary_text( scope_name=None, top_jql=5 ):
+    ''' Human readable summary of one scope, for the cmdline --verbose footer '''
+    scope_name = scope_name or get_scope()
+    metrics = get_metrics()
+    with metrics.lock:
+        calls = dict( metrics.calls.get( scope_name, {} ) )
+        fingerprints = collections.Counter( metrics.jql.get( scope_name, {} ) )
+    if not calls:
+        return 'Jira calls: none'
+    total = sum( s.count for s in calls.values() )
+    seconds = sum( s.seconds for s in calls.values() )
+    size = sum( s.bytes for s in calls.values() )
+    lines = [ f'Jira calls: {total} in {seconds:.2f}s, {size / 1024:.0f} KiB received' ]
+    width = max( len( c ) for c in calls )
+    for call, s in sorted( calls.items(), key=lambda x: -x[1].seconds ):
+        p95 = percentile( s, 0.95 )
+        p95 = '>10s' if p95 == float( 'inf' ) else f'<={p95}s'
+        lines.append(
+            f'  {call:<{width}}  {s.count:>5} calls  {s.seconds:>7.2f}s'
+            f'  avg {s.seconds / s.count:.3f}s  p95 {p95}'
+            f'  {s.bytes / 1024:>8.0f} KiB'
+            + ( f'  {s.errors} errors' if s.errors else '' ) )
+    if fingerprints:
+        lines.append( '  Top jql:' )
+        for fp, qty in fingerprints.most_common( top_jql ):
+            lines.append( f'    {qty:>5}  {fp}' )
+    return '\n'.join( lines )
+
+
+def start_cli_run( name, verbose=False ):
+    ''' Record calls of this cmdline run under scope "cli:<name>"
+        and, if verbose, print a summary to stderr when it exits
+        (reports may end with sys.exit)
+    '''
+    scope_name = f'cli:{name}'
+    set_scope( scope_name )
+    if verbose:
+        atexit.register( lambda: print( summary_text( scope_name ), file=sys.stderr ) )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
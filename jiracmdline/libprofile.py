@@ -0,0 +1,173 @@
+''' Opt-in profiling of single web requests, for admins.
+    A profiled request gets a cProfile dump, sampled stacks in the
+    "collapsed" format used by flamegraph.pl / speedscope, and a timing
+    breakdown (jira wait, python cpu, template rendering), stored in
+    JCL_PROFILE_DIR and summarized in a Server-Timing response header.
+'''
+import collections
+import cProfile
+import datetime
+import json
+import libmetrics
+import logging
+import os
+import pathlib
+import re
+import sys
+import threading
+import time
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+# Request param / header that turns profiling on
+profile_param = '_profile'
+profile_header = 'X-JCL-Profile'
+
+
+def get_admin_users():
+    ''' Jira usernames allowed to profile (env var JCL_ADMIN_USERS, comma separated) '''
+    key = 'admin_users'
+    if key not in resources:
+        names = os.getenv( 'JCL_ADMIN_USERS', '' )
+        resources[key] = { n.strip() for n in names.split( ',' ) if n.strip() }
+    return resources[key]
+
+
+def get_profile_dir():
+    key = 'profile_dir'
+    if key not in resources:
+        path = pathlib.Path( os.getenv( 'JCL_PROFILE_DIR', '/tmp/jcl-profiles' ) )
+        path.mkdir( parents=True, exist_ok=True )
+        resources[key] = path
+    return resources[key]
+
+
+def is_requested( request ):
+    ''' request: flask.request '''
+    val = request.args.get( profile_param, request.headers.get( profile_header, '' ) )
+    return val.lower() in ( '1', 'true', 'yes', 'on' )
+
+
+def is_valid_name( name ):
+    return re.fullmatch( r'[\w.-]+', name ) is not None and not name.startswith( '.' )
+
+
+class Stack_Sampler( threading.Thread ):
+    ''' Sample the stack of one thread every "interval" seconds '''
+
+    def __init__( self, thread_id, interval=0.005 ):
+        super().__init__( daemon=True )
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.done = threading.Event()
+
+
+    def run( self ):
+        while not self.done.wait( self.interval ):
+            frame = sys._current_frames().get( self.thread_id )
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append( f'{os.path.basename( code.co_filename )}:{code.co_name}' )
+                frame = frame.f_back
+            if names:
+                self.stacks[ ';'.join( reversed( names ) ) ] += 1
+
+
+    def stop( self ):
+        self.done.set()
+        self.join()
+
+
+    def collapsed( self ):
+        return ''.join( f'{stack} {qty}\n' for stack, qty in self.stacks.most_common() )
+
+
+class Request_Profile:
+    ''' Profile of one request, start() and stop() on the request thread '''
+
+    def __init__( self, name ):
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.sampler = Stack_Sampler( threading.get_ident() )
+        self.render_seconds = 0.0
+        self.render_start = None
+        self.timer = None
+        self.id = None
+
+
+    def start( self ):
+        self.timer = libmetrics.start_timer()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.sampler.start()
+        self.profiler.enable()
+
+
+    def stop( self ):
+        self.profiler.disable()
+        self.sampler.stop()
+        self.cpu_seconds = time.thread_time() - self.cpu_start
+        self.wall_seconds = time.perf_counter() - self.wall_start
+        libmetrics.stop_timer()
+
+
+    def render_started( self ):
+        self.render_start = time.perf_counter()
+
+
+    def render_finished( self ):
+        if self.render_start is not None:
+            self.render_seconds += time.perf_counter() - self.render_start
+            self.render_start = None
+
+
+    def timings( self ):
+        ''' Seconds spent. Jira time is the sum over all calls, so it can
+            exceed wall time when calls run in parallel.
+        '''
+        return {
+            'total': self.wall_seconds,
+            'jira': self.timer.seconds,
+            'jira_calls': self.timer.count,
+            'cpu': self.cpu_seconds,
+            'render': self.render_seconds,
+            }
+
+
+    def server_timing( self ):
+        t = self.timings()
+        parts = [
+            f'total;dur={t["total"] * 1000:.1f}',
+            f'jira;dur={t["jira"] * 1000:.1f};desc="{t["jira_calls"]} calls"',
+            f'cpu;dur={t["cpu"] * 1000:.1f}',
+            f'render;dur={t["render"] * 1000:.1f}',
+            ]
+        return ', '.join( parts )
+
+
+    def save( self ):
+        ''' Write <id>.pstats, <id>.collapsed and <id>.json, return id '''
+        stamp = datetime.datetime.now().strftime( '%Y%m%d-%H%M%S-%f' )
+        self.id = re.sub( r'[^\w.-]', '_', f'{stamp}-{self.name}' )
+        path = get_profile_dir()
+        self.profiler.dump_stats( path / f'{self.id}.pstats' )
+        ( path / f'{self.id}.collapsed' ).write_text( self.sampler.collapsed() )
+        ( path / f'{self.id}.json' ).write_text( json.dumps( self.timings(), indent=2 ) )
+        logr.info( f'Saved profile {self.id} to {path}' )
+        return self.id
+
+
+def list_profiles():
+    ''' Newest first: list of dicts with id and timings '''
+    rv = []
+    for p in sorted( get_profile_dir().glob( '*.json' ), reverse=True ):
+        rv.append( { 'id': p.stem, **json.loads( p.read_text() ) } )
+    return rv
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
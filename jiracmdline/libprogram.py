@@ -0,0 +1,148 @@
+''' Map jira issues to the (funding) program their time is charged to.
+    Section [issue2program_fields] of the config lists the issue fields to
+    check, in order; a section named after each field maps its values to
+    programs. The first field whose value is in its section decides.
+    The config is compiled once into a Program_Classifier.
+'''
+import collections
+import libconfig
+import logging
+import threading
+
+# Custom type for one field checked by Program_Classifier
+Program_Field = collections.namedtuple( 'Program_Field', [ 'name', 'parts', 'human_name', 'lookup' ] )
+
+# Custom type for issues Program_Classifier.classify_many found no program for
+Unclassified = collections.namedtuple( 'Unclassified', [ 'key', 'reason' ] )
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+
+class Program_Classifier:
+    ''' Compiled [issue2program_fields]: each field's path is split once and
+        its lookup section is a plain dict. Results are memoised per
+        ( issue key, updated ), so an unchanged issue is classified once.
+    '''
+
+    def __init__( self, fields, memo_size=50000 ):
+        self.fields = fields
+        self.memo = collections.OrderedDict() # ( key, updated ) -> ( program, reason )
+        self.memo_size = memo_size
+        self.lock = threading.Lock()
+
+
+    @classmethod
+    def from_config( cls, cfg ):
+        fields = []
+        for name, human_name in cfg['issue2program_fields'].items():
+            if cfg.has_section( name ):
+                lookup = dict( cfg[name] )
+            else:
+                logr.warning( f'No config section [{name}] for issue2program field "{human_name}"' )
+                lookup = {}
+            fields.append( Program_Field( name, tuple( name.split( '.' ) ), human_name, lookup ) )
+        return cls( fields )
+
+
+    def field_names( self ):
+        ''' Top level jira fields read by the classifier '''
+        return [ f.parts[0] for f in self.fields ]
+
+
+    def _classify( self, fields ):
+        ''' Return ( program, None ), or ( None, reason ) if there isn't one
+            fields: raw json of the issue's fields
+        '''
+        for f in self.fields:
+            val = fields
+            try:
+                for p in f.parts:
+                    val = val[p]
+            except ( KeyError, TypeError ):
+                # the issue doesn't have this field, check the next one
+                continue
+            if isinstance( val, list ):
+                if len( val ) > 1:
+                    return ( None, f'Multiple values for field "{f.human_name}"' )
+                val = val[0] if val else None
+            if val is None:
+                continue
+            if isinstance( val, dict ) and 'value' in val:
+                # custom field option
+                val = val['value']
+            if not isinstance( val, str ):
+                return ( None, f'Unknown value type for field "{f.human_name}"' )
+            if val in f.lookup:
+                program = f.lookup[val]
+                return ( program, None ) if program else ( None, 'No program' )
+        return ( None, 'No program' )
+
+
+    def lookup( self, issue ):
+        ''' Return ( program, reason ) of an Issue or its raw json, memoised '''
+        raw = issue if isinstance( issue, dict ) else issue.raw
+        fields = raw['fields']
+        updated = fields.get( 'updated' )
+        if updated is None:
+            # can't tell versions apart, don't memoise
+            return self._classify( fields )
+        memo_key = ( raw['key'], updated )
+        with self.lock:
+            if memo_key in self.memo:
+                self.memo.move_to_end( memo_key )
+                return self.memo[memo_key]
+        rv = self._classify( fields )
+        with self.lock:
+            self.memo[memo_key] = rv
+            while len( self.memo ) > self.memo_size:
+                self.memo.popitem( last=False )
+        return rv
+
+
+    def classify( self, issue ):
+        ''' Program of one issue, raise UserWarning if there isn't one '''
+        program, reason = self.lookup( issue )
+        if reason:
+            raise UserWarning( f'{reason} for issue {issue_key( issue )}' )
+        return program
+
+
+    def classify_many( self, issues ):
+        ''' Classify a page of issues at once.
+            Return ( dict issue key -> program, list of Unclassified )
+        '''
+        programs = {}
+        unclassified = []
+        for issue in issues:
+            program, reason = self.lookup( issue )
+            if reason:
+                unclassified.append( Unclassified( issue_key( issue ), reason ) )
+            else:
+                programs[ issue_key( issue ) ] = program
+        return ( programs, unclassified )
+
+
+def issue_key( issue ):
+    return issue['key'] if isinstance( issue, dict ) else issue.key
+
+
+def summarize_unclassified( unclassified ):
+    ''' One message per reason, listing the issues '''
+    by_reason = collections.defaultdict( list )
+    for key, reason in unclassified:
+        by_reason[reason].append( key )
+    return [ f'{reason} for {len( keys )} issue{"s" if len( keys ) > 1 else ""}: {", ".join( keys )}'
+        for reason, keys in by_reason.items() ]
+
+
+def get_classifier( path ):
+    ''' Program_Classifier of the config file at path, shared by all
+        requests and compiled again when the file changes
+    '''
+    return libconfig.load( path, Program_Classifier.from_config )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -0,0 +1,270 @@
+''' Local SQLite copy of one jira project: raw issue json, issue links and
+    worklogs. Written by snapshot.py, read through Snapshot_Connection.
+    Indexed columns narrow a jql search down before libjql evaluates the
+    full query on the remaining issues.
+'''
+import json
+import libfields
+import libjql
+import logging
+import sqlite3
+import threading
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+
+schema_version = '1'
+
+schema = '''
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+    );
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY COLLATE NOCASE,
+    id TEXT,
+    project TEXT COLLATE NOCASE,
+    issue_type TEXT COLLATE NOCASE,
+    epic_link TEXT COLLATE NOCASE,
+    resolved INTEGER,
+    updated TEXT,
+    raw TEXT
+    );
+CREATE INDEX IF NOT EXISTS issues_project ON issues( project );
+CREATE INDEX IF NOT EXISTS issues_issue_type ON issues( issue_type );
+CREATE INDEX IF NOT EXISTS issues_epic_link ON issues( epic_link );
+CREATE INDEX IF NOT EXISTS issues_resolved ON issues( resolved );
+-- one row per link end: "key <relation> other_key", e.g. "A is the parent of B"
+CREATE TABLE IF NOT EXISTS links (
+    key TEXT COLLATE NOCASE,
+    other_key TEXT COLLATE NOCASE,
+    relation TEXT COLLATE NOCASE,
+    link_type TEXT,
+    link_id TEXT
+    );
+CREATE INDEX IF NOT EXISTS links_key ON links( key, relation );
+CREATE INDEX IF NOT EXISTS links_other_key ON links( other_key );
+CREATE TABLE IF NOT EXISTS worklogs (
+    id TEXT PRIMARY KEY,
+    issue_key TEXT COLLATE NOCASE,
+    author TEXT COLLATE NOCASE,
+    started TEXT,
+    seconds INTEGER,
+    raw TEXT
+    );
+CREATE INDEX IF NOT EXISTS worklogs_issue_key ON worklogs( issue_key );
+CREATE INDEX IF NOT EXISTS worklogs_author ON worklogs( author, started );
+'''
+
+# jql field -> issues column, for narrowing searches with sql
+indexed_fields = {
+    'key': 'key',
+    'issue': 'key',
+    'issuekey': 'key',
+    'project': 'project',
+    'type': 'issue_type',
+    'issuetype': 'issue_type',
+    'epic link': 'epic_link',
+    }
+
+
+class Snapshot_Store( libjql.Context ):
+    ''' One sqlite file. Safe to share between threads. '''
+
+    def __init__( self, path ):
+        self.path = path
+        self.db = sqlite3.connect( path, check_same_thread=False )
+        self.lock = threading.RLock()
+        with self.lock:
+            self.db.executescript( schema )
+            self.db.commit()
+
+
+    def close( self ):
+        with self.lock:
+            self.db.close()
+
+
+    # --- meta data ---
+    def get_meta( self, name, default=None ):
+        with self.lock:
+            row = self.db.execute( 'SELECT value FROM meta WHERE name = ?', ( name, ) ).fetchone()
+        return row[0] if row else default
+
+
+    def set_meta( self, **values ):
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO meta ( name, value ) VALUES ( ?, ? )',
+                [ ( k, str( v ) ) for k, v in values.items() ] )
+
+
+    def commit( self ):
+        with self.lock:
+            self.db.commit()
+
+
+    # --- writing ---
+    def put_issue( self, raw ):
+        ''' Insert or replace one issue (raw json from the REST api) '''
+        fields = raw['fields']
+        key = raw['key']
+        issue_type = ( fields.get( 'issuetype' ) or {} ).get( 'name' )
+        row = (
+            key,
+            raw.get( 'id' ),
+            key.split( '-' )[0],
+            issue_type,
+            fields.get( libfields.EPIC_LINK ),
+            1 if fields.get( 'resolution' ) or fields.get( 'resolutiondate' ) else 0,
+            fields.get( 'updated' ),
+            json.dumps( raw ),
+            )
+        links = []
+        for link in fields.get( 'issuelinks' ) or []:
+            if 'outwardIssue' in link:
+                relation, other = link['type']['outward'], link['outwardIssue']
+            else:
+                relation, other = link['type']['inward'], link['inwardIssue']
+            links.append( ( key, other['key'], relation, link['type']['name'], link.get( 'id' ) ) )
+        with self.lock:
+            self.db.execute( 'INSERT OR REPLACE INTO issues VALUES ( ?, ?, ?, ?, ?, ?, ?, ? )', row )
+            self.db.execute( 'DELETE FROM links WHERE key = ?', ( key, ) )
+            self.db.executemany( 'INSERT INTO links VALUES ( ?, ?, ?, ?, ? )', links )
+
+
+    def put_worklogs( self, issue_key, worklogs ):
+        ''' Replace all worklogs of one issue, worklogs: list of raw json '''
+        rows = [ (
+            w['id'],
+            issue_key,
+            w['author']['name'],
+            w['started'],
+            w['timeSpentSeconds'],
+            json.dumps( w ),
+            ) for w in worklogs ]
+        with self.lock:
+            self.db.execute( 'DELETE FROM worklogs WHERE issue_key = ?', ( issue_key, ) )
+            self.db.executemany( 'INSERT OR REPLACE INTO worklogs VALUES ( ?, ?, ?, ?, ?, ? )', rows )
+
+
+    def delete_issues( self, keys ):
+        keys = [ ( k, ) for k in keys ]
+        with self.lock:
+            self.db.executemany( 'DELETE FROM issues WHERE key = ?', keys )
+            self.db.executemany( 'DELETE FROM links WHERE key = ?', keys )
+            self.db.executemany( 'DELETE FROM worklogs WHERE issue_key = ?', keys )
+
+
+    # --- reading, libjql.Context ---
+    def get_issue( self, key ):
+        with self.lock:
+            row = self.db.execute( 'SELECT raw FROM issues WHERE key = ?', ( key, ) ).fetchone()
+        return json.loads( row[0] ) if row else None
+
+
+    def get_issues( self, keys ):
+        ''' dict key -> raw json, for the keys that exist '''
+        rv = {}
+        keys = list( keys )
+        for i in range( 0, len( keys ), 500 ):
+            chunk = keys[ i:i+500 ]
+            marks = ','.join( '?' * len( chunk ) )
+            with self.lock:
+                rows = self.db.execute( f'SELECT raw FROM issues WHERE key IN ({marks})', chunk ).fetchall()
+            for ( raw, ) in rows:
+                issue = json.loads( raw )
+                rv[ issue['key'] ] = issue
+        return rv
+
+
+    def all_keys( self ):
+        with self.lock:
+            return [ r[0] for r in self.db.execute( 'SELECT key FROM issues' ) ]
+
+
+    def get_worklogs( self, key, started_from=None, started_to=None ):
+        ''' started_from, started_to: datetime.date, only worklogs started on
+            these dates or between them (in the worklog's time zone)
+        '''
+        sql = 'SELECT raw FROM worklogs WHERE issue_key = ?'
+        params = [ key ]
+        if started_from:
+            sql += ' AND substr( started, 1, 10 ) >= ?'
+            params.append( started_from.isoformat() )
+        if started_to:
+            sql += ' AND substr( started, 1, 10 ) <= ?'
+            params.append( started_to.isoformat() )
+        with self.lock:
+            rows = self.db.execute( f'{sql} ORDER BY started', params ).fetchall()
+        return [ json.loads( r[0] ) for r in rows ]
+
+
+    def linked_keys( self, key, relation=None ):
+        sql = 'SELECT other_key FROM links WHERE key = ?'
+        params = [ key ]
+        if relation is not None:
+            sql += ' AND relation = ?'
+            params.append( relation )
+        with self.lock:
+            return { r[0] for r in self.db.execute( sql, params ) }
+
+
+    # --- searching ---
+    def _clause_to_sql( self, clause ):
+        ''' ( sql, params ) for a top level clause that can use an index,
+            or None. The sql may match more issues than the clause,
+            libjql decides in the end.
+        '''
+        _, field, op, value = clause
+        column = indexed_fields.get( field )
+        if column and op in ( '=', 'in' ):
+            values = value if isinstance( value, list ) else [ value ]
+            if isinstance( value, tuple ):
+                if value[1] != 'linkedissues' or column != 'key':
+                    return None
+                _, _, args = value
+                if len( args ) > 1:
+                    return ( 'key IN ( SELECT other_key FROM links WHERE key = ? AND relation = ? )',
+                        [ args[0], args[1] ] )
+                return ( 'key IN ( SELECT other_key FROM links WHERE key = ? )', [ args[0] ] )
+            if not all( isinstance( v, str ) for v in values ):
+                return None
+            return ( f"{column} IN ({','.join( '?' * len( values ) )})", values )
+        if field in ( 'resolved', 'resolution', 'resolutiondate' ) and op in ( 'is', 'is not' ):
+            empty = op == 'is'
+            return ( 'resolved = ?', [ 0 if empty else 1 ] )
+        if field == 'worklogauthor' and op in ( '=', 'in' ):
+            values = value if isinstance( value, list ) else [ value ]
+            if not all( isinstance( v, str ) for v in values ):
+                return None
+            marks = ','.join( '?' * len( values ) )
+            return ( f'key IN ( SELECT issue_key FROM worklogs WHERE author IN ({marks}) )', values )
+        return None
+
+
+    def search( self, query ):
+        ''' List of raw issues matching a libjql.Query '''
+        tree = query.tree
+        nodes = tree[1] if tree[0] == 'and' else [ tree ]
+        where = []
+        params = []
+        for node in nodes:
+            if node[0] != 'clause':
+                continue
+            sql = self._clause_to_sql( node )
+            if sql:
+                where.append( sql[0] )
+                params.extend( sql[1] )
+        sql = 'SELECT raw FROM issues'
+        if where:
+            sql += ' WHERE ' + ' AND '.join( where )
+        logr.debug( f'{query.jql} -> {sql} {params}' )
+        with self.lock:
+            rows = self.db.execute( sql, params ).fetchall()
+        issues = ( json.loads( r[0] ) for r in rows )
+        return query.search( issues, self )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
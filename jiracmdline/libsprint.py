@@ -1,23 +1,25 @@
-import csv
 import dataclasses
-import pprint
+import functools
+import jira.resources
 
 
 # Custom Sprint class
-@dataclasses.dataclass
+@dataclasses.dataclass( slots=True )
 class Sprint:
-    ''' Python representation of a Sprint '''
+    ''' Python representation of a Sprint.
+        Instances are shared between issues (see parse_sprint), don't modify them.
+    '''
     id: str
     # rapidViewId: int #these might be null, not using it anywhere yet
-    state: str
     name: str
-    startDate: str
-    endDate: str
-    completeDate: str
-    activatedDate: str
+    state: str = None
+    startDate: str = None
+    endDate: str = None
+    completeDate: str = None
+    activatedDate: str = None
     # sequence: int #might be null, not using it anywhere yet
-    goal: str
-    autoStartStop: bool
+    goal: str = None
+    autoStartStop: bool = None
 
     def is_active( self ):
         return self.state == 'ACTIVE'
@@ -26,6 +28,11 @@ class Sprint:
 sprint_fields = { f.name:f for f in dataclasses.fields( Sprint ) }
 sprint_field_names = sprint_fields.keys()
 
+greenhopper_prefix = 'com.atlassian.greenhopper.service.sprint.Sprint'
+
+# Sprints parsed so far, a handful of distinct values appear on thousands of issues
+cache_size = 4096
+
 
 def get_active_sprint_name( issue ):
     sprints = get_sprint_memberships( issue )
@@ -38,33 +45,85 @@ def get_active_sprint_name( issue ):
 
 def get_sprint_memberships( issue ):
     ''' In Jira, this customfield is named "Sprint" and is unique per instance
+        issue: jira Issue or its raw json
     '''
-    # memberships = issue.fields.customfield_10535 #jira-old
-    memberships = issue.fields.customfield_10101
+    if isinstance( issue, dict ):
+        memberships = issue['fields'].get( 'customfield_10101' )
+    else:
+        # memberships = issue.fields.customfield_10535 #jira-old
+        memberships = issue.fields.customfield_10101
     sprints = []
     if memberships:
-        for line in memberships:
-                sprints.append( _str_to_sprint( line ) )
+        for val in memberships:
+            sprints.append( parse_sprint( val ) )
     return sprints
 
 
+def parse_sprint( val ):
+    ''' One value of customfield "Sprint": the greenhopper string of older
+        Jira versions, or the json object of newer ones (a dict, a
+        jira.resources object holding it in .raw, or a PropertyHolder when
+        the json has no "self" link, as from Jira Cloud)
+    '''
+    if isinstance( val, str ):
+        return _str_to_sprint( val )
+    if isinstance( val, dict ):
+        raw = val
+    elif isinstance( getattr( val, 'raw', None ), dict ):
+        raw = val.raw
+    elif isinstance( val, jira.resources.PropertyHolder ):
+        raw = vars( val )
+    else:
+        raise UserWarning( f"value doesn't look like a sprint: '{val}'" )
+    items = tuple( raw.items() )
+    try:
+        return _json_to_sprint( items )
+    except TypeError:
+        # an unhashable value (a list or a nested object), parse uncached
+        return _json_to_sprint.__wrapped__( items )
+
+
+def _convert( name, val ):
+    if val is None or val == '<null>':
+        return None
+    if name == 'autoStartStop':
+        return val if isinstance( val, bool ) else val == 'true'
+    return str( val )
+
+
+@functools.lru_cache( maxsize=cache_size )
 def _str_to_sprint( line ):
     ''' Parse a line from customfield "Sprint"
         return an instance of a Sprint
     '''
-    if not line.startswith( 'com.atlassian.greenhopper.service.sprint.Sprint' ):
+    if not line.startswith( greenhopper_prefix ):
         raise UserWarning( f"line doesn't look like a sprint: '{line}'" )
-    csv_start = line.index( '[' ) + 1
-    raw_csv = line[csv_start:-1]
-    # return csv
-    reader = csv.reader( [ raw_csv ] )
-    # for row in reader:
-    row = next(reader)
-    sprint_data = {}
-    for elem in row:
-        (k,v) = elem.split( '=', maxsplit=1 )
-        if k in sprint_field_names:
-            sprint_data[k] = sprint_fields[k].type( v )
+    raw = line[ line.index( '[' ) + 1 : line.rindex( ']' ) ]
+    values = {}
+    k = None
+    for part in raw.split( ',' ):
+        key, eq, val = part.partition( '=' )
+        if eq and key.isalnum():
+            k = key
+            values[k] = val
+        elif k:
+            # a comma inside a value (sprint name, goal)
+            values[k] += ',' + part
+    sprint_data = { k: None if v == '<null>' else v for k, v in values.items() if k in sprint_field_names }
+    if 'autoStartStop' in sprint_data:
+        sprint_data['autoStartStop'] = sprint_data['autoStartStop'] == 'true'
+    return Sprint( **sprint_data )
+
+
+@functools.lru_cache( maxsize=cache_size )
+def _json_to_sprint( items ):
+    ''' items: tuple of the json sprint's ( key, value ) pairs '''
+    sprint_data = { k: _convert( k, v ) for k, v in items if k in sprint_field_names }
+    if 'id' not in sprint_data or 'name' not in sprint_data:
+        raise UserWarning( f"value doesn't look like a sprint: '{dict( items )}'" )
+    if sprint_data.get( 'state' ):
+        # json has "active", the greenhopper string "ACTIVE"
+        sprint_data['state'] = sprint_data['state'].upper()
     return Sprint( **sprint_data )
 
 
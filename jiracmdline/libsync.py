@@ -0,0 +1,265 @@
+''' Keep a local snapshot (libsnapshot) in step with jira.
+    The first sync pulls the whole project. Later syncs ask only for issues
+    with "updated >= <time since the last sync>", and re-save their
+    worklogs (adding, changing or deleting a worklog updates its issue).
+    Deleted or moved issues don't show up in such a search, so every
+    reconcile_interval seconds the full list of keys is compared as well.
+'''
+import datetime
+import jira_connection
+import libfields
+import libjira
+import libmetrics
+import libsnapshot
+import logging
+import math
+import os
+import snapshot_connection
+import threading
+import time
+import worklogs
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+# extra minutes searched before the last sync: jql dates have minute
+# resolution and the jira server clock may differ from ours
+overlap_minutes = 2
+
+
+def get_fields():
+    ''' Fields saved for each issue: what simple_issue (liblink, libsprint),
+        worklogs.issue2program and jql evaluation read, plus the worklogs
+    '''
+    return libfields.mk_fields(
+        worklogs.get_jira_fields().split( ',' ),
+        libfields.jql,
+        [ 'worklog' ],
+        )
+
+
+def save_issues( store, issues ):
+    ''' Save a page of raw issues. Return keys whose worklogs didn't fit in the
+        issue json (jira includes at most 20) and need to be fetched.
+    '''
+    more_worklogs = []
+    for raw in issues:
+        wl = raw['fields'].pop( 'worklog', None )
+        store.put_issue( raw )
+        if wl is None or wl['total'] > len( wl['worklogs'] ):
+            more_worklogs.append( raw['key'] )
+        else:
+            store.put_worklogs( raw['key'], wl['worklogs'] )
+    return more_worklogs
+
+
+def save_worklogs( store, jcon, keys ):
+    for key, result, err in jcon.map_issues( jcon.worklogs, keys ):
+        if err:
+            raise err
+        store.put_worklogs( key, [ w.raw for w in result ] )
+
+
+def pull( store, jcon, jql ):
+    ''' Save all issues matching jql and their worklogs, return their keys '''
+    keys = []
+    more_worklogs = []
+    for page in jcon.iter_jql_pages( jql, prefetch=True, fields=get_fields(), json_result=True ):
+        more_worklogs.extend( save_issues( store, page ) )
+        store.commit()
+        keys.extend( raw['key'] for raw in page )
+        logr.info( f'Saved {len( keys )} issues' )
+    logr.info( f'Fetch worklogs of {len( more_worklogs )} issues' )
+    save_worklogs( store, jcon, more_worklogs )
+    store.commit()
+    return keys
+
+
+def reconcile( store, jcon, project ):
+    ''' Drop issues that no longer exist in the project, return their keys '''
+    live = set()
+    for page in jcon.iter_jql_pages( f'project = {project}', page_size=1000, fields=[ 'key' ],
+            validate=False, json_result=True ):
+        live.update( i['key'] for i in page )
+    gone = [ k for k in store.all_keys() if k not in live ]
+    store.delete_issues( gone )
+    store.commit()
+    return gone
+
+
+def parse_time( val ):
+    return datetime.datetime.fromisoformat( val ) if val else None
+
+
+def sync( store, jcon, project, reconcile_interval=3600, force_reconcile=False, changed=None ):
+    ''' Bring store up to date with jira, return dict of counts.
+        The first sync of an empty store pulls the whole project.
+        changed: if a list, the keys saved or deleted are added to it
+    '''
+    started = datetime.datetime.now( datetime.timezone.utc )
+    start = time.time()
+    synced = parse_time( store.get_meta( 'synced' ) )
+    jql = f'project = {project}'
+    if synced:
+        minutes = math.ceil( ( started - synced ).total_seconds() / 60 ) + overlap_minutes
+        jql += f' AND updated >= -{minutes}m'
+    updated = pull( store, jcon, f'{jql} ORDER BY key' )
+    deleted = []
+    reconciled = parse_time( store.get_meta( 'reconciled' ) )
+    if synced and ( force_reconcile or not reconciled
+            or ( started - reconciled ).total_seconds() >= reconcile_interval ):
+        deleted = reconcile( store, jcon, project )
+        reconciled = started
+    store.set_meta(
+        schema_version=libsnapshot.schema_version,
+        project=project,
+        server=jcon.server_url,
+        user=jcon.current_user(),
+        fields=get_fields(),
+        synced=started.isoformat(),
+        reconciled=( reconciled or started ).isoformat(),
+        )
+    if not store.get_meta( 'created' ):
+        store.set_meta( created=started.isoformat() )
+    store.commit()
+    if changed is not None:
+        changed.extend( updated )
+        changed.extend( deleted )
+    rv = { 'updated': len( updated ), 'deleted': len( deleted ), 'seconds': time.time() - start }
+    logr.info( f'Synced {project}: {rv}' )
+    return rv
+
+
+class Sync_Loop( threading.Thread ):
+    ''' Sync one snapshot every "interval" seconds, in the background.
+        Logs in to jira with the credentials in ~/.netrc.
+        Also keeps, per token, the keys that token can see (see
+        snapshot_connection.Visible_Keys) for visibility_ttl seconds.
+    '''
+
+    def __init__( self, path, project, interval=60, reconcile_interval=3600, visibility_ttl=900 ):
+        super().__init__( daemon=True, name=f'sync-{project}' )
+        self.path = path
+        self.project = project
+        self.interval = interval
+        self.reconcile_interval = reconcile_interval
+        self.store = libsnapshot.Snapshot_Store( path )
+        self.last_success = parse_time( self.store.get_meta( 'synced' ) )
+        self.last_result = None
+        self.last_error = None
+        self.done = threading.Event()
+        self.visibility_ttl = visibility_ttl
+        self.visible_keys = {} # user_id -> Visible_Keys
+        self.visible_keys_lock = threading.Lock()
+
+
+    def run( self ):
+        libmetrics.set_scope( f'sync:{self.project}' )
+        jcon = None
+        while not self.done.is_set():
+            try:
+                if jcon is None:
+                    jcon = jira_connection.Jira_Connection( libjira.jira_login() )
+                changed = []
+                self.last_result = sync( self.store, jcon, self.project,
+                    reconcile_interval=self.reconcile_interval, changed=changed )
+                self.forget_visible_keys( changed )
+                self.last_success = datetime.datetime.now( datetime.timezone.utc )
+                self.last_error = None
+            except Exception as e:
+                logr.exception( f'Sync of {self.project} failed' )
+                self.last_error = str( e )
+                jcon = None
+            self.done.wait( self.interval )
+
+
+    def stop( self ):
+        self.done.set()
+        self.join()
+
+
+    def get_visible_keys( self, jcon ):
+        ''' Visible_Keys of jcon's token, replaced every visibility_ttl seconds '''
+        with self.visible_keys_lock:
+            for user_id, vk in list( self.visible_keys.items() ):
+                if vk.is_expired():
+                    del self.visible_keys[ user_id ]
+            if jcon.user_id not in self.visible_keys:
+                self.visible_keys[ jcon.user_id ] = snapshot_connection.Visible_Keys(
+                    self.project, self.visibility_ttl )
+            return self.visible_keys[ jcon.user_id ]
+
+
+    def forget_visible_keys( self, keys ):
+        ''' Keys changed by a sync are checked again, their visibility may have changed '''
+        if not keys:
+            return
+        with self.visible_keys_lock:
+            cached = list( self.visible_keys.values() )
+        for vk in cached:
+            vk.forget( keys )
+
+
+    def is_fresh( self ):
+        ''' Synced within the last few intervals '''
+        if not self.last_success:
+            return False
+        age = datetime.datetime.now( datetime.timezone.utc ) - self.last_success
+        return age.total_seconds() <= 3 * self.interval + 60
+
+
+    def status( self ):
+        return {
+            'project': self.project,
+            'path': self.path,
+            'interval': self.interval,
+            'fresh': self.is_fresh(),
+            'last_success': self.last_success.isoformat() if self.last_success else None,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+            'issues': len( self.store.all_keys() ),
+            }
+
+
+def get_sync_loop():
+    ''' The background sync of the web process, or None if not configured.
+        Env vars: JCL_SNAPSHOT_PATH (enables it), JCL_SNAPSHOT_PROJECT
+        (default JIRA_PROJECT), JCL_SYNC_INTERVAL, JCL_RECONCILE_INTERVAL,
+        JCL_VISIBILITY_TTL.
+    '''
+    key = 'sync_loop'
+    if key not in resources:
+        path = os.getenv( 'JCL_SNAPSHOT_PATH' )
+        loop = None
+        if path:
+            project = os.getenv( 'JCL_SNAPSHOT_PROJECT', os.getenv( 'JIRA_PROJECT' ) )
+            if not project:
+                raise UserWarning( 'JCL_SNAPSHOT_PATH is set, but no project: set JCL_SNAPSHOT_PROJECT' )
+            loop = Sync_Loop( path, project,
+                interval=int( os.getenv( 'JCL_SYNC_INTERVAL', 60 ) ),
+                reconcile_interval=int( os.getenv( 'JCL_RECONCILE_INTERVAL', 3600 ) ),
+                visibility_ttl=int( os.getenv( 'JCL_VISIBILITY_TTL', 900 ) ) )
+            loop.start()
+        resources[key] = loop
+    return resources[key]
+
+
+def snapshot_for( project, jcon ):
+    ''' Read-only connection to the synced snapshot, for reports on
+        "project" by the user logged in with jcon. None if there is no
+        fresh snapshot of it. Unless jcon is the account that syncs, results
+        are limited to what jcon's token can see.
+    '''
+    loop = get_sync_loop()
+    if not loop or not project or project.upper() != loop.project.upper() or not loop.is_fresh():
+        return None
+    username = jcon.current_user()
+    if username == loop.store.get_meta( 'user' ):
+        return snapshot_connection.Snapshot_Connection( loop.path, store=loop.store, username=username )
+    return snapshot_connection.Snapshot_Connection( loop.path, store=loop.store,
+        username=username, viewer=jcon, visible_keys=loop.get_visible_keys( jcon ) )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -1,13 +1,14 @@
 #!/usr/local/bin/python3
 
 import argparse
-import jira_connection
 import libcmdline
-import libjira
+import libfields
 import liblink
+import libmetrics
 import libweb
 import logging
 import os
+import snapshot_connection
 import sys
 from simple_issue import simple_issue
 
@@ -15,6 +16,9 @@ from simple_issue import simple_issue
 # Module level resources
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue )
+
 
 def reset():
     global resources
@@ -42,6 +46,8 @@ def get_args( params=None ):
         parser.add_argument( '-q', '--quiet', action='store_true' )
         parser.add_argument( '-p', '--project',
             help="Jira project from which to search for issues." )
+        parser.add_argument( '--from_snapshot', metavar='FILE',
+            help="Read issues from a snapshot saved by snapshot.py instead of jira." )
         # raw output requested by web form
         parser.add_argument( '--output_format',
             choices=['text', 'raw' ],
@@ -115,7 +121,7 @@ def run( current_user=None, **kwargs ):
     parts = None
     if not current_user:
         # started from cmdline
-        current_user = jira_connection.Jira_Connection( libjira.jira_login() )
+        current_user = snapshot_connection.connect( get_args().from_snapshot )
     else:
         reset()
         parts = libweb.process_kwargs( kwargs )
@@ -127,26 +133,26 @@ def run( current_user=None, **kwargs ):
 
     logging.debug( 'Check for resolved stories with unresolved children' )
     jql = f'project = {get_project()} and resolved is not EMPTY and type in (Story)'
-    stories = current_user.run_jql( jql )
-    for s in stories:
-        children = current_user.get_linked_children( s )
-        for c in children:
-            if not c.fields.resolution:
+    for stories in current_user.iter_jql_pages( jql, prefetch=True, fields=jira_fields, json_result=True ):
+        children_of = current_user.get_linked_children_bulk( stories, fields=jira_fields )
+        for s in stories:
+            children = children_of[ s['key'] ]
+            for c in children:
+                if not c.fields.resolution:
+                    si = simple_issue.from_src( src=s, jcon=current_user )
+                    si.notes = f"Resolved story with unresolved child: '{c.key}'"
+                    problem_issues.append( si )
+                    break
+            try:
+                liblink.check_for_link_problems( s )
+            except UserWarning as e:
                 si = simple_issue.from_src( src=s, jcon=current_user )
-                si.notes = f"Resolved story with unresolved child: '{c.key}'"
+                si.notes = str(e)
                 problem_issues.append( si )
-                break
-        try:
-            liblink.check_for_link_problems( s )
-        except UserWarning as e:
-            si = simple_issue.from_src( src=s, jcon=current_user )
-            si.notes = str(e)
-            problem_issues.append( si )
 
     logging.debug( 'Get unresolved issues for link problems' )
     jql = f'project = {get_project()} and resolved is EMPTY and type not in (Epic)'
-    jira_issues = current_user.run_jql( jql )
-    for i in jira_issues:
+    for i in current_user.iter_jql( jql, prefetch=True, fields=jira_fields, json_result=True ):
         try:
             liblink.check_for_link_problems( i )
         except UserWarning as e:
@@ -194,4 +200,5 @@ if __name__ == '__main__':
     for key in no_debug:
         logging.getLogger(key).setLevel(logging.CRITICAL)
 
+    libmetrics.start_cli_run( 'lost_children', verbose=args.verbose )
     run()
@@ -3,8 +3,10 @@
 # import libcmdline
 import argparse
 import jira_connection
+import libfields
 import libjira
 import liblink
+import libmetrics
 import libutil
 import libweb
 import logging
@@ -16,6 +18,9 @@ from simple_issue import simple_issue
 # Module level resources
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( [ 'issuetype', 'issuelinks', libfields.EPIC_LINK ] )
+
 
 def reset():
     global resources
@@ -116,7 +121,7 @@ def run( current_user=None, **kwargs ):
         )
     logging.debug( f"jql: '{jql}'" )
     # with libutil.timeblock( 'get all issues w/o epic' ):
-    issues = current_user.run_jql( jql )
+    issues = current_user.iter_jql( jql, prefetch=True, fields=jira_fields )
 
     updates = {}
     for i in issues:
@@ -126,7 +131,7 @@ def run( current_user=None, **kwargs ):
             logging.debug( f"got epic {epic} for story {i}" )
         else:
             p = liblink.get_linked_parent( i )
-            p = current_user.reload_issue( p )
+            p = current_user.reload_issue( p, fields=jira_fields )
             epic = current_user.get_epic_key( p )
             logging.debug( f"got epic {epic} for parent {p} of issue {i}" )
         if epic not in updates:
@@ -176,4 +181,5 @@ if __name__ == '__main__':
     for key in no_debug:
         logging.getLogger(key).setLevel(logging.CRITICAL)
 
+    libmetrics.start_cli_run( 'missing_epic_links', verbose=args.verbose )
     run()
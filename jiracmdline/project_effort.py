@@ -1,8 +1,14 @@
 #!/usr/local/bin/python3
 
 from collections import defaultdict
+import csv
+import datetime
+import functools
+import io
 import simple_issue
 import math
+import numpy as np
+import pandas as pd
 
 
 class ProjectEffort:
@@ -16,6 +22,7 @@ class ProjectEffort:
         self.users = defaultdict( int )
         self.total = 0
         self.data = defaultdict(lambda: defaultdict(int)) #2-deep defaultdict
+        self.rows = None # as_list() of a view filled by EffortTable
 
     def add_worklog( self, ticket: simple_issue, user: str, secs: int ):
         # print( f'Add: {self.name} {ticket.key}, {ticket.summary}, {user} {secs}' )
@@ -39,6 +46,8 @@ class ProjectEffort:
         return { u: v/36/range_hours for u,v in self.users.items() }
 
     def as_list( self ):
+        if self.rows is not None:
+            return self.rows()
         table = []
         for t, u_data in self.data.items():
             for u, secs in u_data.items():
@@ -70,5 +79,141 @@ class ProjectEffort:
     __repr__ = __str__
 
 
+class EffortTable:
+    '''Worklogs as columns: program, issue key, user, start date, seconds.
+    Bucketing into report periods and all the sums are pandas group-bys; the
+    results fill one ProjectEffort view per ( period, program ) for the templates.
+    '''
+
+    def __init__( self ):
+        self.issues = [] # simple_issues, by ticket number
+        self.ticket_nums = {} # issue key -> ticket number
+        self.tickets = [] # ticket number of each worklog
+        self.programs = []
+        self.users = []
+        self.started = []
+        self.seconds = []
+        self.ticket_user = None # per ( period, program, ticket, user ) sums, set by summarize()
+
+    def add_worklogs( self, ticket: simple_issue, program: str, worklogs ):
+        ''' worklogs: raw worklog json of the ticket '''
+        num = self.ticket_nums.setdefault( ticket.key, len( self.issues ) )
+        if num == len( self.issues ):
+            self.issues.append( ticket )
+        count = len( self.users )
+        for w in worklogs:
+            self.users.append( w['author']['name'] )
+            self.started.append( w['started'][:10] ) # date in the worklog's time zone
+            self.seconds.append( w['timeSpentSeconds'] )
+        count = len( self.users ) - count
+        self.tickets.extend( [ num ] * count )
+        self.programs.extend( [ program ] * count )
+
+    def frame( self, periods, users=None ):
+        ''' One row per worklog started in one of periods (( start, end )
+        dates, not overlapping), by one of users (None for all). Column
+        "period" is a categorical of the period starts, in that order.
+        '''
+        # few distinct dates, find the period of each one only once
+        date_codes, dates = pd.factorize( pd.Series( self.started, dtype=object ) )
+        date_periods = np.array( [ self.period_num( periods, d ) for d in dates ], dtype='int64' )
+        df = pd.DataFrame( {
+            'period': pd.Categorical.from_codes( date_periods[ date_codes ], categories=[ p.start for p in periods ] ),
+            'program': pd.Categorical( self.programs ),
+            'ticket': np.asarray( self.tickets, dtype='int64' ),
+            'user': pd.Categorical( self.users ),
+            'seconds': np.asarray( self.seconds, dtype='int64' ),
+            } )
+        keep = df['period'].notna()
+        if users is not None:
+            keep &= df['user'].isin( users )
+        return df[keep]
+
+    @staticmethod
+    def period_num( periods, day: str ):
+        ''' Index of the period that day is in, -1 if none '''
+        d = datetime.date.fromisoformat( day )
+        for n, p in enumerate( periods ):
+            if p.start <= d <= p.end:
+                return n
+        return -1
+
+    def summarize( self, periods, users=None ):
+        ''' Return dict period start -> dict program -> ProjectEffort.
+        Tickets, users and programs keep the order of their first worklog.
+        '''
+        df = self.frame( periods, users )
+        opts = { 'observed': True, 'sort': False }
+        rows = df.groupby( [ 'period', 'program', 'ticket', 'user' ], **opts )['seconds'].sum().reset_index()
+        # make each ( period, program ) contiguous: periods in the given order,
+        # programs in order of their first worklog within the period
+        rows['group'] = rows.groupby( [ 'period', 'program' ], **opts ).ngroup()
+        rows['position'] = rows['period'].cat.codes
+        rows = rows.sort_values( [ 'position', 'group' ], kind='stable', ignore_index=True )
+        self.ticket_user = rows
+        tickets = rows.groupby( [ 'group', 'ticket' ], **opts )['seconds'].sum().reset_index()
+        users = rows.groupby( [ 'group', 'user' ], **opts )['seconds'].sum().reset_index()
+        totals = rows.groupby( [ 'group' ], **opts ).agg(
+            period=( 'period', 'first' ),
+            program=( 'program', 'first' ),
+            seconds=( 'seconds', 'sum' ) )
+
+        ticket_issues = [ self.issues[n] for n in tickets['ticket'].tolist() ]
+        ticket_secs = tickets['seconds'].tolist()
+        user_names = users['user'].tolist()
+        user_secs = users['seconds'].tolist()
+        ticket_bounds = self.bounds( tickets['group'] )
+        user_bounds = self.bounds( users['group'] )
+        row_bounds = self.bounds( rows['group'] )
+
+        views = { p.start: {} for p in periods }
+        groups = zip( totals['period'].tolist(), totals['program'].tolist(), totals['seconds'].tolist(),
+            ticket_bounds, user_bounds, row_bounds )
+        for period, program, secs, ( t1, t2 ), ( u1, u2 ), ( r1, r2 ) in groups:
+            p = ProjectEffort( program )
+            p.total = secs
+            p.tickets.update( zip( ticket_issues[t1:t2], ticket_secs[t1:t2] ) )
+            p.users.update( zip( user_names[u1:u2], user_secs[u1:u2] ) )
+            p.rows = functools.partial( self.as_list, r1, r2 )
+            views[period][program] = p
+        return views
+
+    @staticmethod
+    def bounds( groups ):
+        ''' ( start, end ) positions of each run of equal values in groups '''
+        values = groups.to_numpy()
+        if len( values ) == 0:
+            return []
+        starts = np.flatnonzero( np.diff( values ) ) + 1
+        starts = [ 0 ] + starts.tolist()
+        return list( zip( starts, starts[1:] + [ len( values ) ] ) )
+
+    def as_list( self, start=0, end=None ):
+        ''' Rows of summarize() like ProjectEffort.as_list() '''
+        rows = self.ticket_user.iloc[ start:end ]
+        return [ [ program, self.issues[n].key, self.issues[n].summary, user, secs ]
+            for program, n, user, secs in zip( rows['program'].tolist(), rows['ticket'].tolist(),
+                rows['user'].tolist(), rows['seconds'].tolist() ) ]
+
+    def to_csv( self ):
+        ''' Sums per ( period, program, ticket, user ), as from summarize() '''
+        rows = self.ticket_user
+        nums = rows['ticket'].to_numpy()
+        starts = np.array( [ str( s ) for s in rows['period'].cat.categories ], dtype=object )
+        columns = (
+            starts[ rows['period'].cat.codes.to_numpy() ].tolist(),
+            rows['program'].tolist(),
+            np.array( [ i.key for i in self.issues ], dtype=object )[ nums ].tolist(),
+            np.array( [ i.summary for i in self.issues ], dtype=object )[ nums ].tolist(),
+            rows['user'].tolist(),
+            rows['seconds'].tolist(),
+            )
+        file = io.StringIO()
+        writer = csv.writer( file, lineterminator='\n' )
+        writer.writerow( [ 'startdate', 'program', 'issue', 'summary', 'user', 'seconds' ] )
+        writer.writerows( zip( *columns ) )
+        return file.getvalue()
+
+
 if __name__ == '__main__':
     raise SystemExit( 'not a cmdline module' )
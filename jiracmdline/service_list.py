@@ -1,12 +1,13 @@
 #!/usr/local/bin/python3
 
 import argparse
-import jira_connection
 import libcmdline
-import libjira
+import libfields
+import libmetrics
 import libweb
 import logging
 import os
+import snapshot_connection
 import urllib.parse
 from simple_issue import simple_issue
 
@@ -16,6 +17,9 @@ import pprint
 logr = logging.getLogger( __name__ )
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( [ libfields.EPIC_NAME ] )
+
 
 def reset():
     global resources
@@ -43,6 +47,8 @@ def get_args( params=None ):
         parser.add_argument( '-v', '--verbose', action='store_true' )
         parser.add_argument( '-p', '--project',
             help="Jira project from which to get current Sprint" )
+        parser.add_argument( '--from_snapshot', metavar='FILE',
+            help="Read issues from a snapshot saved by snapshot.py instead of jira." )
         # raw output requested by web form
         parser.add_argument( '-o', '--output_format',
             choices=['text', 'raw' ],
@@ -83,7 +89,7 @@ def run( current_user=None, **kwargs ):
     parts = None
     if not current_user:
         # started from cmdline
-        current_user = jira_connection.Jira_Connection( libjira.jira_login() )
+        current_user = snapshot_connection.connect( get_args().from_snapshot )
     else:
         # running from web
         reset()
@@ -97,7 +103,7 @@ def run( current_user=None, **kwargs ):
     # Strip prefix from epic name to create a list of unique service names
     raw_names = []
     jql = f'project={get_project()} and type=epic and resolved is empty'
-    epics = current_user.run_jql( jql )
+    epics = current_user.run_jql( jql, fields=jira_fields, json_result=True )
     for epic in epics:
         e_name = current_user.get_epic_name( epic )
         parts = e_name.split( '-', maxsplit=1 )
@@ -133,4 +139,5 @@ if __name__ == '__main__':
     for key in no_debug:
         logging.getLogger(key).setLevel(logging.CRITICAL)
 
+    libmetrics.start_cli_run( 'service_list', verbose=args.verbose )
     run()
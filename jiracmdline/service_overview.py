@@ -1,13 +1,14 @@
 #!/usr/local/bin/python3
 
 import argparse
-import jira_connection
 import libcmdline
-import libjira
+import libfields
+import libmetrics
 import libutil
 import libweb
 import logging
 import os
+import snapshot_connection
 import urllib.parse
 from simple_issue import simple_issue
 
@@ -16,6 +17,9 @@ import pprint
 # Module level resources
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue )
+
 
 def reset():
     global resources
@@ -45,6 +49,8 @@ def get_args( params=None ):
             help="Service Name (epic name with prefix removed)" )
         parser.add_argument( '-p', '--project',
             help="Jira project" )
+        parser.add_argument( '--from_snapshot', metavar='FILE',
+            help="Read issues from a snapshot saved by snapshot.py instead of jira." )
         # raw output requested by web form
         parser.add_argument( '-o', '--output_format',
             choices=['text', 'raw' ],
@@ -73,51 +79,73 @@ def get_project():
     return resources[key]
 
 
-def run( current_user=None, **kwargs ):
-    parts = None
-    if not current_user:
-        # started from cmdline
-        current_user = jira_connection.Jira_Connection( libjira.jira_login() )
-    else:
-        # running from web
-        reset()
-        parts = libweb.process_kwargs( kwargs )
-        parts.append( '--output_format=raw' )
-        logging.debug( f"KWARGS: '{parts}" )
-    args = get_args( params=parts )
-    logging.debug( f"ARGS: '{args}" )
-
-    logging.debug( f"get epics for Service: '{args.service_name}'" )
-    jql = (
+def mk_epics_jql( args ):
+    return (
         f'project={get_project()}'
         f' and type=epic and resolved is empty'
         f' and text ~ "{args.service_name}"'
         )
-    epic_list = current_user.run_jql( jql )
+
+
+def stories_by_epic( results ):
+    ''' results: list of Map_Result from map_issues( get_stories_in_epic, epics ) '''
+    stories_of = {}
+    for r in results:
+        if r.error:
+            raise r.error
+        stories_of[ r.item['key'] ] = r.result
+    return stories_of
+
+
+def mk_data( args, current_user, epic_list, stories_of, children_of ):
     epics = {}
     for epic in epic_list:
-        epics[ epic.key ] = {
+        epics[ epic['key'] ] = {
             'epic': simple_issue.from_src( epic, current_user )
             }
-
-        logging.debug( f'get stories for epic {epic.key}' )
         subordinates = []
-        for story in current_user.get_stories_in_epic( epic ):
+        for story in stories_of[ epic['key'] ]:
             subordinates.append( simple_issue.from_src( story, current_user ) )
-
-            logging.debug( f'get children of story {story.key}' )
-            children_raw = current_user.get_linked_children( story )
-            children_simple = [ simple_issue.from_src(c, current_user) for c in children_raw ]
+            children_simple = [ simple_issue.from_src(c, current_user) for c in children_of[ story['key'] ] ]
             subordinates.extend( sorted( children_simple ) )
-        epics[ epic.key ]['subordinates'] = subordinates
+        epics[ epic['key'] ]['subordinates'] = subordinates
 
-    data = {
+    return {
         'service_name': args.service_name,
         'service_name_short': args.service_name.strip(')').split('(')[-1],
         'epics': epics,
         'headers': ( 'story', 'child', 'summary', 'due', ),
         }
 
+
+def run( current_user=None, **kwargs ):
+    parts = None
+    if not current_user:
+        # started from cmdline
+        current_user = snapshot_connection.connect( get_args().from_snapshot )
+    else:
+        # running from web
+        reset()
+        parts = libweb.process_kwargs( kwargs )
+        parts.append( '--output_format=raw' )
+        logging.debug( f"KWARGS: '{parts}" )
+    args = get_args( params=parts )
+    logging.debug( f"ARGS: '{args}" )
+
+    logging.debug( f"get epics for Service: '{args.service_name}'" )
+    epic_list = current_user.run_jql( mk_epics_jql( args ), fields=jira_fields, json_result=True )
+    logging.debug( 'get stories for all epics' )
+    stories_of = stories_by_epic( current_user.map_issues(
+        lambda e: current_user.get_stories_in_epic( e, fields=jira_fields, json_result=True ),
+        epic_list
+        ) )
+
+    logging.debug( 'get children of all stories' )
+    all_stories = [ s for stories in stories_of.values() for s in stories ]
+    children_of = current_user.get_linked_children_bulk( all_stories, fields=jira_fields, json_result=True )
+
+    data = mk_data( args, current_user, epic_list, stories_of, children_of )
+
     if args.output_format == 'text':
         pprint.pprint( data )
     else:
@@ -134,4 +162,5 @@ if __name__ == '__main__':
     for key in no_debug:
         logging.getLogger(key).setLevel(logging.CRITICAL)
 
+    libmetrics.start_cli_run( 'service_overview', verbose=args.verbose )
     run()
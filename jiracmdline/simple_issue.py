@@ -1,13 +1,19 @@
 import dataclasses
+import libfields
 import liblink
 import libsprint
 import logging
+import operator
 import packaging
+import sys
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass( slots=True )
 class simple_issue:
-    ''' Basic parts of a jira issue for display purposes '''
+    ''' Basic parts of a jira issue for display purposes
+        The sort key ( due, project, number ) is computed once, at
+        construction; comparisons and hashing use it.
+    '''
     key: str = ''
     issue_type: str = ''
     summary: str = ''
@@ -17,12 +23,13 @@ class simple_issue:
     due: str = dataclasses.field(repr=False, default='')
     in_sprint: str = dataclasses.field(repr=False, default='')
     url: str = dataclasses.field(repr=False, default=None)
-    links: list[str] = dataclasses.field( repr=False, default_factory=list )
+    links: tuple[str, ...] = dataclasses.field( repr=False, default=() )
     epic: str = dataclasses.field(repr=False, default=None)
     epic_name: str = dataclasses.field(repr=False, default=None)
     notes: str = dataclasses.field(repr=False, default='')
     resolution: str = dataclasses.field(repr=False, default='')
     resolved: str = dataclasses.field(repr=False, default='')
+    sort_key: tuple = dataclasses.field(init=False, repr=False, default=())
 
 
     def __post_init__( self ):
@@ -32,6 +39,10 @@ class simple_issue:
             self.epic = '-'
         if self.resolution:
             self.resolved = 'resolved'
+        self.links = tuple( self.links )
+        project, _, number = self.key.partition( '-' )
+        # many issues share a few project names
+        self.sort_key = ( self.due, sys.intern( project ), int( number ) if number else 0 )
 
 
     # def __repr__( self ):
@@ -41,9 +52,11 @@ class simple_issue:
 
     @classmethod
     def from_src( cls, src, jcon ):
-        ''' Create from an existing issue
+        ''' Create from an existing issue (a jira Issue, or its raw json)
             jcon is an instance of a jira_connection
         '''
+        if isinstance( src, dict ):
+            return cls.from_raw( src, jcon )
         logging.debug(f'got src:{src}')
         params = {}
         # if type is not 'story', then assume it's a 'child'
@@ -74,46 +87,99 @@ class simple_issue:
         return cls( **params )
 
 
+    @classmethod
+    def from_raw( cls, raw, jcon ):
+        ''' Create from the raw json of an issue, e.g. from
+            jcon.run_jql( jql, json_result=True ), without building
+            jira Resource objects. Same result as from_src.
+        '''
+        fields = raw['fields']
+        key = raw['key']
+        issue_type = fields['issuetype']['name'].lower()
+        if issue_type not in ('story', 'epic') :
+            issue_type = 'child'
+        links = []
+        for link in fields.get( 'issuelinks' ) or []:
+            if 'inwardIssue' in link:
+                links.append( f"{link['type']['inward']} {link['inwardIssue']['key']}" )
+            else:
+                links.append( f"{link['type']['outward']} {link['outwardIssue']['key']}" )
+        resolution = fields.get( 'resolution' )
+        params = { issue_type: key }
+        params.update(
+            issue_type=issue_type,
+            due=fields.get( 'duedate' ),
+            in_sprint=libsprint.get_active_sprint_name( raw ),
+            summary=fields['summary'][0:50],
+            url=f'{jcon.server_url}/browse/{key}',
+            key=key,
+            server_url=jcon.server_url,
+            epic=fields.get( libfields.EPIC_LINK ),
+            epic_name=fields.get( libfields.EPIC_NAME ),
+            resolution=resolution['name'] if resolution else '',
+            links=links,
+            )
+        return cls( **params )
+
+
     def key_parts( self ):
         '''Split the key into string and numeric parts to enable better sorting
         '''
-        x, y = self.key.split( sep='-', maxsplit=1 )
-        return (x, int(y) )
+        return self.sort_key[1:]
 
 
     def __hash__( self ):
-        return hash( (self.due, self.key_parts()) )
+        return hash( self.sort_key )
 
 
     def __eq__( self, other ):
         if isinstance( other, simple_issue ):
-            return (self.due, self.key_parts()) == (other.due, other.key_parts())
+            return self.sort_key == other.sort_key
         return NotImplemented
 
 
     def __lt__( self, other ):
         if isinstance( other, simple_issue ):
-            return (self.due, self.key_parts()) < (other.due, other.key_parts())
+            return self.sort_key < other.sort_key
         return NotImplemented
 
 
     def __le__( self, other ):
         if isinstance( other, simple_issue ):
-            return (self.due, self.key_parts()) <= (other.due, other.key_parts())
+            return self.sort_key <= other.sort_key
         return NotImplemented
 
 
     def __gt__( self, other ):
         if isinstance( other, simple_issue ):
-            return (self.due, self.key_parts()) > (other.due, other.key_parts())
+            return self.sort_key > other.sort_key
         return NotImplemented
 
 
     def __ge__( self, other ):
         if isinstance( other, simple_issue ):
-            return (self.due, self.key_parts()) >= (other.due, other.key_parts())
+            return self.sort_key >= other.sort_key
         return NotImplemented
 
 
+def mk_issue_list( parents, children_of, jcon ):
+    ''' Sorted list of simple_issues, each parent followed by its (sorted) children
+        parents: dict of parent key -> Issue
+        children_of: dict of parent key -> list of child Issues
+    '''
+    by_sort_key = operator.attrgetter( 'sort_key' )
+    simple_parents = sorted(
+        ( simple_issue.from_src( src=p, jcon=jcon ) for p in parents.values() ),
+        key=by_sort_key )
+    all_issues = []
+    for simple_p in simple_parents:
+        children = children_of[ simple_p.key ]
+        simple_children = [ simple_issue.from_src( src=c, jcon=jcon ) for c in children ]
+        simple_children.sort( key=by_sort_key )
+        all_issues.append( simple_p )
+        all_issues.extend( simple_children )
+    return all_issues
+
+
 if __name__ == '__main__':
     raise UserWarning( 'Invocation error; not a standalone script.' )
@@ -0,0 +1,114 @@
+#!/usr/local/bin/python3
+
+import argparse
+import jira_connection
+import libjira
+import libmetrics
+import libsnapshot
+import libsync
+import logging
+import os
+import time
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+resources = {}
+
+
+def get_args( params=None ):
+    key = 'args'
+    if key not in resources:
+        constructor_args = {
+            'formatter_class': argparse.RawDescriptionHelpFormatter,
+            'description': 'Save all issues and worklogs of a jira project to a local SQLite file.',
+            'epilog': (
+                'Reports that accept --from_snapshot FILE then run against the file,\n'
+                'without network access.\n'
+                'Environment Variables:\n'
+                '    NETRC:\n'
+                '        Jira login credentials should be stored in ~/.netrc.\n'
+                '        Machine name should be hostname only.\n'
+                '    JIRA_PROJECT:\n'
+                '        Default jira project (if not specified on cmdline).\n'
+            )
+        }
+        parser = argparse.ArgumentParser( **constructor_args )
+        parser.add_argument( '-d', '--debug', action='store_true' )
+        parser.add_argument( '-v', '--verbose', action='store_true' )
+        parser.add_argument( '-p', '--project',
+            help="Jira project to save." )
+        parser.add_argument( '-o', '--output',
+            help="Snapshot file (default: <project>.sqlite)" )
+        parser.add_argument( '--sync', action='store_true',
+            help="Update an existing snapshot with the issues changed since it was last synced." )
+        parser.add_argument( '--reconcile', action='store_true',
+            help="With --sync, also remove issues deleted from jira (done hourly anyway)." )
+        resources[key] = parser.parse_args( params )
+    return resources[key]
+
+
+def get_project():
+    key = 'project'
+    if key not in resources:
+        args = get_args()
+        if args.project:
+            resources[key] = args.project
+        else:
+            try:
+                resources[key] = os.environ['JIRA_PROJECT']
+            except KeyError:
+                msg = (
+                    'No jira project specified.'
+                    ' Set JIRA_PROJECT or specify via cmdline option.'
+                )
+                raise UserWarning( msg )
+    return resources[key]
+
+
+def run( current_user=None ):
+    args = get_args()
+    project = get_project()
+    if not current_user:
+        current_user = jira_connection.Jira_Connection( libjira.jira_login() )
+    path = args.output if args.output else f'{project}.sqlite'
+    start = time.time()
+    if args.sync and os.path.exists( path ):
+        store = libsnapshot.Snapshot_Store( path )
+        if store.get_meta( 'project' ) != project:
+            raise UserWarning( f"'{path}' is not a snapshot of {project}" )
+        counts = libsync.sync( store, current_user, project, force_reconcile=args.reconcile )
+        store.close()
+        print( f"Updated {counts['updated']} and removed {counts['deleted']} issues"
+            f" of {project} in {path} in {time.time() - start:.1f}s" )
+        return
+    # write to a new file, replace the old snapshot only when complete
+    tmp_path = f'{path}.tmp'
+    if os.path.exists( tmp_path ):
+        os.remove( tmp_path )
+    store = libsnapshot.Snapshot_Store( tmp_path )
+    counts = libsync.sync( store, current_user, project )
+    store.close()
+    os.replace( tmp_path, path )
+    print( f"Saved {counts['updated']} issues of {project} to {path} in {time.time() - start:.1f}s" )
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    # Configure logging
+    loglvl = logging.WARNING
+    if args.verbose:
+        loglvl = logging.INFO
+    if args.debug:
+        loglvl = logging.DEBUG
+    fmtstr = '%(levelname)s:%(pathname)s.%(module)s.%(funcName)s[%(lineno)d] %(message)s'
+    logging.basicConfig( level=loglvl, format=fmtstr )
+
+    no_debug = [
+        'urllib3',
+    ]
+    for key in no_debug:
+        logging.getLogger(key).setLevel(logging.CRITICAL)
+
+    libmetrics.start_cli_run( 'snapshot', verbose=args.verbose )
+    run()
@@ -0,0 +1,251 @@
+import jira
+import jira.resources
+import jira_connection
+import libjira
+import libjql
+import libsnapshot
+import logging
+import threading
+import time
+from jira_connection import Jira_Connection, Map_Result
+
+# Module level resources
+logr = logging.getLogger( __name__ )
+
+
+class Visible_Keys( object ):
+    ''' Which issue keys one user's token can see, kept across requests
+        for ttl seconds (see libsync.Sync_Loop.get_visible_keys).
+        Unknown keys are checked with chunked "key in (...)" searches, or
+        with one key-only scan of the project when most of it is unknown.
+        Keys changed by a sync are forgotten, so they are checked again.
+    '''
+
+    def __init__( self, project, ttl ):
+        self.project = project
+        self.expires = time.monotonic() + ttl
+        self.visible = set()
+        self.hidden = set()
+        self.lock = threading.Lock()
+
+
+    def is_expired( self ):
+        return time.monotonic() > self.expires
+
+
+    def forget( self, keys ):
+        with self.lock:
+            self.visible.difference_update( keys )
+            self.hidden.difference_update( keys )
+
+
+    def check( self, viewer, keys, store ):
+        ''' viewer: live Jira_Connection with the token
+            store: the Snapshot_Store, for the size of the project
+            Return the set of keys that viewer can see
+        '''
+        keys = set( keys )
+        with self.lock:
+            unknown = keys - self.visible - self.hidden
+            prefix = f'{self.project}-'.upper()
+            in_project = { k for k in unknown if k.upper().startswith( prefix ) }
+            # a scan is one call per 1000 issues, "key in" one per 100 keys
+            if in_project and len( in_project ) > len( store.all_keys() ) / 10:
+                jql = f'project = {self.project}'
+                for page in viewer.iter_jql_pages( jql, page_size=1000, fields=[ 'key' ],
+                        validate=False, json_result=True ):
+                    self.visible.update( i['key'] for i in page )
+                self.hidden.update( in_project - self.visible )
+                unknown -= in_project
+            if unknown:
+                found = { i.key for i in viewer._search_keys( unknown, 'key' ) }
+                self.visible.update( found )
+                self.hidden.update( unknown - found )
+            return keys & self.visible
+
+
+class Snapshot_Connection( Jira_Connection ):
+    ''' Read-only Jira_Connection backed by a local snapshot (see snapshot.py).
+        Searches are evaluated locally with libjql, so reports run without
+        network access. Issues and worklogs are jira.resources objects, as
+        from the live connection.
+    '''
+
+    def __init__( self, path, store=None, username=None, viewer=None, visible_keys=None ):
+        ''' store: an already open Snapshot_Store of path, to share it
+            username: returned by current_user(), default: who took the snapshot
+            viewer: live Jira_Connection of the user the reports are for,
+                results are limited to the issues its token can see
+            visible_keys: Visible_Keys of viewer's token, kept by the caller
+        '''
+        super().__init__( None, user_id=f'snapshot-{path}' )
+        self.store = store if store else libsnapshot.Snapshot_Store( path )
+        self.username = username
+        self.viewer = viewer
+        if self.store.get_meta( 'project' ) is None:
+            raise UserWarning( f"'{path}' is not a jira snapshot, create one with snapshot.py" )
+        if viewer is not None and visible_keys is None:
+            visible_keys = Visible_Keys( self.store.get_meta( 'project' ), ttl=0 )
+        self.visible_keys = visible_keys
+        self.server_url = self.store.get_meta( 'server' )
+        self.options = dict( jira.JIRA.DEFAULT_OPTIONS, server=self.server_url )
+
+
+    def __getattr__( self, name ):
+        raise AttributeError( f"'{name}' is not available when reading from a snapshot" )
+
+
+    def _issue_from_raw( self, raw ):
+        return jira.resources.Issue( self.options, None, raw=raw )
+
+
+    def _check_keys( self, keys ):
+        ''' Return the set of keys the viewer can see '''
+        return self.visible_keys.check( self.viewer, keys, self.store )
+
+
+    def _for_viewer( self, issues ):
+        ''' Drop issues, and links to issues, the viewer can't see '''
+        if self.viewer is None:
+            return issues
+        keys = set()
+        for raw in issues:
+            keys.add( raw['key'] )
+            for link in raw['fields'].get( 'issuelinks' ) or []:
+                other = link.get( 'outwardIssue' ) or link.get( 'inwardIssue' )
+                keys.add( other['key'] )
+        visible = self._check_keys( keys )
+        rv = []
+        for raw in issues:
+            if raw['key'] not in visible:
+                continue
+            links = raw['fields'].get( 'issuelinks' )
+            if links:
+                raw['fields']['issuelinks'] = [ link for link in links
+                    if ( link.get( 'outwardIssue' ) or link.get( 'inwardIssue' ) )['key'] in visible ]
+            rv.append( raw )
+        return rv
+
+
+    def _worklogs_for_viewer( self, key, worklogs ):
+        ''' Worklogs of an issue the viewer can see, without the ones
+            restricted to a group or role (the snapshot doesn't know the
+            viewer's groups)
+        '''
+        if self.viewer is None:
+            return worklogs
+        if not self._check_keys( [ key ] ):
+            return []
+        return [ w for w in worklogs if not w.get( 'visibility' ) ]
+
+
+    def get_project_graph( self, project ):
+        ''' Searches are local, no need for a libgraph index '''
+        return None
+
+
+    def run_jql( self, jql, fields=None, validate=True, json_result=False ):
+        ''' fields and validate are accepted for compatibility, the snapshot
+            holds the fields listed in libsync.get_fields()
+        '''
+        query = libjql.Query( jql )
+        issues = self._for_viewer( self.store.search( query ) )
+        if json_result:
+            return issues
+        return [ self._issue_from_raw( raw ) for raw in issues ]
+
+
+    def iter_jql_pages( self, jql, page_size=100, prefetch=False, fields=None, validate=True, json_result=False ):
+        issues = self.run_jql( jql, json_result=json_result )
+        for i in range( 0, len( issues ), page_size ):
+            yield issues[ i:i+page_size ]
+
+
+    def get_issue_by_key( self, key, fields=None ):
+        key = getattr( key, 'key', key )
+        raw = self.store.get_issue( key )
+        if raw is not None:
+            raw = next( iter( self._for_viewer( [ raw ] ) ), None )
+        if raw is None:
+            raise UserWarning( f"No such ticket '{key}' in snapshot" )
+        return self._issue_from_raw( raw )
+
+
+    def find_issues_by_keys( self, keys, fields=None, json_result=False ):
+        keys = list( dict.fromkeys( getattr( k, 'key', k ).upper() for k in keys ) )
+        found = self.store.get_issues( keys )
+        found = { raw['key']: raw for raw in self._for_viewer( list( found.values() ) ) }
+        if json_result:
+            issues = [ found[k] for k in keys if k in found ]
+        else:
+            issues = [ self._issue_from_raw( found[k] ) for k in keys if k in found ]
+        missing = [ k for k in keys if k not in found ]
+        return ( issues, missing )
+
+
+    def reload_issue( self, issue, fields=None ):
+        return self.get_issue_by_key( issue.key )
+
+
+    def reload_issues( self, issues, fields=None ):
+        return [ self.reload_issue( i ) for i in issues ]
+
+
+    def map_issues( self, fn, items ):
+        ''' Local reads are fast, no threads needed '''
+        rv = []
+        for item in items:
+            try:
+                rv.append( Map_Result( item, fn( item ), None ) )
+            except Exception as e:
+                rv.append( Map_Result( item, None, e ) )
+        return rv
+
+
+    def worklogs( self, issue ):
+        key = getattr( issue, 'key', issue )
+        raws = self._worklogs_for_viewer( key, self.store.get_worklogs( key ) )
+        return [ jira.resources.Worklog( self.options, None, raw=w ) for w in raws ]
+
+
+    def get_worklogs_between( self, issues, start, end ):
+        rv = []
+        for i in issues:
+            raws = self._worklogs_for_viewer( i.key,
+                self.store.get_worklogs( i.key, started_from=start, started_to=end ) )
+            worklogs = [ jira.resources.Worklog( self.options, None, raw=w ) for w in raws ]
+            rv.append( Map_Result( i, worklogs, None ) )
+        return rv
+
+
+    def current_user( self ):
+        if self.username:
+            return self.username
+        return self.store.get_meta( 'user' )
+
+
+    def forget_issues( self, keys ):
+        pass
+
+
+    def link_to_parent( self, child, parent, dryrun=False ):
+        raise UserWarning( 'A snapshot is read-only' )
+
+
+    def add_tasks_to_epic( self, issue_list, epic_key ):
+        raise UserWarning( 'A snapshot is read-only' )
+
+
+    def mk_child_tasks( self, parent, child_summaries, dryrun=False ):
+        raise UserWarning( 'A snapshot is read-only' )
+
+
+def connect( snapshot_path=None ):
+    ''' Connection for a cmdline run: the snapshot if given, else live jira '''
+    if snapshot_path:
+        return Snapshot_Connection( snapshot_path )
+    return jira_connection.Jira_Connection( libjira.jira_login() )
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
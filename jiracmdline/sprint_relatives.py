@@ -1,17 +1,24 @@
 #!/usr/local/bin/python3
 
 import argparse
+import jira.exceptions
 import libcmdline
+import libfields
+import libmetrics
 import logging
 import os
 import libweb
-from simple_issue import simple_issue
+import snapshot_connection
+from simple_issue import simple_issue, mk_issue_list
 
 
 # Module level resources
 logr = logging.getLogger( __name__ )
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue )
+
 
 def reset():
     global resources
@@ -41,6 +48,8 @@ def get_args( params=None ):
             help="Jira project from which to get current Sprint" )
         parser.add_argument( '-s', '--sprint',
             help="Sprint name to use (instead of looking for current sprint)" )
+        parser.add_argument( '--from_snapshot', metavar='FILE',
+            help="Read issues from a snapshot saved by snapshot.py instead of jira." )
         # raw output requested by web form
         parser.add_argument( '-o', '--output_format',
             choices=['text', 'raw' ],
@@ -73,70 +82,61 @@ def get_issues_in_sprint( current_user, sprint_name=None ):
     jql = f'sprint in openSprints() and project = {get_project()}'
     if sprint_name:
         raise UserWarning( 'TODO' )
-    return current_user.run_jql( jql )
+    return current_user.run_jql( jql, fields=jira_fields, json_result=True )
 
 
 
 def stories_of_sprint( current_user, issues ):
     stories = []
+    tasks = []
     for i in issues:
-        i_type = i.fields.issuetype.name
+        i_type = current_user.get_issue_type( i )
         if i_type == "Story":
             stories.append(i)
         elif i_type == "Task":
-            parent = current_user.get_linked_parent(i) # returns None if not linked
-            if parent:
-                stories.append(parent)
+            tasks.append(i)
         else:
             msg = (
-                f"Unsupported issue type '{i_type}' for issue {i}."
+                f"Unsupported issue type '{i_type}' for issue {i['key']}."
                 "Expected one of 'Story', 'Task'."
             )
             raise UserWarning( msg )
-    return set( stories ) # use a set to remove duplicates
+    parent_of = current_user.get_linked_parents_bulk( tasks, fields=jira_fields, json_result=True ) # None if not linked
+    stories.extend( p for p in parent_of.values() if p )
+    return stories
 
 
 def run( current_user=None, **kwargs ):
+    parts = None
     if not current_user:
-        raise UserWarning( "Not implemented for cmdline" )
+        # started from cmdline
+        current_user = snapshot_connection.connect( get_args().from_snapshot )
     else:
         reset()
         parts = libweb.process_kwargs( kwargs )
         parts.append( '--output_format=raw' )
         print( f"KWARGS: '{parts}" )
     args = get_args( params=parts )
-    print( f"ARGS: '{args}" )
+    logr.debug( f"ARGS: '{args}'" )
 
     logr.debug( 'get sprint issues...' )
     sprint_issues = get_issues_in_sprint( current_user )
 
     # for any tasks in the sprint, get their parent story
     logr.debug( 'get stories in sprint...' )
-    parents = {}
-    simple_parents = []
-    for s in stories_of_sprint( current_user, sprint_issues ):
-    # stories = stories_of_sprint( current_user, sprint_issues )
-        parents[s.key] = s
-        simple_parents.append( simple_issue.from_src( src=s, jcon=current_user.jira ) )
-    simple_parents.sort()
-
-    all_issues = []
-
-    for simple_p in simple_parents:
-        p = parents[ simple_p.key ]
-        logr.debug( f"processing parent '{p}'" )
-        try:
-            children = current_user.get_linked_children( p )
-        except jira.exceptions.JIRAError as e:
-            raise UserWarning( e.text )
-        simple_children = [ simple_issue.from_src( src=c, jcon=current_user.jira ) for c in children ]
-        simple_children.sort()
-        all_issues.append( simple_p )
-        all_issues.extend( simple_children )
+    parents = { s['key']: s for s in stories_of_sprint( current_user, sprint_issues ) } # removes duplicates
+
+    logr.debug( 'get children of stories...' )
+    try:
+        children_of = current_user.get_linked_children_bulk( parents.values(), fields=jira_fields, json_result=True )
+    except jira.exceptions.JIRAError as e:
+        raise UserWarning( e.text )
+
+    all_issues = mk_issue_list( parents, children_of, current_user )
 
     headers = ('story', 'child', 'due', 'in_sprint', 'summary')
     if args.output_format == 'text':
-        libcmdline.text_table( headers, issues )
+        libcmdline.text_table( headers, all_issues )
     else:
         return {
             'headers': headers,
@@ -173,4 +173,5 @@ if __name__ == '__main__':
     for key in no_debug:
         logging.getLogger(key).setLevel(logging.CRITICAL)
 
+    libmetrics.start_cli_run( 'sprint_relatives', verbose=args.verbose )
     run()
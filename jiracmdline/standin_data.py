@@ -0,0 +1,515 @@
+''' Synthetic jira data for the jira stand-in server (see jira_standin.py).
+    Generates projects following the Epic-Story-Task model used here:
+    Epics own Stories through "Epic Link", Stories own Tasks through
+    "Ancestor" links, plus sprints, program customfields and worklogs.
+    Issues are kept as compact records and rendered to REST json on demand,
+    so 100k issue projects fit comfortably in memory.
+'''
+import collections
+import dataclasses
+import datetime
+import functools
+import libfields
+import libjql
+import random
+import threading
+import zlib
+
+# Custom fields used to classify issues to programs (see conf/config.ini)
+PROGRAMS = 'customfield_10406'
+RESEARCH_SYSTEM = 'customfield_10409'
+program_values = [ 'ACCESS', 'Delta', 'Radiant', 'ISF', 'Illinois Computes', 'CILogon' ]
+system_values = [ 'Delta', 'DeltaAI', 'Granite', 'Taiga', 'Radiant', 'Nightingale' ]
+service_names = [ 'Delta', 'Radiant', 'Granite', 'Taiga', 'Monitoring', 'Backups',
+    'Identity', 'Storage', 'Web Hosting', 'Campus Cluster' ]
+
+ancestor_link_type = {
+    'id': '10300',
+    'name': 'Ancestor',
+    'inward': 'is a child of',
+    'outward': 'is the parent of',
+    }
+
+jira_tz = datetime.timezone( datetime.timedelta( hours=-6 ) )
+
+
+@functools.lru_cache( maxsize=500000 )
+def fmt_datetime( dt ):
+    ''' Jira REST datetime format, e.g. 2025-01-06T09:00:00.000-0600 '''
+    return dt.strftime( '%Y-%m-%dT%H:%M:%S.000%z' )
+
+
+@dataclasses.dataclass
+class Sprint_Record:
+    id: int
+    name: str
+    state: str
+    start: datetime.datetime
+    end: datetime.datetime
+
+    def as_greenhopper_str( self ):
+        ''' Format of customfield "Sprint" parsed by libsprint._str_to_sprint '''
+        start = fmt_datetime( self.start )
+        end = fmt_datetime( self.end )
+        complete = end if self.state == 'CLOSED' else '<null>'
+        return (
+            f'com.atlassian.greenhopper.service.sprint.Sprint@{self.id:x}['
+            f'id={self.id},rapidViewId=1,state={self.state},name={self.name},'
+            f'startDate={start},endDate={end},completeDate={complete},'
+            f'activatedDate={start},sequence={self.id},goal=,autoStartStop=false]'
+            )
+
+
+@dataclasses.dataclass
+class Worklog_Record:
+    id: int
+    author: str
+    started: datetime.datetime
+    seconds: int
+    updated: datetime.datetime
+
+
+@dataclasses.dataclass
+class Issue_Record:
+    id: int
+    key: str
+    issue_type: str
+    summary: str
+    created: datetime.datetime
+    updated: datetime.datetime
+    description: str = ''
+    epic: str = None
+    epic_name: str = None
+    parents: list = dataclasses.field( default_factory=list )
+    children: list = dataclasses.field( default_factory=list )
+    due: datetime.date = None
+    resolved: datetime.datetime = None
+    sprints: list = dataclasses.field( default_factory=list )
+    program: str = None
+    systems: list = dataclasses.field( default_factory=list )
+    worklogs: list = dataclasses.field( default_factory=list )
+
+
+class Store( libjql.Context ):
+    ''' All issues known to the stand-in server '''
+
+    def __init__( self, base_url='http://localhost:8080' ):
+        self.base_url = base_url
+        self.issues = {}   # key -> Issue_Record
+        self.sprints = {}  # id -> Sprint_Record
+        self.users = []
+        self.groups = {}   # group name -> usernames
+        self.next_id = 10000
+        self.next_num = {} # project key -> next issue number
+        self.lock = threading.RLock()
+        # paging through a result re-runs the same jql, remember recent results
+        self.version = 0
+        self.search_cache = collections.OrderedDict()
+
+
+    # --- libjql.Context ---
+    def get_issue( self, key ):
+        rec = self.issues.get( key.upper() )
+        return self.render( rec ) if rec else None
+
+
+    def get_worklogs( self, key ):
+        ''' Only the worklog parts used in jql '''
+        rec = self.issues.get( key.upper() )
+        if not rec:
+            return []
+        return [ { 'author': { 'name': w.author }, 'started': fmt_datetime( w.started ) }
+            for w in rec.worklogs ]
+
+
+    def group_members( self, group ):
+        if group not in self.groups:
+            raise libjql.JqlError( f"The value '{group}' does not exist for the field 'membersOf'." )
+        return self.groups[ group ]
+
+
+    def linked_keys( self, key, relation=None ):
+        rec = self.issues.get( key.upper() )
+        if not rec:
+            return set()
+        keys = set()
+        if relation in ( None, ancestor_link_type['outward'] ):
+            keys.update( rec.children )
+        if relation in ( None, ancestor_link_type['inward'] ):
+            keys.update( rec.parents )
+        return keys
+
+
+    # --- searching ---
+    def search( self, jql ):
+        ''' Return list of Issue_Records matching jql '''
+        cached = self.search_cache.get( jql )
+        if cached and cached[0] == self.version:
+            self.search_cache.move_to_end( jql )
+            return [ self.issues[k] for k in cached[1] ]
+        query = libjql.Query( jql )
+        candidates = query.candidate_keys( self )
+        if candidates is None:
+            recs = self.issues.values()
+        else:
+            recs = [ self.issues[k] for k in candidates if k in self.issues ]
+        keys = [ i['key'] for i in query.search( ( self.query_view( r ) for r in recs ), self ) ]
+        self.search_cache[ jql ] = ( self.version, keys )
+        while len( self.search_cache ) > 64:
+            self.search_cache.popitem( last=False )
+        return [ self.issues[k] for k in keys ]
+
+
+    def unknown_keys( self, jql ):
+        ''' Keys named in a top level "key in (...)" that don't exist '''
+        candidates = libjql.Query( jql ).candidate_keys( self )
+        return sorted( k for k in candidates or [] if k not in self.issues )
+
+
+    def query_view( self, rec ):
+        ''' Just enough of the issue json to evaluate jql, much cheaper
+            than render() when scanning a whole project
+        '''
+        return {
+            'key': rec.key,
+            'fields': {
+                'summary': rec.summary,
+                'description': rec.description,
+                'issuetype': rec.issue_type,
+                'created': fmt_datetime( rec.created ),
+                'updated': fmt_datetime( rec.updated ),
+                'duedate': rec.due.isoformat() if rec.due else None,
+                'resolution': 'Done' if rec.resolved else None,
+                'resolutiondate': fmt_datetime( rec.resolved ) if rec.resolved else None,
+                libfields.SPRINT: [ self.sprints[s].as_greenhopper_str() for s in rec.sprints ],
+                libfields.EPIC_LINK: rec.epic,
+                libfields.EPIC_NAME: rec.epic_name,
+                PROGRAMS: rec.program,
+                RESEARCH_SYSTEM: rec.systems,
+                },
+            }
+
+
+    # --- rendering to REST json ---
+    def issue_ref( self, rec ):
+        return {
+            'id': str( rec.id ),
+            'key': rec.key,
+            'self': f'{self.base_url}/rest/api/2/issue/{rec.id}',
+            'fields': {
+                'summary': rec.summary,
+                'issuetype': self.render_issuetype( rec.issue_type ),
+                },
+            }
+
+
+    def render_issuetype( self, name ):
+        ids = { 'Epic': '10000', 'Story': '10001', 'Task': '10002' }
+        return {
+            'id': ids.get( name, '10003' ),
+            'name': name,
+            'subtask': False,
+            'self': f'{self.base_url}/rest/api/2/issuetype/{ids.get( name, "10003" )}',
+            }
+
+
+    def render_option( self, value ):
+        num = zlib.crc32( value.encode() ) % 100000
+        return {
+            'self': f'{self.base_url}/rest/api/2/customFieldOption/{num}',
+            'value': value,
+            'id': str( num ),
+            }
+
+
+    def render_link( self, rec, other_key, direction ):
+        other = self.issues.get( other_key )
+        link = {
+            'id': f'{rec.id}{other.id if other else 0}',
+            'type': dict( ancestor_link_type,
+                self=f'{self.base_url}/rest/api/2/issueLinkType/10300' ),
+            }
+        link[ f'{direction}Issue' ] = self.issue_ref( other ) if other else { 'key': other_key }
+        return link
+
+
+    def render( self, rec, fields=None ):
+        ''' REST json for an issue. fields: set of field names or None for all '''
+        project = rec.key.split( '-' )[0]
+        links = [ self.render_link( rec, k, 'inward' ) for k in rec.parents ]
+        links.extend( self.render_link( rec, k, 'outward' ) for k in rec.children )
+        all_fields = {
+            'summary': rec.summary,
+            'description': rec.description,
+            'issuetype': self.render_issuetype( rec.issue_type ),
+            'project': {
+                'id': str( zlib.crc32( project.encode() ) % 100000 ),
+                'key': project,
+                'name': project,
+                'self': f'{self.base_url}/rest/api/2/project/{project}',
+                },
+            'created': fmt_datetime( rec.created ),
+            'updated': fmt_datetime( rec.updated ),
+            'duedate': rec.due.isoformat() if rec.due else None,
+            'resolution': { 'name': 'Done', 'id': '10000',
+                'self': f'{self.base_url}/rest/api/2/resolution/10000' } if rec.resolved else None,
+            'resolutiondate': fmt_datetime( rec.resolved ) if rec.resolved else None,
+            'issuelinks': links,
+            'labels': [],
+            libfields.SPRINT: [ self.sprints[s].as_greenhopper_str() for s in rec.sprints ] or None,
+            libfields.EPIC_LINK: rec.epic,
+            libfields.EPIC_NAME: rec.epic_name,
+            PROGRAMS: self.render_option( rec.program ) if rec.program else None,
+            RESEARCH_SYSTEM: [ self.render_option( s ) for s in rec.systems ] or None,
+            }
+        if fields is not None:
+            all_fields = { k: v for k, v in all_fields.items() if k in fields }
+        if fields is None or 'worklog' in fields:
+            # like jira, embed at most 20 worklogs
+            all_fields['worklog'] = {
+                'startAt': 0,
+                'maxResults': 20,
+                'total': len( rec.worklogs ),
+                'worklogs': [ self.render_worklog( rec, w ) for w in rec.worklogs[:20] ],
+                }
+        return {
+            'expand': 'renderedFields,names,schema,operations,editmeta,changelog,versionedRepresentations',
+            'id': str( rec.id ),
+            'key': rec.key,
+            'self': f'{self.base_url}/rest/api/2/issue/{rec.id}',
+            'fields': all_fields,
+            }
+
+
+    def render_user( self, name ):
+        return {
+            'self': f'{self.base_url}/rest/api/2/user?username={name}',
+            'name': name,
+            'key': name,
+            'emailAddress': f'{name}@example.com',
+            'displayName': name.title(),
+            'active': True,
+            }
+
+
+    def render_worklog( self, rec, w ):
+        return {
+            'self': f'{self.base_url}/rest/api/2/issue/{rec.id}/worklog/{w.id}',
+            'author': self.render_user( w.author ),
+            'updateAuthor': self.render_user( w.author ),
+            'comment': '',
+            'created': fmt_datetime( w.updated ),
+            'updated': fmt_datetime( w.updated ),
+            'started': fmt_datetime( w.started ),
+            'timeSpent': f'{w.seconds // 60}m',
+            'timeSpentSeconds': w.seconds,
+            'id': str( w.id ),
+            'issueId': str( rec.id ),
+            }
+
+
+    # --- changes ---
+    def _new_id( self ):
+        self.next_id += 1
+        return self.next_id
+
+
+    def add_issue( self, project, issue_type, summary, now=None, **kwargs ):
+        with self.lock:
+            num = self.next_num.get( project, 1 )
+            self.next_num[ project ] = num + 1
+            now = now or datetime.datetime.now( jira_tz )
+            rec = Issue_Record(
+                id=self._new_id(),
+                key=f'{project}-{num}',
+                issue_type=issue_type,
+                summary=summary,
+                created=now,
+                updated=now,
+                **kwargs )
+            self.issues[ rec.key ] = rec
+            self.version += 1
+            return rec
+
+
+    def touch( self, *keys ):
+        self.version += 1
+        now = datetime.datetime.now( jira_tz )
+        for k in keys:
+            self.issues[ k ].updated = now
+
+
+    def link( self, parent_key, child_key ):
+        with self.lock:
+            parent = self.issues[ parent_key.upper() ]
+            child = self.issues[ child_key.upper() ]
+            if child.key not in parent.children:
+                parent.children.append( child.key )
+                child.parents.append( parent.key )
+            self.touch( parent.key, child.key )
+
+
+    def add_to_epic( self, epic_key, issue_keys ):
+        with self.lock:
+            for k in issue_keys:
+                self.issues[ k.upper() ].epic = epic_key.upper()
+                self.touch( k.upper() )
+
+
+    def add_worklog( self, key, author, seconds, started=None ):
+        with self.lock:
+            rec = self.issues[ key.upper() ]
+            now = datetime.datetime.now( jira_tz )
+            w = Worklog_Record(
+                id=self._new_id(),
+                author=author,
+                started=started or now,
+                seconds=seconds,
+                updated=now )
+            rec.worklogs.append( w )
+            self.touch( rec.key )
+            return w
+
+
+    def worklogs_updated_since( self, since, limit=1000 ):
+        ''' ( issue, worklog ) pairs updated after since (datetime), oldest
+            first, at most limit; and whether that was all of them
+        '''
+        with self.lock:
+            found = [ ( w.updated, w.id, rec, w ) for rec in self.issues.values()
+                for w in rec.worklogs if w.updated > since ]
+        found.sort( key=lambda x: x[:2] )
+        return ( [ ( rec, w ) for _, _, rec, w in found[:limit] ], len( found ) <= limit )
+
+
+    def get_worklogs_by_ids( self, ids ):
+        ''' ( issue, worklog ) pairs of the worklogs with these ids '''
+        ids = { int( i ) for i in ids }
+        with self.lock:
+            return [ ( rec, w ) for rec in self.issues.values()
+                for w in rec.worklogs if w.id in ids ]
+
+
+    def delete_issue( self, key ):
+        with self.lock:
+            rec = self.issues.pop( key.upper() )
+            for k in rec.parents:
+                self.issues[ k ].children.remove( rec.key )
+            for k in rec.children:
+                self.issues[ k ].parents.remove( rec.key )
+            self.touch( *rec.parents, *rec.children )
+
+
+def mk_sprints( store, now, num ):
+    ''' Two week sprints ending with the current (ACTIVE) one '''
+    for i in range( num ):
+        start = now - datetime.timedelta( weeks=2 * ( num - 1 - i ) + 1 )
+        rec = Sprint_Record(
+            id=i + 1,
+            name=f'Sprint {i + 1}',
+            state='ACTIVE' if i == num - 1 else 'CLOSED',
+            start=start,
+            end=start + datetime.timedelta( weeks=2 ),
+            )
+        store.sprints[ rec.id ] = rec
+
+
+def mk_groups( store, team_size=10 ):
+    ''' A group per team_size users, and "jira-users" with everyone '''
+    for i in range( 0, len( store.users ), team_size ):
+        store.groups[ f'team-{i // team_size + 1}' ] = store.users[ i:i+team_size ]
+    store.groups['jira-users'] = list( store.users )
+
+
+def generate( store, project='SVC', num_issues=1000, seed=0, num_users=50, worklog_days=365 ):
+    ''' Add a synthetic project of about num_issues issues to store.
+        Roughly 2% epics, 18% stories, 80% tasks. Some tasks are "lost"
+        (no parent or no epic) and some stories are resolved with open
+        children, so the link checking reports have something to find.
+    '''
+    rnd = random.Random( seed )
+    now = datetime.datetime.now( jira_tz ).replace( microsecond=0 )
+    if not store.users:
+        store.users = [ f'user{i}' for i in range( 1, num_users + 1 ) ]
+    if not store.groups:
+        mk_groups( store )
+    if not store.sprints:
+        mk_sprints( store, now, max( 4, num_issues // 500 ) )
+    sprint_ids = sorted( store.sprints )
+    active_sprint = sprint_ids[-1]
+
+    def rand_time( days ):
+        return now - datetime.timedelta( seconds=rnd.randint( 0, days * 86400 ) )
+
+    num_epics = max( 1, num_issues // 50 )
+    num_stories = max( 1, num_issues * 18 // 100 )
+    num_tasks = max( 0, num_issues - num_epics - num_stories )
+
+    epics = []
+    for i in range( num_epics ):
+        service = service_names[ i % len( service_names ) ]
+        team = rnd.choice( [ 'Ops', 'Dev', 'Sec', 'Net' ] )
+        created = rand_time( 3 * 365 )
+        rec = store.add_issue( project, 'Epic', f'{service} {i}', now=created,
+            epic_name=f'{team} - {service}',
+            program=rnd.choice( program_values ) if rnd.random() < 0.7 else None,
+            )
+        rec.updated = max( created, rand_time( 60 ) )
+        if rnd.random() < 0.1:
+            rec.resolved = rec.updated
+        epics.append( rec )
+
+    stories = []
+    for i in range( num_stories ):
+        epic = rnd.choice( epics )
+        created = rand_time( 2 * 365 )
+        rec = store.add_issue( project, 'Story', f'Story {i} for {epic.summary}', now=created,
+            epic=epic.key,
+            due=( now + datetime.timedelta( days=rnd.randint( -60, 120 ) ) ).date()
+                if rnd.random() < 0.5 else None,
+            program=epic.program,
+            systems=rnd.sample( system_values, rnd.randint( 0, 2 ) ),
+            description='Story description\nTASK first task\nTASK second task\n',
+            )
+        rec.updated = max( created, rand_time( 90 ) )
+        if rnd.random() < 0.4:
+            rec.resolved = rec.updated
+        if rnd.random() < 0.1:
+            rec.sprints = [ active_sprint ]
+        elif rnd.random() < 0.3:
+            rec.sprints = rnd.sample( sprint_ids[:-1], min( 2, len( sprint_ids ) - 1 ) )
+        stories.append( rec )
+
+    for i in range( num_tasks ):
+        story = rnd.choice( stories )
+        created = rand_time( 365 )
+        lost = rnd.random()
+        rec = store.add_issue( project, 'Task', f'Task {i} of {story.key}', now=created,
+            epic=story.epic if lost > 0.03 else None,
+            due=story.due,
+            program=story.program if rnd.random() < 0.8 else None,
+            systems=list( story.systems ),
+            )
+        rec.updated = max( created, rand_time( 30 ) )
+        if lost > 0.02:
+            rec.parents.append( story.key )
+            story.children.append( rec.key )
+        # resolved stories mostly have resolved children
+        if story.resolved and rnd.random() < 0.97 or rnd.random() < 0.5:
+            rec.resolved = rec.updated
+        if rnd.random() < 0.05:
+            rec.sprints = [ active_sprint ]
+        for _ in range( rnd.choice( [ 0, 0, 1, 2, 3, 5, 8 ] ) ):
+            started = max( created, rand_time( worklog_days ) )
+            rec.worklogs.append( Worklog_Record(
+                id=store._new_id(),
+                author=rnd.choice( store.users ),
+                started=started,
+                seconds=rnd.choice( [ 900, 1800, 3600, 7200, 14400 ] ),
+                updated=started,
+                ) )
+    return store
+
+
+if __name__ == '__main__':
+    raise SystemExit( 'not a cmdline module' )
@@ -4,15 +4,20 @@ import argparse
 import libjira
 import jira.exceptions
 import jira_connection
+import libfields
+import libmetrics
 import libweb
 import logging
-from simple_issue import simple_issue
+from simple_issue import simple_issue, mk_issue_list
 import pprint
 
 # Module level resources
 logr = logging.getLogger( __name__ )
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue )
+
 
 def reset():
     global resources
@@ -86,41 +91,30 @@ def run( current_user=None, **kwargs ):
     print( f"ARGS: '{args}'" )
 
     # load specified issues from jira
-    parents = {}
-    simple_parents = []
-    for key in args.issues:
-        try:
-            i = current_user.get_issue_by_key( key )
-            # pprint.pprint( i.raw )
-            # raise SystemExit("DEBUG  STOP")
-        except jira.exceptions.JIRAError as e:
-            raise UserWarning( e.text )
+    try:
+        issues, missing = current_user.find_issues_by_keys( args.issues, fields=jira_fields, json_result=True )
+    except jira.exceptions.JIRAError as e:
+        raise UserWarning( e.text )
+    for key in missing:
+        warn( f"No such ticket '{key}'" )
 
+    parents = {}
+    for i in issues:
         i_type = current_user.get_issue_type( i )
         if i_type == 'Epic':
-            for p in current_user.get_stories_in_epic( i ):
-                parents[ p.key ] = p
-                simple_parents.append( simple_issue.from_src( src=p, jcon=current_user.jira ) )
+            for p in current_user.get_stories_in_epic( i, fields=jira_fields, json_result=True ):
+                parents[ p['key'] ] = p
         elif i_type == 'Story':
-            parents[ i.key ] = i
-            simple_parents.append( simple_issue.from_src( src=i, jcon=current_user.jira ) )
+            parents[ i['key'] ] = i
         else:
-            raise UserWarning( f'Not a Story or Epic: {key}' )
-
-    simple_parents.sort()
-    all_issues = []
-    
-    for simple_p in simple_parents:
-        p = parents[ simple_p.key ]
-        logr.debug( f"processing parent '{p}'" )
-        try:
-            children = current_user.get_linked_children( p )
-        except jira.exceptions.JIRAError as e:
-            raise UserWarning( e.text )
-        simple_children = [ simple_issue.from_src( src=c, jcon=current_user.jira ) for c in children ]
-        simple_children.sort()
-        all_issues.append( simple_p )
-        all_issues.extend( simple_children )
+            raise UserWarning( f"Not a Story or Epic: {i['key']}" )
+
+    try:
+        children_of = current_user.get_linked_children_bulk( parents.values(), fields=jira_fields, json_result=True )
+    except jira.exceptions.JIRAError as e:
+        raise UserWarning( e.text )
+
+    all_issues = mk_issue_list( parents, children_of, current_user )
 
     if args.output_format == 'text':
         # for i in raw_issues:
@@ -152,4 +146,5 @@ if __name__ == '__main__':
     logr.addHandler( ch )
 
     # start processing
+    libmetrics.start_cli_run( 'summary', verbose=args.verbose )
     run()
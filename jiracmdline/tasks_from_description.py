@@ -2,6 +2,7 @@
 
 import argparse
 import jira.exceptions
+import libfields
 import libweb
 import logging
 import re
@@ -11,6 +12,9 @@ from simple_issue import simple_issue
 logr = logging.getLogger( __name__ )
 resources = {}
 
+# Jira fields needed to build the report
+jira_fields = libfields.mk_fields( libfields.simple_issue, [ 'description' ] )
+
 
 def reset():
     global resources
@@ -120,9 +124,12 @@ def run( current_user=None, **kwargs ):
     parents = []
     children = []
     try:
-        parents = current_user.get_issues_by_keys( args.issues )
+        parents, missing = current_user.find_issues_by_keys( args.issues, fields=jira_fields )
     except jira.exceptions.JIRAError as e:
         error( e.text )
+    else:
+        for key in missing:
+            warn( f"No such ticket '{key}'" )
     raw_issues = []
     for p in parents:
         logr.debug( f'got issue {p}' )
@@ -138,13 +145,13 @@ def run( current_user=None, **kwargs ):
             epic_key = current_user.get_epic_key( p )
             if not args.dryrun:
                 current_user.add_tasks_to_epic( children, epic_key )
-            raw_issues.extend( current_user.reload_issues( children ) )
+            raw_issues.extend( current_user.reload_issues( children, fields=jira_fields ) )
     if args.output_format == 'text':
         for i in raw_issues:
             current_user.print_issue_summary( i )
     else:
         headers = ( 'story', 'child', 'summary', 'epic', 'links' )
-        issues = [ simple_issue.from_src( src=i, jcon=current_user.jira ) for i in raw_issues ]
+        issues = [ simple_issue.from_src( src=i, jcon=current_user ) for i in raw_issues ]
         return {
             'headers': headers,
             'issues': issues,
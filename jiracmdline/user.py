@@ -1,12 +1,12 @@
+import connection_pool
 import flask_login
-from jira_connection import Jira_Connection
 
 
 # Custom User class for use with flask_login
 class User( flask_login.UserMixin ):
     def __init__( self, user_id=None ):
         self.id = user_id
-        self.jira = Jira_Connection.from_user_token( personal_access_token=self.id )
+        self.jira = connection_pool.get_pool().get( self.id )
         self.uname = None
 
 
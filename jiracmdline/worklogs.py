@@ -1,22 +1,21 @@
 #!/usr/local/bin/python3
 
-from project_effort import ProjectEffort
+from project_effort import EffortTable
 from simple_issue import simple_issue
 import argparse
 import collections
-import configparser
 import datetime
-import dateutil
 import io
-import jira_connection
-from jira.resources import CustomFieldOption
-import libjira
+import libcalendar
+import libconfig
+import libfields
+import libgroups
+import libmetrics
+import libprogram
 import libweb
 import logging
-import os
-import pandas as pd
 import pprint
-import ldap3
+import snapshot_connection
 
 
 Week = collections.namedtuple( 'Week', [ 'start', 'end' ] )
@@ -59,7 +58,13 @@ def get_args( params=None ):
         parser.add_argument( '-n', '--num_weeks',
             type=int,
             default=4,
-            help='Number of weeks to report (default: %(default)s)')
+            help='Number of weeks, or periods (see --period), to report (default: %(default)s)')
+        parser.add_argument( '-p', '--period',
+            choices=list( libcalendar.period_names ),
+            default='week',
+            help='Report per week (Monday to Sunday), calendar month, quarter or fiscal year (default: %(default)s)' )
+        parser.add_argument( '--from_snapshot', metavar='FILE',
+            help="Read issues from a snapshot saved by snapshot.py instead of jira." )
         args = parser.parse_args( params )
         resources[key] = args
     return resources[key]
@@ -98,66 +103,53 @@ def get_usernames():
 
 
 def group2users( group ):
-    ''' Query LDAP for members of the group
+    ''' Members of the group, from the (cached) LDAP directory, or from
+        jira if LDAP doesn't answer in time
     '''
-    ldap_server = 'ldaps://ldap3.ncsa.illinois.edu'
-    ldap_user = None
-    ldap_password = None
-    search_base = 'dc=ncsa,dc=illinois,dc=edu'
-    search_scope = ldap3.SUBTREE
-    # attributes = ldap3.ALL_ATTRIBUTES
-    attributes = ["uniqueMember"]
-    users = []
+    users = libgroups.get_directory().members( group, timeout=libgroups.get_timeout() )
+    if users is None:
+        users = jira_group_members( group )
+    logr.debug( f"uids: {users}" )
+    return users
 
-    with ldap3.Connection(ldap_server, ldap_user, ldap_password) as conn:
-        if not conn.bind():
-            msg = "Error: Could not bind to LDAP server"
-            error( msg )
-            raise UserWarning( msg )
-        search_filter = f"(cn={group})"
-        result = conn.search(search_base, search_filter, search_scope, attributes=attributes)
-        if not result:
-            msg = f"Error: Could not find group {group_name}"
-            error( msg )
-            raise UserWarning( msg )
-        entry = conn.entries[0]
-        # pprint.pprint( entry )
-        members = [ m for m in entry.uniqueMember ]
-        uids = [ m.split(',')[0].split('=')[1] for m in entry.uniqueMember ]
-        users = uids
-        logr.debug(f"uids: {uids}")
-        # raise SystemExit()
 
-        # get email for each user
-        # for u in uids:
-        #     search_filter = f"(uid={u})"
-        #     attributes = [ 'mail' ]
-        #     result = conn.search(search_base, search_filter, search_scope, attributes=attributes)
-        #     if not result:
-        #         msg = f"Error: Could not find user {u}"
-        #         # msg = f"Error: Could not find user {m}"
-        #         error( msg )
-        #         raise UserWarning( msg )
-        #     entry = conn.entries[0]
-        #     # pprint.pprint( entry )
-        #     # raise SystemExit()
-        #     users.append( entry.mail.value )
-    return users
+def jira_group_members( group ):
+    try:
+        members = get_current_user().group_members( group )
+    except AttributeError:
+        # e.g. reading from a snapshot
+        msg = f"Error: Could not get members of group {group}"
+        error( msg )
+        raise UserWarning( msg )
+    return [ m['name'] or k for k, m in members.items() ]
+
+
+def use_members_of( group ):
+    ''' True if jira should expand group in the search (membersOf()),
+        rather than waiting for LDAP. The LDAP lookup then runs while jira
+        searches, for filtering the worklogs later.
+    '''
+    if isinstance( get_current_user(), snapshot_connection.Snapshot_Connection ):
+        # local jql has no membersOf()
+        return False
+    if libgroups.get_directory().cached( group ) is not None:
+        return False
+    libgroups.get_directory().prefetch( group )
+    return True
 
 
 def get_config():
     key = 'cfg'
     if key not in resources:
-        envvar = 'JCL_CONFIG'
-        default_fn = 'conf/config.ini'
-        conf_file = os.getenv( envvar, default_fn )
-        cfg = configparser.ConfigParser( allow_no_value=True )
-        cfg.optionxform = str
-        cfg.read( conf_file )
-        resources[key] = cfg
+        resources[key] = libconfig.read_config( libconfig.get_config_path() )
     return resources[key]
 
 
+def get_classifier():
+    ''' Compiled issue2program config, see libprogram '''
+    return libprogram.get_classifier( libconfig.get_config_path() )
+
+
 def get_config_section( section_name ):
     if section_name not in resources:
         cfg = get_config()
@@ -165,19 +157,9 @@ def get_config_section( section_name ):
     return resources[section_name]
 
 
-def get_holidays():
-    key = 'holidays'
-    section = 'holidays'
-    if key not in resources:
-        dates = []
-        try:
-            data = get_config_section(section)
-        except KeyError:
-            pass
-        else:
-            dates = [ pd.to_datetime(k) for k in data ]
-        resources[key] = dates
-    return resources[key]
+def get_calendar():
+    ''' Workdays and holidays, see libcalendar '''
+    return libcalendar.get_calendar( libconfig.get_config_path() )
 
 
 def get_issue2program_fields():
@@ -196,6 +178,18 @@ def get_issue2program_field_order():
     return resources[key]
 
 
+def get_jira_fields():
+    ''' Jira fields needed by simple_issue plus the (top level) fields
+        listed in [issue2program_fields]
+    '''
+    key = 'jira_fields'
+    if key not in resources:
+        program_fields = [ f.split('.')[0] for f in get_issue2program_field_order() ]
+        # "updated" keys the memo of issue2program results
+        resources[key] = libfields.mk_fields( libfields.simple_issue, program_fields, [ 'updated' ] )
+    return resources[key]
+
+
 def get_customfield_human_name( customfield_name ):
     key = f'{customfield_name}_human_name'
     if key not in resources:
@@ -207,15 +201,7 @@ def get_week_bounds( num=4 ):
     ''' Get first and last day of each week, starting with current week
         and then <num>-1 weeks prior to this week.
     '''
-    weeks = []
-    today = datetime.date.today()
-    for i in range(num):
-        offset = pd.Timedelta( value=i, unit='W' )
-        v = today - offset
-        P = pd.Period( value=v, freq='W' )
-        # pprint.pprint( P )
-        weeks.append( Week( P.start_time.date(), P.end_time.date() ) )
-    return weeks
+    return get_calendar().periods( 'week', num )
 
 
 def get_errors():
@@ -241,6 +227,7 @@ def warn( msg ):
 
 
 def mk_jql( week ):
+    ''' Worklogs of the query users from week.start to week.end, which may span several weeks '''
     current_user = get_current_user() #instance of jira.JIRA
     if not current_user:
         raise UserWarning( 'not logged in' )
@@ -250,14 +237,18 @@ def mk_jql( week ):
     #     author = args.user
     # elif args.group:
     #     author = f'membersOf("{args.group}")'
-    usernames = [ f'"{u}"' for u in get_usernames() ]
-    users = ','.join( usernames )
+    group = get_args().group
+    if group and use_members_of( group ):
+        users = f'membersOf("{group}")'
+    else:
+        usernames = [ f'"{u}"' for u in get_usernames() ]
+        users = f"({','.join( usernames )})"
     # adjust dates for JQl formatting
     oneday = datetime.timedelta( days=1 )
     startdate = ( week.start - oneday ).strftime( '%Y-%m-%d' )
     enddate = ( week.end + oneday ).strftime( '%Y-%m-%d' )
     # construct JQL
-    worklogauthor = f'worklogauthor in ({users})'
+    worklogauthor = f'worklogauthor in {users}'
     start = f'worklogdate > "{startdate}"'
     end = f'worklogdate < "{enddate}"'
     jql = ' AND '.join( [ worklogauthor, start, end ] )
@@ -266,62 +257,12 @@ def mk_jql( week ):
 
 def issue2program( issue ):
     ''' Determine what (funding) program an issue belongs to.
-        Get customfield order from config.
-        For each customfield, if a matching key is found, use that value.
-        Once a value is found, stop looking.
-        If no value found, throw an error.
-        If the issue has multiple values in the customfield, throw an error.
+        Fields are checked in the order of [issue2program_fields] in the
+        config, the first value found in the field's lookup section wins.
+        Raise UserWarning if there's no program, or if the issue has
+        multiple values in a field.
     '''
-
-    program = None
-    # get order of customfields
-    customfields = get_issue2program_field_order()
-    # pprint.pprint( customfields )
-    # raise SystemExit( 'DEBUG' )
-
-    for fieldname in customfields:
-        # split on parts to allow nested attributes, like issue.fields.project.key
-        parts = fieldname.split('.')
-        tgt = issue.fields
-        try:
-            for p in parts:
-                tgt = getattr( tgt, p )
-        except AttributeError:
-            # if the Jira issue doesn't have this field,
-            # skip it and move on to the checking the next field
-            continue
-        if isinstance( tgt, str ):
-            lookup_key = tgt
-        elif isinstance( tgt, CustomFieldOption ):
-            lookup_key = tgt.value
-        elif isinstance( tgt, list ):
-            if len(tgt) > 1:
-                fname = get_customfield_human_name( fieldname )
-                raise UserWarning( f'Multiple values for field "{fname}" in issue {issue}' )
-            lookup_key = tgt[0].value
-        elif tgt is None:
-            continue
-        else:
-            pprint.pprint( tgt )
-            fname = get_customfield_human_name( fieldname )
-            raise UserWarning( f'Unknown value type for field "{fname}" in issue {issue}' )
-        # get lookup table for this fieldname
-        lookup_table = get_config_section( fieldname )
-        if lookup_key in lookup_table:
-            program = lookup_table[ lookup_key ]
-            break
-    if not program:
-        raise UserWarning( f'No program for issue {issue}' )
-    return program
-
-
-def num_workdays(start_date, end_date, holidays=[]):
-    """Return the number of workdays between two dates, excluding given holidays."""
-    # # to make this inclusive, have to modify end_date by 1
-    # end = end_date + datetime.timedelta( days=1 )
-    workdays = pd.bdate_range(start=start_date, end=end_date, freq='B')
-    # pprint.pprint( workdays )
-    return len([day for day in workdays if day not in holidays])
+    return get_classifier().classify( issue )
 
 
 def print_report( weekly_data ):
@@ -329,7 +270,7 @@ def print_report( weekly_data ):
     # start = args.startdate.strftime( '%Y-%m-%d' )
     # end = args.enddate.strftime( '%Y-%m-%d' )
     for week in weekly_data:
-        hdr = f"Week of {week['startdate']} ({week['days']} work days)"
+        hdr = f"{week['period']} of {week['startdate']} ({week['days']} work days)"
         sep = '=' * len(hdr)
         print( sep )
         print( hdr )
@@ -366,94 +307,84 @@ def print_report( weekly_data ):
 #     print( file.read() )
 
 
-def mk_csv( weekly_data ):
-    table = []
-    headers = ['startdate','program','issue','summary','user','seconds']
-    for week in weekly_data:
-        for pname,p in week['projects'].items():
-            # pprint.pprint( p.as_list() )
-            for row in p.as_list():
-                data_row = [ week['startdate'] ]
-                data_row.extend( [ str(r) for r in row ] )
-                table.append( data_row )
-                # print( ','.join( [str(r) for r in row ] ) )
-                # rows.append( row )
-    return pd.DataFrame( data=table, columns=headers ).to_csv( index=False )
+def mk_csv( table ):
+    return table.to_csv()
 
 
 def run( current_user=None, **kwargs ):
     parts = None
     if not current_user:
         # started from cmdline
-        current_user = jira_connection.Jira_Connection( libjira.jira_login() )
+        current_user = snapshot_connection.connect( get_args().from_snapshot )
     else:
         reset()
         parts = libweb.process_kwargs( kwargs )
         parts.append( '--output_format=raw' )
     args = get_args( params=parts )
     set_current_user( current_user )
-    query_users = get_usernames()
-    logr.debug( f'Query Users: {query_users}' )
-    # raise SystemExit()
-
-    # get number of workdays covered in the date range
-    holidays = get_holidays()
 
-    # get weeks to report on
-    weeks = get_week_bounds( args.num_weeks )
+    # get periods (weeks by default) to report on, newest first
+    calendar = get_calendar()
+    periods = calendar.periods( args.period, args.num_weeks )
+    period_name = libcalendar.period_names[ args.period ]
 
-    weekly_data = []
-    for week in weeks:
-        jql = mk_jql( week )
+    # -n 0 asks for no periods, report nothing (without a search)
+    table = EffortTable()
+    if periods:
+        # one search for the whole range, oldest period start to current period end
+        jql = mk_jql( Week( periods[-1].start, periods[0].end ) )
         logr.debug( f'JQL: {jql}' )
-        # raise SystemExit()
 
         # get issues from jira
-        issues = current_user.run_jql( jql )
-        # pprint.pprint( issues )
-        # raise SystemExit()
+        issues = current_user.run_jql( jql, fields=get_jira_fields() )
 
-        # process worklogs for each issue
-        projects = {}
-        for i in issues:
-            logr.debug( [ 'ISSUE', i ] )
-            # pprint.pprint( i.raw )
-            # raise SystemExit()
-            try:
-                program = issue2program( i )
-                logr.debug( [ 'PROGRAM', program ] )
-            except UserWarning as e:
-                error( e )
+        # get program for each issue, report the ones without in bulk
+        programs, unclassified = get_classifier().classify_many( issues )
+        logr.debug( [ 'PROGRAMS', programs ] )
+        for msg in libprogram.summarize_unclassified( unclassified ):
+            error( msg )
+
+        # get worklogs inside the report window for all issues, once per issue
+        results = current_user.get_worklogs_between(
+            [ i for i in issues if i.key in programs ],
+            periods[-1].start,
+            periods[0].end,
+            )
+
+        # collect worklogs, sums per period, program, ticket and user are done in bulk
+        for i, worklogs, err in results:
+            if err:
+                error( f'Failed to get worklogs for {i.key}: {err}' )
                 continue
-            worklogs = current_user.worklogs( i )
             si = simple_issue.from_src( src=i, jcon=current_user )
-            for w in worklogs:
-                w_started = dateutil.parser.parse( w.started, ignoretz=True ).date()
-                if w_started >= week.start and w_started <= week.end:
-                    # author = w.author.emailAddress
-                    author = w.author.name
-                    secs = w.timeSpentSeconds
-                    # only add worklog entries from users in query_users
-                    if author in query_users:
-                        project = projects.setdefault( program, ProjectEffort(program) )
-                        project.add_worklog( ticket=si, user=author, secs=secs )
-                    else:
-                        logr.debug( f"---SKIPing worklog author {author}" )
+            table.add_worklogs( si, programs[ i.key ], [ w.raw for w in worklogs ] )
 
+    # only worklog entries from users in query_users
+    query_users = get_usernames()
+    logr.debug( f'Query Users: {query_users}' )
+    projects_by_period = table.summarize( periods, users=query_users )
+
+    # number of workdays in each period
+    workdays = calendar.workdays_many( periods )
+
+    weekly_data = []
+    for period, days in zip( periods, workdays ):
+        projects = projects_by_period[ period.start ]
         if len( projects ) < 1:
-            warn( f'no worklogs found for week {week.start}' )
+            warn( f'no worklogs found for {period_name.lower()} {period.start}' )
 
         weekly_data.append( {
             'projects': projects,
-            'startdate': week.start,
-            'days': num_workdays( week.start, week.end, holidays ),
+            'period': period_name,
+            'startdate': period.start,
+            'days': days,
             }
         )
 
     if args.output_format == 'text':
         print_report( weekly_data )
     elif args.output_format == 'csv':
-        print( mk_csv( weekly_data ) )
+        print( mk_csv( table ) )
     elif args.output_format == 'raw':
         rv = {
             'weekly_data': weekly_data,
@@ -461,7 +392,7 @@ def run( current_user=None, **kwargs ):
             'messages': get_warnings(),
         }
         if args.webcsv:
-            rv['csv'] = mk_csv( weekly_data )
+            rv['csv'] = mk_csv( table )
         return rv
 
 
@@ -481,4 +412,5 @@ if __name__ == '__main__':
     logr.addHandler( ch )
 
     # start processing
+    libmetrics.start_cli_run( 'worklogs', verbose=args.verbose )
     run()